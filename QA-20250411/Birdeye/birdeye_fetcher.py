@@ -1,16 +1,25 @@
 import json
 import os
+import sys
+import random
+import threading
+from bisect import bisect_left, bisect_right
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timezone
 import argparse
-import requests
-from dotenv import load_dotenv
 import time
-import pandas as pd
 import math
 
+import coverage_index
+import profiling
+
+# requests, python-dotenv, pandas and numpy are imported inside the functions that use
+# them, so starting the CLI (or importing this module) does not pay for loading pandas.
+
 # --- Environment & Config Loading ---
 def load_api_key():
     """Loads the Birdeye API key from the .env file."""
+    from dotenv import load_dotenv
     script_dir = os.path.dirname(__file__)
     dotenv_path = os.path.join(script_dir, '.env')
     load_dotenv(dotenv_path=dotenv_path)
@@ -30,6 +39,11 @@ def load_config(config_path="default_config.json"):
         with open(abs_config_path, 'r', encoding='utf-8') as f:
             config = json.load(f)
         print(f"Configuration loaded successfully from {abs_config_path}")
+        # BIRDEYE_BASE_URL points the fetcher at another backend (e.g. the load test's mock)
+        base_url_override = os.getenv("BIRDEYE_BASE_URL")
+        if base_url_override:
+            config.setdefault("common_parameters", {})["base_url"] = base_url_override
+            print(f"Using Birdeye base URL from BIRDEYE_BASE_URL: {base_url_override}")
         return config
     except FileNotFoundError:
         print(f"Error: Configuration file not found at {abs_config_path}")
@@ -113,9 +127,208 @@ def chunk_time_range(start_unix, end_unix, max_interval_hours=24):
     
     return chunks
 
+# --- Request Policy ---
+# Timeouts, retries and hedging for every Birdeye call. (connect, read) timeouts bound
+# each attempt; retryable failures (connection errors, timeouts, 429, 5xx) back off
+# exponentially with full jitter; a call still running after hedge_after seconds gets a
+# duplicate request if the rate budget has a spare token, and the first answer wins.
+REQUEST_POLICY = {
+    "connect_timeout": 5.0,
+    "read_timeout": 30.0,
+    "max_retries": 3,
+    "backoff_base": 1.0,
+    "backoff_max": 30.0,
+    "hedge_after": 10.0,          # None disables hedging
+    "requests_per_second": 1.0,   # Birdeye: 60 rpm
+    "breaker_failure_threshold": 5,
+    "breaker_reset_seconds": 60.0,
+}
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class FetchError(Exception):
+    """A failed Birdeye call; retryable tells whether trying again can help."""
+
+    def __init__(self, message, retryable=True, retry_after=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+class RateBudget:
+    """Token bucket shared by all requests of the process (primaries and hedges)."""
+
+    def __init__(self, requests_per_second, capacity=1):
+        self.rate = requests_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def acquire(self):
+        while not self.try_acquire():
+            time.sleep(max(0.01, (1 - self.tokens) / self.rate))
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive retryable failures. While open, every
+    caller waits out reset_seconds instead of spending the rate budget on requests that
+    would fail; afterwards one trial request decides whether it closes or opens again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+
+    def seconds_until_trial(self):
+        if self.opened_at is None:
+            return 0
+        return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def record_success(self):
+        if self.opened_at is not None:
+            print("Circuit breaker closed: upstream is answering again")
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            print(f"Circuit breaker open after {self.failures} consecutive failures: "
+                  f"pausing Birdeye requests for {self.reset_seconds:.0f}s")
+
+_rate_budget = None
+_circuit_breaker = None
+_job_deadline = None
+_hedge_pool = None
+
+def configure_request_policy(job_timeout=None, **overrides):
+    """
+    Updates REQUEST_POLICY and resets the shared rate budget and circuit breaker.
+    job_timeout (seconds from now) is the overall deadline for all remaining calls.
+    """
+    global _rate_budget, _circuit_breaker, _job_deadline
+    REQUEST_POLICY.update({k: v for k, v in overrides.items() if v is not None})
+    _rate_budget = None
+    _circuit_breaker = None
+    _job_deadline = time.monotonic() + job_timeout if job_timeout else None
+
+def _get_rate_budget():
+    global _rate_budget
+    if _rate_budget is None:
+        _rate_budget = RateBudget(REQUEST_POLICY["requests_per_second"])
+    return _rate_budget
+
+def _get_circuit_breaker():
+    global _circuit_breaker
+    if _circuit_breaker is None:
+        _circuit_breaker = CircuitBreaker(REQUEST_POLICY["breaker_failure_threshold"], REQUEST_POLICY["breaker_reset_seconds"])
+    return _circuit_breaker
+
+def job_time_remaining():
+    """Seconds left before the job deadline (None when there is no deadline)."""
+    if _job_deadline is None:
+        return None
+    return _job_deadline - time.monotonic()
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff; a server Retry-After is used as the lower bound."""
+    delay = random.uniform(0, min(REQUEST_POLICY["backoff_max"], REQUEST_POLICY["backoff_base"] * 2 ** attempt))
+    return max(delay, retry_after or 0)
+
 # --- API Call ---
+_session = None
+
+def get_session():
+    """One requests.Session per process, so consecutive calls reuse the HTTP connection."""
+    global _session
+    if _session is None:
+        import requests
+        _session = requests.Session()
+    return _session
+
+def _send_request(url, headers, params):
+    """One HTTP attempt with (connect, read) timeouts; returns the parsed JSON or raises FetchError."""
+    import requests
+    timeout = (REQUEST_POLICY["connect_timeout"], REQUEST_POLICY["read_timeout"])
+    remaining = job_time_remaining()
+    if remaining is not None:
+        timeout = (min(timeout[0], max(remaining, 0.1)), min(timeout[1], max(remaining, 0.1)))
+    try:
+        with profiling.stage("http"):
+            response = get_session().get(url, headers=headers, params=params, timeout=timeout)
+    except requests.exceptions.Timeout as timeout_err:
+        raise FetchError(f"Timeout error: {timeout_err}")
+    except requests.exceptions.ConnectionError as conn_err:
+        raise FetchError(f"Connection error: {conn_err}")
+    except requests.exceptions.RequestException as req_err:
+        raise FetchError(f"Request error: {req_err}", retryable=False)
+
+    if response.status_code >= 400:
+        retry_after = response.headers.get("Retry-After")
+        raise FetchError(
+            f"HTTP error {response.status_code}. Response Body: {response.text[:500]}",
+            retryable=response.status_code in RETRYABLE_STATUS_CODES,
+            retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+        )
+    try:
+        with profiling.stage("json_decode"):
+            return response.json()
+    except ValueError:
+        raise FetchError(f"Error decoding JSON response. Response Text: {response.text[:500]}")
+
+def _send_hedged(url, headers, params, request_name):
+    """
+    Sends the request and, if it has not answered after hedge_after seconds and the
+    rate budget has a spare token, a duplicate; returns the first successful answer.
+    """
+    global _hedge_pool
+    hedge_after = REQUEST_POLICY["hedge_after"]
+    if not hedge_after:
+        return _send_request(url, headers, params)
+    if _hedge_pool is None:
+        _hedge_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="birdeye-hedge")
+
+    send = profiling.carry_stages(_send_request)
+    pending = {_hedge_pool.submit(send, url, headers, params)}
+    done, pending = wait(pending, timeout=hedge_after)
+    if not done and _get_rate_budget().try_acquire():
+        print(f"No answer for {request_name} after {hedge_after:.0f}s, sending hedged request")
+        pending.add(_hedge_pool.submit(send, url, headers, params))
+
+    error = None
+    while pending or done:
+        for future in done:
+            try:
+                return future.result()
+            except FetchError as e:
+                error = e
+        if not pending:
+            break
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+    raise error
+
 def fetch_ohlcv_data(config, request_config, start_unix, end_unix, api_key, token_address=None):
-    """Fetches OHLCV data for a specific request configuration."""
+    """
+    Fetches OHLCV data for a specific request configuration.
+    Retries per REQUEST_POLICY; returns None if the call fails for good, the job
+    deadline passes, or the circuit breaker stays open past the deadline.
+    """
     base_url = config.get("common_parameters", {}).get("base_url")
     api_key_header = config.get("common_parameters", {}).get("api_key_header")
     endpoint = request_config.get("endpoint")
@@ -143,32 +356,53 @@ def fetch_ohlcv_data(config, request_config, start_unix, end_unix, api_key, toke
     print(f"Params: {query_params}")
     # print(f"Headers: {{'{api_key_header}': '********'}}") # Don't print the actual key
 
-    try:
-        response = requests.get(url, headers=headers, params=query_params)
-        response.raise_for_status() # Raises HTTPError for bad responses (4XX or 5XX)
-
-        print(f"API call successful for {request_name} (Status: {response.status_code})")
-        return response.json() # Return the parsed JSON data
+    breaker = _get_circuit_breaker()
+    max_retries = REQUEST_POLICY["max_retries"]
+    for attempt in range(max_retries + 1):
+        # While the breaker is open the whole pipeline waits here instead of sending requests
+        pause = breaker.seconds_until_trial()
+        remaining = job_time_remaining()
+        if remaining is not None and remaining <= pause:
+            print(f"Job deadline reached, giving up on {request_name}")
+            return None
+        if pause > 0:
+            print(f"Circuit breaker open, waiting {pause:.1f}s before calling {request_name}")
+            with profiling.stage("circuit_breaker_wait"):
+                time.sleep(pause)
 
-    except requests.exceptions.HTTPError as http_err:
-        print(f"HTTP error occurred for {request_name}: {http_err} (Status: {response.status_code})")
-        print(f"Response Body: {response.text}")
-    except requests.exceptions.ConnectionError as conn_err:
-        print(f"Connection error occurred for {request_name}: {conn_err}")
-    except requests.exceptions.Timeout as timeout_err:
-        print(f"Timeout error occurred for {request_name}: {timeout_err}")
-    except requests.exceptions.RequestException as req_err:
-        print(f"An error occurred during the request for {request_name}: {req_err}")
-    except json.JSONDecodeError:
-        print(f"Error decoding JSON response for {request_name}. Response Text: {response.text}")
-    except Exception as e:
-         print(f"An unexpected error occurred during API call for {request_name}: {e}")
+        with profiling.stage("rate_budget_wait"):
+            _get_rate_budget().acquire()
+        try:
+            with profiling.stage("request"):
+                data = _send_hedged(url, headers, query_params, request_name)
+            breaker.record_success()
+            print(f"API call successful for {request_name}")
+            return data # Return the parsed JSON data
+        except FetchError as e:
+            print(f"{e} ({request_name}, attempt {attempt + 1}/{max_retries + 1})")
+            if not e.retryable:
+                return None
+            breaker.record_failure()
+            if attempt == max_retries:
+                break
+            delay = backoff_delay(attempt, e.retry_after)
+            remaining = job_time_remaining()
+            if remaining is not None and remaining <= delay:
+                print(f"Job deadline reached, giving up on {request_name}")
+                return None
+            print(f"Retrying in {delay:.1f}s...")
+            with profiling.stage("backoff_sleep"):
+                time.sleep(delay)
+        except Exception as e:
+            print(f"An unexpected error occurred during API call for {request_name}: {e}")
+            return None
 
     return None # Return None if any error occurred
 
 # --- CSV Saving ---
 def save_to_csv(data, filename, output_dir):
     """Saves the fetched OHLCV data items to a CSV file."""
+    import pandas as pd
     try:
         # Create output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
@@ -184,10 +418,12 @@ def save_to_csv(data, filename, output_dir):
                 return
 
             # Convert the items to a DataFrame
-            df = pd.DataFrame(items)
+            with profiling.stage("build_dataframe"):
+                df = pd.DataFrame(items)
             
             # Save to CSV
-            df.to_csv(filepath, index=False)
+            with profiling.stage("write_csv"):
+                df.to_csv(filepath, index=False)
             print(f"Data saved to {filepath} ({len(items)} records)")
         elif "data" in data and isinstance(data["data"], list):
             # Some endpoints return a list directly under 'data'
@@ -197,10 +433,12 @@ def save_to_csv(data, filename, output_dir):
                 return
                 
             # Convert the items to a DataFrame
-            df = pd.DataFrame(items)
+            with profiling.stage("build_dataframe"):
+                df = pd.DataFrame(items)
             
             # Save to CSV
-            df.to_csv(filepath, index=False)
+            with profiling.stage("write_csv"):
+                df.to_csv(filepath, index=False)
             print(f"Data saved to {filepath} ({len(items)} records)")
         else:
             print(f"Warning: Unexpected data structure for {filename}. Could not find 'items' in response.")
@@ -223,22 +461,32 @@ def fetch_and_combine_data(config, request_conf, chunks, api_key, token_address,
     """
     Fetch data for each time chunk and combine the results.
     Respects rate limits by sleeping between requests.
+    The result's "complete" is False when a chunk failed or the job deadline cut
+    the loop short, i.e. when parts of the chunks were never received.
     """
     all_items = []
+    complete = True
     request_name = request_conf.get("name", request_conf.get("endpoint", "unnamed_request"))
     
     print(f"\nFetching data for {request_name} in {len(chunks)} chunks:")
     
     for i, (chunk_start, chunk_end) in enumerate(chunks):
+        remaining = job_time_remaining()
+        if remaining is not None and remaining <= 0:
+            print(f"Job deadline reached, skipping the remaining {len(chunks) - i} chunks")
+            complete = False
+            break
         print(f"\nChunk {i+1}/{len(chunks)}: {datetime.fromtimestamp(chunk_start, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')} to {datetime.fromtimestamp(chunk_end, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')}")
         
         # Wait to respect rate limits (60 rpm = 1 request per second)
         if i > 0:
             print(f"Sleeping for {rate_limit_sleep} seconds to respect API rate limits...")
-            time.sleep(rate_limit_sleep)
+            with profiling.stage("rate_limit_sleep"):
+                time.sleep(rate_limit_sleep)
         
         # Fetch data for this chunk
-        data = fetch_ohlcv_data(config, request_conf, chunk_start, chunk_end, api_key, token_address)
+        with profiling.stage("fetch_chunk"):
+            data = fetch_ohlcv_data(config, request_conf, chunk_start, chunk_end, api_key, token_address)
         
         if data is not None:
             # Extract items
@@ -259,14 +507,17 @@ def fetch_and_combine_data(config, request_conf, chunks, api_key, token_address,
                         print(f"No items found in chunk {i+1}")
                 else:
                     print(f"Unexpected data structure in chunk {i+1}")
+                    complete = False
             else:
                 print(f"No 'data' field found in response for chunk {i+1}")
+                complete = False
         else:
             print(f"Failed to fetch data for chunk {i+1}")
+            complete = False
     
     # Create a combined result
     if all_items:
-        combined_data = {"data": {"items": all_items}}
+        combined_data = {"data": {"items": all_items}, "complete": complete}
         print(f"\nTotal items collected for {request_name}: {len(all_items)}")
         return combined_data
     else:
@@ -274,18 +525,717 @@ def fetch_and_combine_data(config, request_conf, chunks, api_key, token_address,
         return None
 
 
+# --- Integrity Check & Backfill ---
+# Candle width in seconds for each Birdeye OHLCV `type`
+CANDLE_INTERVAL_SECONDS = {
+    "1m": 60, "3m": 180, "5m": 300, "15m": 900, "30m": 1800,
+    "1H": 3600, "2H": 7200, "4H": 14400, "6H": 21600, "8H": 28800, "12H": 43200,
+    "1D": 86400, "3D": 259200, "1W": 604800,
+}
+
+# Birdeye returns at most 1000 records per OHLCV request
+MAX_CANDLES_PER_REQUEST = 1000
+
+def max_chunk_hours(candle_type, chunk_hours=24):
+    """
+    chunk_hours capped so that one chunk of candle_type candles fits into a single
+    response. chunk_time_range chunks include both ends, so 999 intervals hold 1000 candles.
+    """
+    interval_seconds = CANDLE_INTERVAL_SECONDS.get(candle_type)
+    if interval_seconds is None:
+        return chunk_hours
+    return min(chunk_hours, (MAX_CANDLES_PER_REQUEST - 1) * interval_seconds / 3600)
+
+def check_candle_integrity(items, start_unix, end_unix, interval_seconds):
+    """
+    Compares the fetched candle timestamps against the expected candle grid for
+    [start_unix, end_unix] in a single vectorized pass over the unixTime array.
+    Returns a dict with missing/duplicate/off-grid timestamps and the missing
+    timestamps grouped into contiguous (range_start, range_end) runs.
+    """
+    import numpy as np
+    times = np.fromiter((item.get("unixTime", -1) for item in items), dtype=np.int64, count=len(items))
+    times.sort()
+
+    # Duplicates: equal neighbours in the sorted array
+    duplicates = np.unique(times[1:][times[1:] == times[:-1]])
+    present = np.unique(times)
+    off_grid = present[present % interval_seconds != 0]
+
+    # Expected grid: every candle open time aligned to the interval inside the window
+    first_edge = -(-start_unix // interval_seconds) * interval_seconds
+    expected = np.arange(first_edge, end_unix + 1, interval_seconds, dtype=np.int64)
+    if present.size:
+        positions = np.minimum(np.searchsorted(present, expected), present.size - 1)
+        missing = expected[present[positions] != expected]
+    else:
+        missing = expected
+
+    # Group missing timestamps into contiguous runs
+    missing_ranges = []
+    if missing.size:
+        breaks = np.flatnonzero(np.diff(missing) != interval_seconds) + 1
+        run_starts = missing[np.concatenate(([0], breaks))]
+        run_ends = missing[np.concatenate((breaks - 1, [missing.size - 1]))]
+        missing_ranges = list(zip(run_starts.tolist(), run_ends.tolist()))
+
+    return {
+        "expected_count": int(expected.size),
+        "received_count": int(times.size),
+        "missing": missing.tolist(),
+        "duplicates": duplicates.tolist(),
+        "off_grid": off_grid.tolist(),
+        "missing_ranges": missing_ranges,
+    }
+
+def plan_backfill_requests(missing_ranges, interval_seconds, max_candles=MAX_CANDLES_PER_REQUEST):
+    """
+    Turns missing runs into the fewest (time_from, time_to) requests: neighbouring
+    runs are merged while the combined span still fits in one response, and runs
+    longer than one response are split.
+    """
+    max_span = (max_candles - 1) * interval_seconds
+    requests_plan = []
+    for run_start, run_end in missing_ranges:
+        if requests_plan and run_end - requests_plan[-1][0] <= max_span:
+            requests_plan[-1] = (requests_plan[-1][0], run_end)
+            continue
+        while run_end - run_start > max_span:
+            requests_plan.append((run_start, run_start + max_span))
+            run_start += max_span + interval_seconds
+        requests_plan.append((run_start, run_end))
+    return requests_plan
+
+def dedupe_candles(items):
+    """Drops duplicate candles (the last one received wins) and sorts by unixTime."""
+    by_time = {item.get("unixTime"): item for item in items}
+    return [by_time[t] for t in sorted(t for t in by_time if t is not None)]
+
+def backfill_missing_candles(config, request_conf, items, start_unix, end_unix, api_key, token_address,
+                             rate_limit_sleep=1, max_requests=None):
+    """
+    Runs the integrity check on the combined chunk results and only requests
+    the ranges that are actually missing. Returns (items, report), where items
+    are deduplicated and sorted and report is the integrity check after backfill.
+    report["unfetched_gaps"] counts planned backfill requests that failed or were
+    skipped (max_requests, job deadline); their ranges are still unverified.
+    """
+    request_name = request_conf.get("name", request_conf.get("endpoint", "unnamed_request"))
+    candle_type = request_conf.get("query_params", {}).get("type")
+    interval_seconds = CANDLE_INTERVAL_SECONDS.get(candle_type)
+    if interval_seconds is None:
+        print(f"Skipping integrity check for {request_name}: unknown candle type '{candle_type}'")
+        return items, None
+
+    with profiling.stage("integrity_check"):
+        report = check_candle_integrity(items, start_unix, end_unix, interval_seconds)
+    print(f"\nIntegrity check for {request_name}: expected {report['expected_count']} candles, "
+          f"received {report['received_count']}, missing {len(report['missing'])}, "
+          f"duplicates {len(report['duplicates'])}, off-grid {len(report['off_grid'])}")
+
+    items = dedupe_candles(items)
+    backfill_plan = plan_backfill_requests(report["missing_ranges"], interval_seconds)
+    unfetched_gaps = 0
+    if max_requests is not None:
+        unfetched_gaps = max(0, len(backfill_plan) - max_requests)
+        backfill_plan = backfill_plan[:max_requests]
+    if not backfill_plan:
+        report["unfetched_gaps"] = unfetched_gaps
+        return items, report
+
+    print(f"Backfilling {len(report['missing_ranges'])} gaps with {len(backfill_plan)} requests...")
+    for i, (gap_start, gap_end) in enumerate(backfill_plan):
+        remaining = job_time_remaining()
+        if remaining is not None and remaining <= 0:
+            print(f"Job deadline reached, skipping the remaining {len(backfill_plan) - i} backfill requests")
+            unfetched_gaps += len(backfill_plan) - i
+            break
+        with profiling.stage("rate_limit_sleep"):
+            time.sleep(rate_limit_sleep)
+        with profiling.stage("backfill_request"):
+            data = fetch_ohlcv_data(config, request_conf, gap_start, gap_end, api_key, token_address)
+        if data is None or "data" not in data:
+            print(f"Backfill request {i+1}/{len(backfill_plan)} failed")
+            unfetched_gaps += 1
+            continue
+        new_items = data["data"].get("items", []) if isinstance(data["data"], dict) else data["data"]
+        print(f"Backfill request {i+1}/{len(backfill_plan)} returned {len(new_items)} items")
+        items.extend(new_items)
+
+    items = dedupe_candles(items)
+    with profiling.stage("integrity_check"):
+        report = check_candle_integrity(items, start_unix, end_unix, interval_seconds)
+    report["unfetched_gaps"] = unfetched_gaps
+    if report["missing"]:
+        # Remaining gaps are usually minutes without any trades on the upstream side
+        print(f"Still missing {len(report['missing'])} candles for {request_name} after backfill "
+              f"({len(report['missing_ranges'])} ranges)")
+    else:
+        print(f"All expected candles present for {request_name} after backfill")
+    return items, report
+
+
+# --- Coverage ---
+def fetch_range_with_coverage(config, request_conf, token_address, start_unix, end_unix, api_key,
+                              chunk_hours=24, rate_limit_sleep=1, skip_integrity_check=False,
+                              max_backfill_requests=None, coverage=None):
+    """
+    Returns (items, complete) for one request type over [start_unix, end_unix]: the
+    deduplicated candles sorted by unixTime (None if nothing was obtained) and whether
+    every chunk and backfill request of every range came back. Only a complete range
+    may be recorded in the coverage index. With a CoverageIndex, ranges already stored locally are
+    read from disk and only the uncovered ranges are requested from the API.
+    """
+    request_name = request_conf.get("name", request_conf.get("endpoint", "unnamed_request"))
+    candle_type = request_conf.get("query_params", {}).get("type")
+    fetch_ranges, items = [(start_unix, end_unix)], []
+    if coverage is not None:
+        with profiling.stage("coverage_lookup"):
+            report = coverage.coverage(token_address, candle_type, 'birdeye', start_unix, end_unix,
+                                       CANDLE_INTERVAL_SECONDS.get(candle_type, 1))
+        fetch_ranges = report['missing']
+        if report['covered']:
+            with profiling.stage("coverage_load"):
+                items = coverage.load_candles(token_address, candle_type, start_unix, end_unix)
+        print(f"\nCoverage for {request_name}: {report['covered_fraction']:.1%} already local "
+              f"({len(items)} candles), {len(fetch_ranges)} ranges to fetch")
+
+    complete = True
+    for n, (range_start, range_end) in enumerate(fetch_ranges):
+        if n > 0:
+            with profiling.stage("rate_limit_sleep"):
+                time.sleep(rate_limit_sleep)
+        chunks = chunk_time_range(range_start, range_end, max_chunk_hours(candle_type, chunk_hours))
+        with profiling.stage("fetch_chunks"):
+            combined_data = fetch_and_combine_data(config, request_conf, chunks, api_key, token_address, rate_limit_sleep)
+        if combined_data is None:
+            complete = False
+            continue
+        complete = complete and combined_data["complete"]
+        new_items = combined_data["data"]["items"]
+        if not skip_integrity_check:
+            with profiling.stage("integrity_backfill"):
+                new_items, report = backfill_missing_candles(config, request_conf, new_items, range_start, range_end,
+                                                             api_key, token_address, rate_limit_sleep, max_backfill_requests)
+            if report is not None and report["unfetched_gaps"]:
+                complete = False
+        items.extend(new_items)
+
+    if not items:
+        return None, complete
+    return dedupe_candles(items), complete
+
+def record_coverage(coverage, token_address, request_conf, start_unix, end_unix, csv_path):
+    """Adds a saved CSV to the coverage index; failures only cost a refetch later."""
+    if coverage is None or not os.path.exists(csv_path):
+        return
+    try:
+        with profiling.stage("coverage_record"):
+            coverage.add(token_address, request_conf.get("query_params", {}).get("type"), 'birdeye',
+                         start_unix, end_unix, csv_path)
+    except Exception as e:
+        print(f"Warning: could not update the coverage index: {e}")
+
+# --- Work Items ---
+def fetch_work_item(config, api_key, token_address, start_unix, end_unix, output_csv_dir,
+                    chunk_hours=24, rate_limit_sleep=1, skip_integrity_check=False,
+                    max_backfill_requests=None, coverage=None):
+    """
+    Fetches every configured request type for one (token, start, end) and saves
+    one CSV per request type into output_csv_dir. Returns {request_name: combined_data}.
+    With a CoverageIndex only the uncovered ranges are fetched and the saved CSVs
+    are added to the index.
+    """
+    time_chunks = chunk_time_range(start_unix, end_unix, chunk_hours)
+    total_hours = (end_unix - start_unix) / 3600
+    print(f"\nTotal time range: {total_hours:.2f} hours")
+    print(f"Splitting into {len(time_chunks)} chunks of maximum {chunk_hours} hours each")
+
+    # Display rate limit settings
+    print(f"Rate limit sleep time between requests: {rate_limit_sleep} seconds")
+    print(f"API limit: 60 requests per minute")
+
+    # Iterate through request configs, fetch data for all chunks, and save
+    print("\n--- Fetching Data from Birdeye API & Saving ---")
+    api_results = {}
+    ohlcv_requests_config = config.get("ohlcv_requests", [])
+    if not ohlcv_requests_config:
+        print("Warning: No 'ohlcv_requests' found in the configuration file.")
+
+    for request_conf in ohlcv_requests_config:
+        request_name = request_conf.get("name", request_conf.get("endpoint", "unnamed_request"))
+        csv_filename = f"{request_name}.csv"
+
+        # Fetch the uncovered ranges chunk by chunk, backfill gaps and merge with local data
+        with profiling.stage("fetch_range"):
+            items, complete = fetch_range_with_coverage(
+                config,
+                request_conf,
+                token_address,
+                start_unix,
+                end_unix,
+                api_key,
+                chunk_hours,
+                rate_limit_sleep,
+                skip_integrity_check,
+                max_backfill_requests,
+                coverage
+            )
+        combined_data = {"data": {"items": items}} if items is not None else None
+
+        if combined_data is not None:
+            api_results[request_name] = combined_data
+            if complete:
+                print(f"Successfully fetched all data for {request_name}.")
+            else:
+                print(f"Fetched partial data for {request_name}; not recording it as covered.")
+            # Generate filename and save
+            with profiling.stage("save_to_csv"):
+                save_to_csv(combined_data, csv_filename, output_csv_dir)
+            if complete:
+                record_coverage(coverage, token_address, request_conf, start_unix, end_unix,
+                                os.path.join(output_csv_dir, csv_filename))
+        else:
+            print(f"Failed to fetch data for {request_name}. Skipping CSV save.")
+            api_results[request_name] = None
+
+        # Add a delay between different request types
+        if request_conf != ohlcv_requests_config[-1]:  # If not the last request
+            sleep_time = rate_limit_sleep * 2  # Double sleep time between different request types
+            print(f"\nSleeping for {sleep_time} seconds before next request type...")
+            with profiling.stage("rate_limit_sleep"):
+                time.sleep(sleep_time)
+
+    return api_results
+
+def read_manifest(manifest_path):
+    """
+    Yields (line_number, item, error) from a JSONL work manifest ('-' reads stdin).
+    Each item has start_time and end_time, and optionally token, output_dir and id.
+    A line that is not a JSON object yields item None and the parse error, so one
+    bad line does not abort the rest of the manifest.
+    """
+    f = sys.stdin if manifest_path == "-" else open(manifest_path, 'r', encoding='utf-8')
+    try:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                yield line_number, None, f"invalid JSON: {e}"
+                continue
+            if not isinstance(item, dict):
+                yield line_number, None, "work item is not a JSON object"
+                continue
+            yield line_number, item, None
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def coalesce_windows(windows, interval_seconds):
+    """
+    Merges (start_unix, end_unix) windows into the minimal sorted list of disjoint
+    ranges covering them. Windows that overlap or leave no whole candle between
+    them are merged. Returns (ranges, assignment), where assignment[i] is the
+    index of the range that covers windows[i].
+    """
+    order = sorted(range(len(windows)), key=lambda i: windows[i])
+    ranges = []
+    assignment = [None] * len(windows)
+    for i in order:
+        start, end = windows[i]
+        if ranges and start <= ranges[-1][1] + interval_seconds:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+        else:
+            ranges.append((start, end))
+        assignment[i] = len(ranges) - 1
+    return ranges, assignment
+
+def slice_candles(items, start_unix, end_unix):
+    """Candles of a unixTime-sorted list whose open time lies in [start_unix, end_unix]."""
+    times = [item["unixTime"] for item in items]
+    return items[bisect_left(times, start_unix):bisect_right(times, end_unix)]
+
+def plan_manifest_fetches(work_items, ohlcv_requests_config):
+    """
+    Groups valid work items by (request type, token) and coalesces their windows.
+    Returns a list of {"request_conf", "token", "start", "end", "items"} fetches,
+    where items are the work items sliced from that fetched range.
+    """
+    fetches = []
+    for request_conf in ohlcv_requests_config:
+        candle_type = request_conf.get("query_params", {}).get("type")
+        interval_seconds = CANDLE_INTERVAL_SECONDS.get(candle_type, 1)
+        by_token = {}
+        for item in work_items:
+            by_token.setdefault(item["token"], []).append(item)
+        for token_address, token_items in by_token.items():
+            ranges, assignment = coalesce_windows([(it["start"], it["end"]) for it in token_items], interval_seconds)
+            for k, (range_start, range_end) in enumerate(ranges):
+                fetches.append({
+                    "request_conf": request_conf,
+                    "token": token_address,
+                    "start": range_start,
+                    "end": range_end,
+                    "items": [it for it, a in zip(token_items, assignment) if a == k],
+                })
+    return fetches
+
+def run_manifest(config, api_key, manifest_path, script_dir, output_dir="output_csv", default_token=None,
+                 chunk_hours=24, rate_limit_sleep=1, skip_integrity_check=False, max_backfill_requests=None,
+                 coverage=None):
+    """
+    Processes every work item of a manifest in this process, sharing the config,
+    API key and HTTP session. Overlapping windows of the same token are coalesced
+    per request type, fetched once (only the parts not in the coverage index, if
+    given), and each item's window is sliced from the result.
+    Coalescing only happens across the items of one manifest; single fetches are not merged.
+    Each item is written to its own output_dir (default: <output_dir>/<id or line number>).
+    Returns a list of {"id", "line", "status", "output_dir"[, "error"]} dicts, one per manifest
+    line. status is "ok", "empty" (no candles in the window, no CSV written), "failed" or
+    "invalid"; an id that repeats an earlier line's id is invalid.
+    """
+    summary = {}  # line number -> summary entry
+    first_line_of_id = {}
+    work_items = []
+    for line_number, item, error in read_manifest(manifest_path):
+        if item is None:
+            summary[line_number] = {"id": str(line_number), "line": line_number, "status": "failed",
+                                    "output_dir": None, "error": error}
+            continue
+        item_id = str(item.get("id", line_number))
+        item_output_dir = os.path.join(script_dir, item.get("output_dir") or os.path.join(output_dir, item_id))
+        entry = summary[line_number] = {"id": item_id, "line": line_number, "status": "ok", "output_dir": item_output_dir}
+        if item_id in first_line_of_id:
+            entry.update(status="invalid", error=f"duplicate id '{item_id}' (first used on line {first_line_of_id[item_id]})")
+            continue
+        first_line_of_id[item_id] = line_number
+        start_unix = string_to_unix(str(item.get("start_time")))
+        end_unix = string_to_unix(str(item.get("end_time")))
+        if start_unix is None or end_unix is None or end_unix <= start_unix:
+            entry.update(status="invalid", error="invalid start_time / end_time")
+            continue
+        work_items.append({"id": item_id, "line": line_number, "token": item.get("token") or default_token,
+                           "start": start_unix, "end": end_unix, "output_dir": item_output_dir})
+
+    fetches = plan_manifest_fetches(work_items, config.get("ohlcv_requests", []))
+    requested_seconds = sum(it["end"] - it["start"] for f in fetches for it in f["items"])
+    fetched_seconds = sum(f["end"] - f["start"] for f in fetches)
+    print(f"\nManifest: {len(work_items)} valid work items -> {len(fetches)} coalesced fetches "
+          f"({requested_seconds / 3600:.1f} requested hours, {fetched_seconds / 3600:.1f} fetched hours)")
+
+    for n, fetch in enumerate(fetches):
+        request_conf = fetch["request_conf"]
+        request_name = request_conf.get("name", request_conf.get("endpoint", "unnamed_request"))
+        start_human = datetime.fromtimestamp(fetch["start"], tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        end_human = datetime.fromtimestamp(fetch["end"], tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        print(f"\n=== {request_name} for {fetch['token']}: {start_human} to {end_human} "
+              f"({len(fetch['items'])} work items) ===")
+
+        # The previous fetch ended with an API call
+        if n > 0:
+            with profiling.stage("rate_limit_sleep"):
+                time.sleep(rate_limit_sleep)
+        try:
+            with profiling.stage("fetch_range"):
+                items, complete = fetch_range_with_coverage(config, request_conf, fetch["token"], fetch["start"], fetch["end"],
+                                                            api_key, chunk_hours, rate_limit_sleep, skip_integrity_check,
+                                                            max_backfill_requests, coverage)
+        except Exception as e:
+            print(f"Fetch of {request_name} for {fetch['token']} failed: {e}")
+            items, complete = None, False
+
+        for work_item in fetch["items"]:
+            entry = summary[work_item["line"]]
+            if items is None:
+                entry.update(status="failed", error=f"no data for {request_name}")
+                continue
+            window = slice_candles(items, work_item["start"], work_item["end"])
+            if not window:
+                if entry["status"] == "ok":
+                    entry.update(status="empty", error=f"no {request_name} candles in window")
+                continue
+            with profiling.stage("save_to_csv"):
+                save_to_csv({"data": {"items": window}}, f"{request_name}.csv", work_item["output_dir"])
+            if complete:
+                record_coverage(coverage, fetch["token"], request_conf, work_item["start"], work_item["end"],
+                                os.path.join(work_item["output_dir"], f"{request_name}.csv"))
+    return list(summary.values())
+
+
+# --- Live Tail ---
+# Keeps the newest candles of a set of tokens up to date: every poll requests only the
+# candles since the last closed one, appends newly closed candles to a per-(token, type)
+# CSV and rewrites the still-open candle, which is always the file's last row. Closed
+# candles are compared against hubble a few seconds after they close.
+# A closed candle is written once: if Birdeye revises it later, the revision is not
+# picked up by the tail (refetch the window with a normal run to get the final values).
+
+COMPARISON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Comparison')
+LIVE_FIELDS = ["unixTime", "o", "h", "l", "c", "v"]
+
+class LiveCandleStore:
+    """CSV of one (token, candle type) whose last row may be the open candle, replaced in place."""
+
+    def __init__(self, path, interval_seconds):
+        self.path = path
+        self.interval_seconds = interval_seconds
+        self.last_closed = None
+        self.open_offset = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        header = (",".join(LIVE_FIELDS) + "\n").encode('utf-8')
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, 'wb') as f:
+                f.write(header)
+            return
+        # After a restart the last row is treated as possibly open and rewritten by the next poll
+        rows = []
+        with open(path, 'r+b') as f:
+            if not f.readline().endswith(b"\n"):
+                # Killed while writing the header
+                f.seek(0)
+                f.truncate()
+                f.write(header)
+                return
+            offset = f.tell()
+            for line in iter(f.readline, b''):
+                if not line.endswith(b"\n"):
+                    # Row cut off by a crash mid-write; the next poll fetches that candle again
+                    f.seek(offset)
+                    f.truncate()
+                    break
+                rows.append((offset, int(float(line.split(b",", 1)[0]))))
+                offset = f.tell()
+        if rows:
+            self.open_offset = rows[-1][0]
+            self.last_closed = rows[-2][1] if len(rows) > 1 else None
+
+    def poll_start(self, now_unix, lookback_seconds):
+        """time_from for the next poll: the candle after the last closed one."""
+        if self.last_closed is None:
+            return (now_unix - lookback_seconds) // self.interval_seconds * self.interval_seconds
+        return self.last_closed + self.interval_seconds
+
+    def apply(self, items, now_unix):
+        """Stores a poll result; returns the candles that closed since the previous poll."""
+        items = [it for it in dedupe_candles(items) if self.last_closed is None or it["unixTime"] > self.last_closed]
+        if not items:
+            return []
+        closed = [it for it in items if it["unixTime"] + self.interval_seconds <= now_unix]
+        open_candle = items[-1] if items and items[-1]["unixTime"] + self.interval_seconds > now_unix else None
+
+        with open(self.path, 'r+b') as f:
+            if self.open_offset is not None:
+                f.seek(self.open_offset)
+                f.truncate()
+            else:
+                f.seek(0, os.SEEK_END)
+            for it in closed:
+                f.write(self._row(it))
+            self.open_offset = None
+            if open_candle is not None:
+                self.open_offset = f.tell()
+                f.write(self._row(open_candle))
+        if closed:
+            self.last_closed = closed[-1]["unixTime"]
+        return closed
+
+    @staticmethod
+    def _row(item):
+        return (",".join(str(item.get(k, "")) for k in LIVE_FIELDS) + "\n").encode('utf-8')
+
+class LiveComparator:
+    """
+    Compares closed candles with hubble once they are compare_delay seconds old,
+    retrying candles hubble does not have (or has not validated) until compare_timeout.
+    Results and alerts go to compare.jsonl / alerts.jsonl in the store directory.
+    """
+
+    def __init__(self, store_dir, candle_type, compare_delay=3, compare_timeout=120, threshold_pct=0.1):
+        if COMPARISON_DIR not in sys.path:
+            sys.path.insert(0, COMPARISON_DIR)
+        import kline_compare
+        self.kline_compare = kline_compare
+        self.client = kline_compare.connect_hubble()
+        if self.client is None:
+            raise RuntimeError("hubble connection is not configured")
+        self.store_dir = store_dir
+        self.candle_type = candle_type
+        self.interval_seconds = CANDLE_INTERVAL_SECONDS[candle_type]
+        self.compare_delay = compare_delay
+        self.compare_timeout = compare_timeout
+        self.threshold_pct = threshold_pct
+        self.pending = {}  # token -> {unixTime: item}
+
+    def add(self, token_address, closed_items):
+        self.pending.setdefault(token_address, {}).update({it["unixTime"]: it for it in closed_items})
+
+    def next_due(self):
+        """Unix time at which the oldest pending candle becomes due (None if nothing is pending)."""
+        times = [t for items in self.pending.values() for t in items]
+        return min(times) + self.interval_seconds + self.compare_delay if times else None
+
+    def run_due(self, now_unix):
+        """
+        Compares the due candles. Candles leave the queue only once their results are
+        written, so after an exception (hubble or disk) they are retried on the next call.
+        """
+        results, alerts, done = [], [], []
+        for token_address, items in self.pending.items():
+            due = sorted(t for t in items if t + self.interval_seconds + self.compare_delay <= now_unix)
+            if not due:
+                continue
+            with profiling.stage("hubble_query"):
+                ours = self.kline_compare.fetch_hubble_candles(self.client, token_address, self.candle_type, due[0], due[-1])
+            ours = ours.set_index('k_time') if len(ours) else None
+            for t in due:
+                close_lag = now_unix - (t + self.interval_seconds)
+                if ours is None or t not in ours.index:
+                    if close_lag >= self.compare_timeout:
+                        alerts.append({"token": token_address, "interval": self.candle_type, "k_time": t,
+                                       "alert": f"candle missing in hubble {close_lag}s after close"})
+                        done.append((items, t))
+                    continue
+                birdeye = items[t]
+                done.append((items, t))
+                deviations = {}
+                for metric, key in zip(self.kline_compare.METRICS, ["o", "h", "l", "c", "v"]):
+                    dev = self.kline_compare.abs_pct_deviation([ours.at[t, metric]], [float(birdeye[key])])[0]
+                    deviations[metric] = None if dev != dev else float(dev)
+                result = {"token": token_address, "interval": self.candle_type, "k_time": t,
+                          "close_lag_seconds": close_lag, "deviation_pct": deviations}
+                results.append(result)
+                worst = max((d for d in deviations.values() if d is not None), default=0.0)
+                if worst > self.threshold_pct:
+                    alerts.append(dict(result, alert=f"deviation {worst:.4f}% > {self.threshold_pct}%"))
+        self._append("compare.jsonl", results)
+        self._append("alerts.jsonl", alerts)
+        for items, t in done:
+            del items[t]
+        for alert in alerts:
+            print(f"ALERT {alert['token']} {alert['interval']} {alert['k_time']}: {alert['alert']}")
+        return results, alerts
+
+    def _append(self, filename, records):
+        if records:
+            with open(os.path.join(self.store_dir, filename), 'a', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+
+def run_tail(config, api_key, tokens, candle_type, store_dir, poll_seconds=5, lookback_seconds=3600,
+             comparator=None, duration=None):
+    """
+    Polls the latest candle_type candles of every token until interrupted (or for duration seconds).
+    Each token is requested once per poll, so poll_seconds should allow len(tokens) requests
+    within the rate budget. A failed comparison is logged and its candles stay queued for
+    the next poll. Closed candles are not re-polled, so later Birdeye revisions of them are
+    not applied (see the note above LiveCandleStore).
+    """
+    request_conf = None
+    for conf in config.get("ohlcv_requests", []):
+        if conf.get("query_params", {}).get("type") == candle_type:
+            request_conf = conf
+    if request_conf is None:
+        print(f"Error: no ohlcv_requests entry with type '{candle_type}' in the configuration.")
+        return
+    if candle_type not in CANDLE_INTERVAL_SECONDS:
+        print(f"Error: unsupported candle type '{candle_type}' for tail mode.")
+        return
+    interval_seconds = CANDLE_INTERVAL_SECONDS[candle_type]
+    stores = {token: LiveCandleStore(os.path.join(store_dir, f"{token}_{candle_type}.csv"), interval_seconds)
+              for token in tokens}
+    print(f"Tailing {candle_type} candles of {len(tokens)} tokens every {poll_seconds}s into {store_dir}")
+
+    started = time.time()
+    try:
+        while duration is None or time.time() - started < duration:
+            poll_started = time.time()
+            for token_address, store in stores.items():
+                now_unix = int(time.time())
+                with profiling.stage("tail_poll"):
+                    data = fetch_ohlcv_data(config, request_conf, store.poll_start(now_unix, lookback_seconds), now_unix,
+                                            api_key, token_address)
+                if data is None or "data" not in data:
+                    continue
+                items = data["data"].get("items", []) if isinstance(data["data"], dict) else data["data"]
+                with profiling.stage("tail_store"):
+                    closed = store.apply(items, int(time.time()))
+                if closed:
+                    print(f"{token_address}: {len(closed)} new closed candles, last {closed[-1]['unixTime']}")
+                    if comparator is not None:
+                        comparator.add(token_address, closed)
+            compare_failed = False
+            if comparator is not None:
+                try:
+                    with profiling.stage("tail_compare"):
+                        comparator.run_due(int(time.time()))
+                except Exception as e:
+                    # Keep tailing; the due candles stay queued and are retried after the next poll
+                    print(f"Comparison failed, retrying after the next poll: {e}")
+                    compare_failed = True
+
+            # Sleep until the next poll, waking early when a closed candle becomes due for comparison
+            wake = poll_started + poll_seconds
+            if comparator is not None and not compare_failed and comparator.next_due() is not None:
+                wake = min(wake, max(comparator.next_due(), time.time() + 0.5))
+            with profiling.stage("tail_wait"):
+                time.sleep(max(0.0, wake - time.time()))
+    except KeyboardInterrupt:
+        print("\nTail stopped.")
+
+
 # --- Main Execution ---
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Fetch OHLCV data from Birdeye API and save to CSV.")
-    parser.add_argument("start_time", help="Start time in ISO 8601 format (e.g., '2025-04-13T18:00:00') or 'YYYY-MM-DD HH:MM:SS' format")
-    parser.add_argument("end_time", help="End time in ISO 8601 format (e.g., '2025-04-13T19:00:00') or 'YYYY-MM-DD HH:MM:SS' format")
+    parser.add_argument("start_time", nargs="?", help="Start time in ISO 8601 format (e.g., '2025-04-13T18:00:00') or 'YYYY-MM-DD HH:MM:SS' format")
+    parser.add_argument("end_time", nargs="?", help="End time in ISO 8601 format (e.g., '2025-04-13T19:00:00') or 'YYYY-MM-DD HH:MM:SS' format")
     parser.add_argument("--config", default="default_config.json", help="Path to the configuration file relative to the script.")
     parser.add_argument("--output-dir", default="output_csv", help="Directory to save CSV files, relative to the script location.")
     parser.add_argument("--token", help="Custom Solana token address to fetch data for.")
-    parser.add_argument("--chunk-hours", type=int, default=24, help="Maximum hours per API request chunk (default: 24)")
+    parser.add_argument("--chunk-hours", type=int, default=24, help="Maximum hours per API request chunk (default: 24); "
+                        "lowered per candle type so a chunk never exceeds 1000 candles")
     parser.add_argument("--rate-limit-sleep", type=float, default=1.0, help="Seconds to sleep between API requests (default: 1.0)")
+    parser.add_argument("--skip-integrity-check", action="store_true", help="Skip the missing/duplicate candle check and backfill after fetching.")
+    parser.add_argument("--max-backfill-requests", type=int, default=None, help="Maximum number of backfill requests per request type (default: unlimited)")
+    parser.add_argument("--manifest", help="JSONL file of work items ({\"start_time\", \"end_time\", \"token\", \"output_dir\", \"id\"}) "
+                                           "to process in this one process; '-' reads stdin. Replaces start_time/end_time.")
+
+    parser.add_argument("--connect-timeout", type=float, default=None, help=f"Seconds to wait for a connection (default: {REQUEST_POLICY['connect_timeout']})")
+    parser.add_argument("--read-timeout", type=float, default=None, help=f"Seconds to wait for a response (default: {REQUEST_POLICY['read_timeout']})")
+    parser.add_argument("--max-retries", type=int, default=None, help=f"Retries per API call on timeouts, 429 and 5xx (default: {REQUEST_POLICY['max_retries']})")
+    parser.add_argument("--hedge-after", type=float, default=None, help=f"Send a duplicate request when a call is slower than this many seconds, 0 disables (default: {REQUEST_POLICY['hedge_after']})")
+    parser.add_argument("--no-coverage", action="store_true", help="Ignore the local coverage index and fetch every range from the API.")
+    parser.add_argument("--job-timeout", type=float, default=None, help="Overall deadline in seconds for all API calls of this run (default: none)")
+
+    parser.add_argument("--tail", action="store_true", help="Keep polling the latest candles instead of a fixed start_time/end_time.")
+    parser.add_argument("--tokens", default=None, help="Comma-separated token addresses to tail (default: --token or the configured address).")
+    parser.add_argument("--tail-type", default="1m", help="Candle type to tail (default: 1m).")
+    parser.add_argument("--poll-seconds", type=float, default=5.0, help="Seconds between tail polls (default: 5).")
+    parser.add_argument("--tail-duration", type=float, default=None, help="Stop tailing after this many seconds (default: run until interrupted).")
+    parser.add_argument("--tail-compare", action="store_true", help="Compare each closed candle against hubble (needs HUBBLE_CLICKHOUSE_* settings).")
+    parser.add_argument("--compare-delay", type=float, default=3.0, help="Seconds after a candle closes before it is compared (default: 3).")
+    parser.add_argument("--compare-timeout", type=float, default=120.0, help="Alert when hubble still lacks a candle this many seconds after close (default: 120).")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Deviation alert threshold in percent for --tail-compare (default: 0.1).")
+
+    parser.add_argument("--profile", nargs="?", const="stages", choices=profiling.PROFILE_MODES, default=None,
+                        help="Record wall/CPU time per stage; 'cprofile' or 'sample' also capture a function-level profile (default mode: stages).")
+    parser.add_argument("--profile-dir", default=None, help="Where to write the profile report, relative to the script location (default: <output-dir>/profile).")
 
     args = parser.parse_args()
+    configure_request_policy(
+        job_timeout=args.job_timeout,
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.read_timeout,
+        max_retries=args.max_retries,
+        hedge_after=args.hedge_after,
+        requests_per_second=1.0 / args.rate_limit_sleep if args.rate_limit_sleep > 0 else None,
+    )
+    if not args.tail and args.manifest is None and (args.start_time is None or args.end_time is None):
+        parser.error("start_time and end_time are required unless --manifest or --tail is given")
+    if args.profile:
+        profiling.profile_run(args.profile, os.path.join(os.path.dirname(__file__), args.profile_dir or os.path.join(args.output_dir, "profile")))
 
     print("--- Script Start ---")
 
@@ -300,6 +1250,37 @@ if __name__ == "__main__":
     if config is None:
         print("Exiting due to configuration error.")
         exit(1)
+
+    script_dir = os.path.dirname(__file__)
+    coverage = None if args.no_coverage else coverage_index.CoverageIndex()
+
+    if args.tail:
+        tokens = [t.strip() for t in (args.tokens or args.token or config.get("common_parameters", {}).get("address", "")).split(",") if t.strip()]
+        store_dir = os.path.join(script_dir, args.output_dir, "live")
+        comparator = None
+        if args.tail_compare:
+            comparator = LiveComparator(store_dir, args.tail_type, args.compare_delay, args.compare_timeout, args.threshold)
+        run_tail(config, api_key, tokens, args.tail_type, store_dir, args.poll_seconds, comparator=comparator,
+                 duration=args.tail_duration)
+        print("\n--- Script End ---")
+        exit(0)
+
+    if args.manifest:
+        summary = run_manifest(
+            config, api_key, args.manifest, script_dir, args.output_dir,
+            args.token or config.get("common_parameters", {}).get("address"),
+            args.chunk_hours, args.rate_limit_sleep, args.skip_integrity_check, args.max_backfill_requests,
+            coverage
+        )
+        print("\n--- Manifest Summary ---")
+        for entry in summary:
+            print(json.dumps(entry))
+        failed_count = sum(entry["status"] in ("failed", "invalid") for entry in summary)
+        empty_count = sum(entry["status"] == "empty" for entry in summary)
+        print(f"{len(summary) - failed_count - empty_count}/{len(summary)} work items succeeded, "
+              f"{empty_count} empty, {failed_count} failed")
+        print("\n--- Script End ---")
+        exit(1 if failed_count else 0)
         
     # 3. Set token address if provided
     token_address = args.token
@@ -334,54 +1315,14 @@ if __name__ == "__main__":
     print(f"Human-readable End:   {end_human}")
 
     # 5. Define Output Directory
-    script_dir = os.path.dirname(__file__)
     output_csv_dir = os.path.join(script_dir, args.output_dir)
     print(f"\nOutput directory for CSVs: {output_csv_dir}")
 
-    # 6. Split the time range into chunks if necessary
-    time_chunks = chunk_time_range(start_unix, end_unix, args.chunk_hours)
-    total_hours = (end_unix - start_unix) / 3600
-    print(f"\nTotal time range: {total_hours:.2f} hours")
-    print(f"Splitting into {len(time_chunks)} chunks of maximum {args.chunk_hours} hours each")
-    
-    # Display rate limit settings
-    print(f"Rate limit sleep time between requests: {args.rate_limit_sleep} seconds")
-    print(f"API limit: 60 requests per minute")
-
-    # 7. Iterate through request configs, fetch data for all chunks, and save
-    print("\n--- Fetching Data from Birdeye API & Saving ---")
-    api_results = {}
-    ohlcv_requests_config = config.get("ohlcv_requests", [])
-    if not ohlcv_requests_config:
-        print("Warning: No 'ohlcv_requests' found in the configuration file.")
-
-    for request_conf in ohlcv_requests_config:
-        request_name = request_conf.get("name", request_conf.get("endpoint", "unnamed_request"))
-        
-        # Use the new function to fetch and combine data from all chunks
-        combined_data = fetch_and_combine_data(
-            config, 
-            request_conf, 
-            time_chunks, 
-            api_key, 
-            token_address,
-            args.rate_limit_sleep
-        )
-        
-        if combined_data is not None:
-            api_results[request_name] = combined_data
-            print(f"Successfully fetched all data for {request_name}.")
-            # Generate filename and save
-            csv_filename = f"{request_name}.csv"
-            save_to_csv(combined_data, csv_filename, output_csv_dir)
-        else:
-            print(f"Failed to fetch data for {request_name}. Skipping CSV save.")
-            api_results[request_name] = None
-
-        # Add a delay between different request types
-        if request_conf != ohlcv_requests_config[-1]:  # If not the last request
-            sleep_time = args.rate_limit_sleep * 2  # Double sleep time between different request types
-            print(f"\nSleeping for {sleep_time} seconds before next request type...")
-            time.sleep(sleep_time)
+    # 6-7. Split the time range into chunks, fetch data for all request types and save
+    fetch_work_item(
+        config, api_key, token_address, start_unix, end_unix, output_csv_dir,
+        args.chunk_hours, args.rate_limit_sleep, args.skip_integrity_check, args.max_backfill_requests,
+        coverage
+    )
 
     print("\n--- Script End ---")
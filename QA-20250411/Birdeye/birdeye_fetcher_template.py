@@ -67,6 +67,11 @@ def load_config(config_path=None):
         with open(config_path, 'r', encoding='utf-8') as f:
             config = json.load(f)
         print(f"Configuration loaded successfully from {config_path}\n")
+        # BIRDEYE_BASE_URL points the fetcher at another backend (e.g. the load test's mock)
+        base_url_override = os.getenv("BIRDEYE_BASE_URL")
+        if base_url_override:
+            config.setdefault("common_parameters", {})["base_url"] = base_url_override
+            print(f"Using Birdeye base URL from BIRDEYE_BASE_URL: {base_url_override}\n")
         return config
     except Exception as e:
         print(f"Error loading configuration: {e}")
@@ -349,5 +354,7 @@ if __name__ == "__main__":
     print(f"Token: {token_address}")
     
     # Pass the command line arguments to the main function
-    sys.argv = ["birdeye_fetch.py", start_time, end_time, "--token", token_address]
+    # Each generated script writes to its own job directory under output_csv
+    output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "output_csv", "__JOB_ID__")
+    sys.argv = ["birdeye_fetch.py", start_time, end_time, "--token", token_address, "--output-dir", output_dir]
     main()
@@ -0,0 +1,204 @@
+import csv
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Persistent index of which time ranges are already available locally, per
+# (token, candle interval, source). Every saved fetch (source 'birdeye') or ingested
+# export (source 'hubble') is one segment [start, end] (Unix seconds, inclusive)
+# pointing at the file that holds it. Segments live in SQLite so fetcher processes
+# and app workers share them; lookups go through an in-memory interval tree per key
+# that is rebuilt only when the key has new segments.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# QA_COVERAGE_INDEX lets the app and the fetchers it launches share another index file
+DEFAULT_INDEX_PATH = os.environ.get('QA_COVERAGE_INDEX', os.path.join(SCRIPT_DIR, 'state', 'coverage.sqlite3'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    token TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    source TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_segments_key ON segments (token, interval, source);
+"""
+
+CANDLE_FIELDS = ['o', 'h', 'l', 'c', 'v']
+
+
+# --- Interval Tree ---
+class IntervalTree:
+    """
+    Static interval tree over (start, end, payload) segments: an implicit balanced
+    BST on the sorted starts, where every node also stores the largest end in its
+    subtree, so overlap queries skip subtrees that end before the query starts.
+    """
+
+    def __init__(self, segments):
+        self.segments = sorted(segments, key=lambda s: (s[0], s[1]))
+        self.max_end = [0] * len(self.segments)
+        self._build(0, len(self.segments) - 1)
+
+    def _build(self, lo, hi):
+        if lo > hi:
+            return None
+        mid = (lo + hi) // 2
+        max_end = self.segments[mid][1]
+        for child in (self._build(lo, mid - 1), self._build(mid + 1, hi)):
+            if child is not None:
+                max_end = max(max_end, self.max_end[child])
+        self.max_end[mid] = max_end
+        return mid
+
+    def overlapping(self, start, end):
+        """Segments with segment.start <= end and segment.end >= start, in start order."""
+        found = []
+        stack = [(0, len(self.segments) - 1)]
+        while stack:
+            lo, hi = stack.pop()
+            if lo > hi:
+                continue
+            mid = (lo + hi) // 2
+            if self.max_end[mid] < start:
+                continue
+            seg_start, seg_end, _ = self.segments[mid]
+            stack.append((lo, mid - 1))
+            if seg_start <= end:
+                if seg_end >= start:
+                    found.append(self.segments[mid])
+                stack.append((mid + 1, hi))
+        return sorted(found, key=lambda s: (s[0], s[1]))
+
+
+def subtract_ranges(start, end, covered, step=1):
+    """
+    Splits [start, end] into the covered part and the missing part given covered
+    segments. Segments less than one candle (step) apart count as contiguous.
+    Returns (covered_ranges, missing_ranges), both merged and clipped to the window.
+    """
+    merged = []
+    for seg_start, seg_end in sorted(covered):
+        seg_start, seg_end = max(seg_start, start), min(seg_end, end)
+        if seg_start > seg_end:
+            continue
+        if merged and seg_start <= merged[-1][1] + step:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], seg_end))
+        else:
+            merged.append((seg_start, seg_end))
+
+    missing = []
+    cursor = start
+    for seg_start, seg_end in merged:
+        if seg_start - cursor >= step:
+            missing.append((cursor, seg_start - 1))
+        cursor = max(cursor, seg_end + 1)
+    if end - cursor >= 0 and (not merged or end - merged[-1][1] >= step):
+        missing.append((cursor, end))
+    return merged, missing
+
+
+# --- Index ---
+class CoverageIndex:
+    def __init__(self, path=DEFAULT_INDEX_PATH, busy_timeout_ms=5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._trees = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000)
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, token, interval, source, start, end, path):
+        """Records that [start, end] of (token, interval, source) is stored in path (once per identical segment)."""
+        row = (token, interval, source, int(start), int(end), os.path.abspath(path))
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO segments (token, interval, source, start, end, path, created_at) "
+                "SELECT ?, ?, ?, ?, ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM segments WHERE token = ? AND interval = ? "
+                "AND source = ? AND start = ? AND end = ? AND path = ?)",
+                row + (datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),) + row)
+
+    def _tree(self, token, interval, source):
+        key = (token, interval, source)
+        with self._connect() as conn:
+            version = conn.execute(
+                "SELECT COUNT(*), MAX(id) FROM segments WHERE token = ? AND interval = ? AND source = ?", key).fetchone()
+            with self._lock:
+                cached = self._trees.get(key)
+                if cached is not None and cached[0] == version:
+                    return cached[1]
+            rows = conn.execute(
+                "SELECT id, start, end, path FROM segments WHERE token = ? AND interval = ? AND source = ?", key).fetchall()
+        tree = IntervalTree([(start, end, (segment_id, path)) for segment_id, start, end, path in rows])
+        with self._lock:
+            self._trees[key] = (version, tree)
+        return tree
+
+    def segments(self, token, interval, source, start, end):
+        """
+        Segments overlapping [start, end] as (start, end, path), oldest first.
+        Segments whose file no longer exists are removed from the index.
+        """
+        found, stale = [], []
+        for seg_start, seg_end, (segment_id, path) in self._tree(token, interval, source).overlapping(start, end):
+            if os.path.exists(path):
+                found.append((segment_id, seg_start, seg_end, path))
+            else:
+                stale.append(segment_id)
+        if stale:
+            with self._connect() as conn:
+                conn.executemany("DELETE FROM segments WHERE id = ?", [(i,) for i in stale])
+        return [(seg_start, seg_end, path) for _, seg_start, seg_end, path in sorted(found)]
+
+    def coverage(self, token, interval, source, start, end, step=1):
+        """
+        Reports how much of [start, end] is available locally:
+        {"covered": [(s, e)], "missing": [(s, e)], "complete": bool, "covered_fraction": float}.
+        """
+        covered, missing = subtract_ranges(
+            start, end, [(s, e) for s, e, _ in self.segments(token, interval, source, start, end)], step)
+        span = end - start + 1
+        missing_seconds = sum(e - s + 1 for s, e in missing)
+        return {
+            'covered': covered,
+            'missing': missing,
+            'complete': not missing,
+            'covered_fraction': 1 - missing_seconds / span if span > 0 else 1.0,
+        }
+
+    def load_candles(self, token, interval, start, end):
+        """
+        Birdeye candles with unixTime in [start, end] read from the covering CSVs.
+        Later segments win for candles present in several files. Returns items sorted by unixTime.
+        """
+        by_time = {}
+        for _, _, path in self.segments(token, interval, 'birdeye', start, end):
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                for row in csv.DictReader(f):
+                    unix_time = int(float(row['unixTime']))
+                    if start <= unix_time <= end:
+                        item = dict(row)
+                        item['unixTime'] = unix_time
+                        for field in CANDLE_FIELDS:
+                            if item.get(field) not in (None, ''):
+                                item[field] = float(item[field])
+                        by_time[unix_time] = item
+        return [by_time[t] for t in sorted(by_time)]
@@ -0,0 +1,299 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Opt-in profiling for the fetcher, the comparison runner and jobs launched by app.py.
+# Code marks named stages with `with profiling.stage('save_to_csv'):`; stages nest per
+# thread, so a stage is identified by its path ("fetch_work_item;http_request"). While
+# profiling is disabled (the default) stage() only returns a shared no-op context.
+#
+# When enabled, every stage records calls, wall time and the CPU time of its thread.
+# Optional modes add a cProfile of the enabling thread ('cprofile') or a sampling
+# profiler that snapshots the stacks of all threads inside a stage ('sample').
+# write_report() produces in the profile directory:
+#   stages.json         per-stage calls / wall / CPU / self wall time
+#   stages.folded       stage paths weighted by self wall milliseconds (collapsed stacks)
+#   samples.folded      'sample' mode: stage path + Python frames per sample (collapsed stacks)
+#   profile.prof        'cprofile' mode: pstats file (snakeviz, `python -m pstats`)
+# The .folded files are the collapsed-stack format read by flamegraph.pl and speedscope.
+# Each file is written to a temporary name and renamed into place, so a reader polling
+# the directory (app.py's /jobs) never sees a partially written report.
+
+PROFILE_MODES = ['stages', 'cprofile', 'sample']
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+
+@contextmanager
+def _atomic_path(path):
+    """Yields a temporary path next to path and renames it over path once the block succeeds."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class _NoStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+# --- Sampling ---
+class StackSampler(threading.Thread):
+    """Periodically records the Python stack of every thread that is inside a stage."""
+
+    def __init__(self, profiler, interval=DEFAULT_SAMPLE_INTERVAL):
+        super().__init__(name='profiling-sampler', daemon=True)
+        self.profiler = profiler
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own_ident = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                stages = self.profiler.stage_path(ident)
+                if ident == own_ident or not stages:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                key = ";".join([f"[{name}]" for name in stages] + frames[::-1])
+                with self.profiler.lock:
+                    self.profiler.samples[key] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+# --- Profiler ---
+class Profiler:
+    def __init__(self, mode='stages', sample_interval=DEFAULT_SAMPLE_INTERVAL):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}', expected one of {PROFILE_MODES}")
+        self.mode = mode
+        self.sample_interval = sample_interval
+        self.lock = threading.Lock()
+        self.stages = {}  # "a;b" -> [calls, wall seconds, cpu seconds, child wall seconds]
+        self.samples = Counter()
+        self._stacks = {}  # thread ident -> list of open stage names
+        self._cprofile = None
+        self._sampler = None
+        self.started = None
+        self.wall_seconds = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.mode == 'cprofile':
+            import cProfile
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        elif self.mode == 'sample':
+            self._sampler = StackSampler(self, self.sample_interval)
+            self._sampler.start()
+        return self
+
+    def stop(self):
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        if self.started is not None:
+            self.wall_seconds = time.perf_counter() - self.started
+
+    def stage_path(self, ident=None):
+        return list(self._stacks.get(threading.get_ident() if ident is None else ident, ()))
+
+    @contextmanager
+    def stage(self, name):
+        stack = self._stacks.setdefault(threading.get_ident(), [])
+        stack.append(name)
+        path = ";".join(stack)
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            stack.pop()
+            parent = ";".join(stack)
+            with self.lock:
+                record = self.stages.setdefault(path, [0, 0.0, 0.0, 0.0])
+                record[0] += 1
+                record[1] += wall
+                record[2] += cpu
+                if parent:
+                    self.stages.setdefault(parent, [0, 0.0, 0.0, 0.0])[3] += wall
+
+    # --- Export / Merge ---
+    def to_dict(self):
+        """Plain-data state, so worker processes can hand their measurements to the parent."""
+        return {'mode': self.mode, 'wall_seconds': self.wall_seconds,
+                'stages': self.stages, 'samples': dict(self.samples)}
+
+    def merge_dict(self, state, prefix=None):
+        """
+        Adds another profiler's to_dict() state, optionally nesting its stages under prefix.
+        The prefix stage gets one call per merged state, with that profiler's total wall time.
+        """
+        with self.lock:
+            if prefix:
+                roots = [record for path, record in state['stages'].items() if ';' not in path]
+                target = self.stages.setdefault(prefix, [0, 0.0, 0.0, 0.0])
+                target[0] += 1
+                target[1] += state['wall_seconds'] or sum(r[1] for r in roots)
+                target[2] += sum(r[2] for r in roots)
+                target[3] += sum(r[1] for r in roots)
+            for path, record in state['stages'].items():
+                path = f"{prefix};{path}" if prefix else path
+                target = self.stages.setdefault(path, [0, 0.0, 0.0, 0.0])
+                for i, value in enumerate(record):
+                    target[i] += value
+            for key, count in state['samples'].items():
+                self.samples[f"[{prefix}];{key}" if prefix else key] += count
+
+    def stage_rows(self):
+        """Per-stage breakdown sorted by path: stage, calls, wall_s, cpu_s, self_wall_s."""
+        return [{
+            'stage': path,
+            'calls': calls,
+            'wall_s': round(wall, 6),
+            'cpu_s': round(cpu, 6),
+            'self_wall_s': round(max(0.0, wall - child_wall), 6),
+        } for path, (calls, wall, cpu, child_wall) in sorted(self.stages.items(), key=lambda kv: kv[0].split(';'))]
+
+    def write_report(self, profile_dir):
+        """Writes the report files described at the top of this module; returns profile_dir."""
+        os.makedirs(profile_dir, exist_ok=True)
+        rows = self.stage_rows()
+        # stages.json goes last: app.py treats its presence as "report ready"
+        with _atomic_path(os.path.join(profile_dir, 'stages.folded')) as path:
+            with open(path, 'w', encoding='utf-8') as f:
+                for row in rows:
+                    self_ms = int(round(row['self_wall_s'] * 1000))
+                    if self_ms > 0:
+                        f.write(f"{row['stage']} {self_ms}\n")
+        if self.samples:
+            with _atomic_path(os.path.join(profile_dir, 'samples.folded')) as path:
+                with open(path, 'w', encoding='utf-8') as f:
+                    for key, count in sorted(self.samples.items()):
+                        f.write(f"{key} {count}\n")
+        self.dump_cprofile(os.path.join(profile_dir, 'profile.prof'))
+        with _atomic_path(os.path.join(profile_dir, 'stages.json')) as path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'mode': self.mode, 'wall_seconds': self.wall_seconds, 'stages': rows}, f, indent=2)
+        return profile_dir
+
+    def dump_cprofile(self, path):
+        """Writes the cProfile stats ('cprofile' mode only); returns path, or None when there is nothing to write."""
+        if self._cprofile is None:
+            return None
+        with _atomic_path(path) as tmp_path:
+            self._cprofile.dump_stats(tmp_path)
+        return path
+
+    def print_report(self):
+        total = f" (total wall {self.wall_seconds:.3f}s)" if self.wall_seconds is not None else ""
+        print(f"\n===== Profile by stage{total} =====")
+        print(f"{'stage':<60} {'calls':>7} {'wall s':>10} {'cpu s':>10} {'self s':>10}")
+        for row in self.stage_rows():
+            depth = row['stage'].count(';')
+            name = '  ' * depth + row['stage'].rsplit(';', 1)[-1]
+            print(f"{name:<60} {row['calls']:>7} {row['wall_s']:>10.3f} {row['cpu_s']:>10.3f} {row['self_wall_s']:>10.3f}")
+
+
+# --- Module-level Profiler ---
+_active = None
+
+
+def enable(mode='stages', sample_interval=DEFAULT_SAMPLE_INTERVAL):
+    """Starts the process-wide profiler that stage() reports to; returns it."""
+    global _active
+    _active = Profiler(mode, sample_interval).start()
+    return _active
+
+
+def disable():
+    """Stops and detaches the process-wide profiler; returns it (None if none was active)."""
+    global _active
+    profiler, _active = _active, None
+    if profiler is not None:
+        profiler.stop()
+    return profiler
+
+
+def active():
+    return _active
+
+
+def stage(name):
+    """Context manager timing one named stage; a no-op unless enable() was called."""
+    if _active is None:
+        return _NO_STAGE
+    return _active.stage(name)
+
+
+def carry_stages(fn):
+    """Wraps fn so that, run on another thread, it records its stages under the caller's current stage."""
+    profiler = _active
+    if profiler is None:
+        return fn
+    path = profiler.stage_path()
+
+    def run(*args, **kwargs):
+        stack = profiler._stacks.setdefault(threading.get_ident(), [])
+        saved = stack[:]
+        stack[:] = path
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            stack[:] = saved
+    return run
+
+
+def profile_run(mode, profile_dir, sample_interval=DEFAULT_SAMPLE_INTERVAL):
+    """
+    CLI helper: enables profiling for the rest of the process and, when the process
+    exits (including via exit()), writes the report to profile_dir and prints the breakdown.
+    """
+    profiler = enable(mode, sample_interval)
+
+    def finish():
+        if _active is profiler:
+            disable()
+        profiler.write_report(profile_dir)
+        profiler.print_report()
+        print(f"Profile written to {profile_dir}")
+
+    atexit.register(finish)
+    return profiler
+
+
+def merge_cprofile_files(paths, output_path):
+    """Combines several pstats files (e.g. one per worker process) into one."""
+    import pstats
+    paths = [p for p in paths if os.path.exists(p)]
+    if not paths:
+        return None
+    stats = pstats.Stats(paths[0])
+    for path in paths[1:]:
+        stats.add(path)
+    with _atomic_path(output_path) as tmp_path:
+        stats.dump_stats(tmp_path)
+    return output_path
@@ -0,0 +1,329 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+import deviation_stats
+import hubble_store
+import summary_cube
+from kline_compare import load_birdeye_csv, load_hubble_csv
+
+# kline_compare puts the Birdeye folder on sys.path
+import coverage_index
+import profiling
+
+# Each work item is one (token, period, interval) comparison whose inputs are files on disk:
+#   {"token": ..., "period": ..., "interval": "1m", "start": unix, "end": unix,
+#    "hubble_path": "...csv", "birdeye_path": "...csv"}
+# Workers receive only these small dicts and write their accumulators to shard_<id>.json,
+# so no DataFrame is ever pickled between processes. Hubble exports are ingested into
+# hubble_store column files once, before the shards start, and memory-mapped by workers.
+
+
+# --- Work Plan ---
+def load_work_plan(path):
+    """Reads work items from a JSON lines file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def plan_fingerprint(work_items):
+    """Order-independent hash of a work plan, used to tell whether a saved shard layout still matches it."""
+    lines = sorted(json.dumps(item, sort_keys=True) for item in work_items)
+    return hashlib.sha256("\n".join(lines).encode('utf-8')).hexdigest()
+
+
+def group_key(item):
+    return f"{item['token']}|{item['period']}|{item['interval']}"
+
+
+def item_cost(item):
+    """Estimated cost of one work item: total bytes of its input files."""
+    return sum(os.path.getsize(item[k]) for k in ('hubble_path', 'birdeye_path') if os.path.exists(item[k]))
+
+
+def build_shards(work_items, num_shards):
+    """
+    Partitions the work items into num_shards shards of similar total input size
+    (largest item first onto the currently lightest shard).
+    """
+    shards = [[] for _ in range(max(1, min(num_shards, len(work_items))))]
+    loads = [0] * len(shards)
+    for item in sorted(work_items, key=item_cost, reverse=True):
+        target = loads.index(min(loads))
+        shards[target].append(item)
+        loads[target] += item_cost(item)
+    return shards
+
+
+# --- Shard Execution ---
+def shard_result_path(output_dir, shard_id):
+    return os.path.join(output_dir, f"shard_{shard_id:04d}.json")
+
+
+def shard_profile_path(profile_dir, shard_id):
+    return os.path.join(profile_dir, f"shard_{shard_id:04d}.json")
+
+
+def run_shard(shard_id, items, output_dir, use_store=True, profile_mode=None, profile_dir=None):
+    """
+    Compares every item of one shard and writes the per-group accumulators; returns the result path.
+    With profile_mode the worker profiles this shard and writes shard_<id>.json
+    (plus shard_<id>.prof in cprofile mode) into profile_dir for the parent to merge.
+    """
+    if profile_mode:
+        profiling.enable(profile_mode)
+    try:
+        groups = {}
+        for item in items:
+            with profiling.stage('load_hubble'):
+                if use_store:
+                    our_data = hubble_store.load_hubble(item['hubble_path'], item.get('start'), item.get('end'))
+                else:
+                    our_data = load_hubble_csv(item['hubble_path'])
+            with profiling.stage('load_birdeye'):
+                birdeye_data = load_birdeye_csv(item['birdeye_path'])
+            with profiling.stage('merge'):
+                if 'start' in item and 'end' in item:
+                    our_data = our_data[our_data['k_time'].between(item['start'], item['end'])]
+                    birdeye_data = birdeye_data[birdeye_data['k_time'].between(item['start'], item['end'])]
+                merged = pd.merge(our_data, birdeye_data, on='k_time', suffixes=('_ours', '_birdeye'))
+            with profiling.stage('accumulate'):
+                key = group_key(item)
+                groups.setdefault(key, deviation_stats.DeviationAccumulator()).update(merged)
+
+        path = shard_result_path(output_dir, shard_id)
+        tmp_path = f"{path}.tmp"
+        with profiling.stage('write_shard'):
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'shard_id': shard_id, 'groups': {k: acc.to_dict() for k, acc in groups.items()}}, f)
+            os.replace(tmp_path, path)
+    finally:
+        # Pool workers are reused, so a failed shard must not leave the profiler enabled for the next one
+        profiler = profiling.disable() if profile_mode else None
+
+    # Only successful attempts report their profile; a retried shard reports its last attempt
+    if profiler is not None:
+        os.makedirs(profile_dir, exist_ok=True)
+        with open(shard_profile_path(profile_dir, shard_id), 'w', encoding='utf-8') as f:
+            json.dump(profiler.to_dict(), f)
+        profiler.dump_cprofile(os.path.join(profile_dir, f"shard_{shard_id:04d}.prof"))
+    return path
+
+
+def run_shards(shards, output_dir, workers=None, max_retries=2, use_store=True, profile_mode=None, profile_dir=None):
+    """
+    Runs the shards on a process pool. Shards that already have a result file are
+    skipped, and a failing shard is resubmitted up to max_retries times. When a worker
+    dies (e.g. killed for running out of memory) the pool breaks and every unfinished
+    shard fails with it; the pool is then rebuilt and those shards count one attempt each.
+    Returns the list of result paths; raises RuntimeError if a shard keeps failing.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    pending = {i: shard for i, shard in enumerate(shards) if not os.path.exists(shard_result_path(output_dir, i))}
+    skipped = len(shards) - len(pending)
+    if skipped:
+        print(f"Reusing {skipped} shard results already in {output_dir}")
+
+    attempts = {i: 0 for i in pending}
+    failed = {}
+    while pending:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            futures = {pool.submit(run_shard, i, shard, output_dir, use_store, profile_mode, profile_dir): i
+                       for i, shard in pending.items()}
+            for future in as_completed(futures):
+                shard_id = futures[future]
+                try:
+                    future.result()
+                    print(f"Shard {shard_id} done ({len(shards[shard_id])} items)")
+                    del pending[shard_id]
+                    continue
+                except BrokenProcessPool as e:
+                    error = f"worker process died ({e})"
+                except Exception as e:
+                    error = e
+                attempts[shard_id] += 1
+                if attempts[shard_id] <= max_retries:
+                    print(f"Shard {shard_id} failed ({error}), retry {attempts[shard_id]}/{max_retries}")
+                else:
+                    print(f"Shard {shard_id} failed after {max_retries} retries: {error}")
+                    failed[shard_id] = error
+                    del pending[shard_id]
+
+    if failed:
+        raise RuntimeError(f"Shards {sorted(failed)} failed; rerun to retry only those shards")
+    return [shard_result_path(output_dir, i) for i in range(len(shards))]
+
+
+def merge_shard_profiles(profiler, profile_dir, num_shards):
+    """
+    Adds the worker profiles of this run under a 'shards' stage. Worker times add up
+    across processes, so 'shards' can exceed the wall time of the 'run_shards' stage.
+    """
+    prof_paths = []
+    for shard_id in range(num_shards):
+        path = shard_profile_path(profile_dir, shard_id)
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            profiler.merge_dict(json.load(f), prefix='shards')
+        prof_paths.append(os.path.join(profile_dir, f"shard_{shard_id:04d}.prof"))
+    profiling.merge_cprofile_files(prof_paths, os.path.join(profile_dir, 'shards.prof'))
+
+
+# --- Reduce ---
+def reduce_shard_results(paths):
+    """Merges the per-group accumulators of all shard result files."""
+    groups = {}
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            shard = json.load(f)
+        for key, state in shard['groups'].items():
+            acc = deviation_stats.DeviationAccumulator.from_dict(state)
+            if key in groups:
+                groups[key].merge(acc)
+            else:
+                groups[key] = acc
+    return groups
+
+
+def build_reports(groups):
+    """Builds the deviation_analysis rows per (token, period, interval, metric) and the per-metric summary."""
+    rows = []
+    total = None
+    for key, acc in sorted(groups.items()):
+        token, period, interval = key.split('|')
+        for metric, stats in acc.results().items():
+            rows.append({
+                'pair': token,
+                'period': period,
+                'interval': interval,
+                'metric': metric,
+                'mean_deviation': stats['mean'],
+                'median_deviation': stats['median'],
+                'std_deviation': stats['std'],
+                'p95_deviation': stats['p95'],
+                'max_deviation': stats['max'],
+                'ks_stat': stats['ks_stat'],
+                'sample_size': stats['count'],
+            })
+        total = deviation_stats.DeviationAccumulator.from_dict(acc.to_dict()) if total is None else total.merge(acc)
+
+    results_df = pd.DataFrame(rows)
+    summary_rows = []
+    if total is not None:
+        for metric, stats in total.results().items():
+            group_means = results_df.loc[results_df['metric'] == metric, 'mean_deviation']
+            summary_rows.append({
+                'metric': metric,
+                'mean_deviation': stats['mean'],
+                'max_group_mean_deviation': group_means.max(),
+                'median_deviation': stats['median'],
+                'std_deviation': stats['std'],
+                'p95_deviation': stats['p95'],
+                'max_deviation': stats['max'],
+                'ks_stat': stats['ks_stat'],
+                'sample_size': stats['count'],
+            })
+    return results_df, pd.DataFrame(summary_rows), total
+
+
+def update_summary_cube(groups, output_dir, cube_path=summary_cube.DEFAULT_CUBE_PATH):
+    """
+    Adds the reduced groups of this run to the summary cube once. The run is recorded
+    in the cube in the same atomic save as its data, so a rerun never counts it twice.
+    """
+    run_key = f"comparison_run:{os.path.abspath(output_dir)}"
+    tiers = summary_cube.load_liquidity_tiers()
+    with summary_cube.locked_cube(cube_path) as cube:
+        if cube.applied.get(run_key):
+            print("Summary cube already contains this run, skipping cube update")
+            return
+        for key, acc in groups.items():
+            token, period, interval = key.split('|')
+            cube.add_accumulator(token, tiers.get(token), period, interval, acc)
+        cube.mark_applied(run_key)
+    print(f"Summary cube updated to version {cube.version}")
+
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the hubble vs Birdeye comparison plan in shards across a process pool.")
+    parser.add_argument("plan", help="JSON lines work plan (token, period, interval, start, end, hubble_path, birdeye_path).")
+    parser.add_argument("--output-dir", default="comparison_run", help="Directory for shard results and reports.")
+    parser.add_argument("--shards", type=int, default=None, help="Number of shards (default: 4 x workers).")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores).")
+    parser.add_argument("--max-retries", type=int, default=2, help="Retries per failed shard (default: 2).")
+    parser.add_argument("--skip-cube", action="store_true", help="Do not add this run to the dashboard summary cube.")
+    parser.add_argument("--no-hubble-store", action="store_true", help="Parse the hubble CSV exports directly instead of the ingested column store.")
+    parser.add_argument("--profile", nargs="?", const="stages", choices=profiling.PROFILE_MODES, default=None,
+                        help="Record wall/CPU time per stage in this process and in the workers; 'cprofile' or 'sample' also capture function-level profiles.")
+    args = parser.parse_args()
+
+    profile_dir = os.path.join(args.output_dir, 'profile') if args.profile else None
+    if args.profile:
+        profiler = profiling.profile_run(args.profile, profile_dir)
+        # Worker profiles left by an earlier run would otherwise be merged into this one
+        if os.path.isdir(profile_dir):
+            for name in os.listdir(profile_dir):
+                if name.startswith('shard_'):
+                    os.remove(os.path.join(profile_dir, name))
+
+    work_items = load_work_plan(args.plan)
+    workers = args.workers or os.cpu_count()
+    # Keep shard ids stable across reruns so completed shards are not recomputed
+    shards_path = os.path.join(args.output_dir, 'shards.json')
+    if os.path.exists(shards_path):
+        with open(shards_path, 'r', encoding='utf-8') as f:
+            shards = json.load(f)
+        # Shard results of another plan must not be mixed into this one
+        if plan_fingerprint([item for shard in shards for item in shard]) != plan_fingerprint(work_items):
+            print(f"Error: {args.plan} differs from the plan of the run in {args.output_dir}; "
+                  f"use a new --output-dir (or delete {shards_path} and the shard results) to start over.")
+            exit(1)
+        print(f"Resuming run with shard layout from {shards_path}")
+    else:
+        shards = build_shards(work_items, args.shards or workers * 4)
+        os.makedirs(args.output_dir, exist_ok=True)
+        with open(shards_path, 'w', encoding='utf-8') as f:
+            json.dump(shards, f)
+    print(f"{len(work_items)} work items in {len(shards)} shards on {workers} workers")
+
+    started = time.time()
+    if not args.no_hubble_store:
+        # Ingest each export once here, so workers only memory-map the column files
+        with profiling.stage('ingest_hubble'):
+            coverage = coverage_index.CoverageIndex()
+            for hubble_path in sorted({item['hubble_path'] for item in work_items if not os.path.isdir(item['hubble_path'])}):
+                store_path = hubble_store.ingest_hubble_csv(hubble_path)
+                meta = hubble_store.read_meta(store_path)
+                if meta['rows']:
+                    for item in work_items:
+                        if item['hubble_path'] == hubble_path:
+                            coverage.add(item['token'], item['interval'], 'hubble', meta['start'], meta['end'], store_path)
+    with profiling.stage('run_shards'):
+        paths = run_shards(shards, args.output_dir, workers, args.max_retries, not args.no_hubble_store,
+                           args.profile, profile_dir)
+    if args.profile:
+        merge_shard_profiles(profiler, profile_dir, len(shards))
+    with profiling.stage('reduce'):
+        groups = reduce_shard_results(paths)
+    with profiling.stage('build_reports'):
+        results_df, summary, total = build_reports(groups)
+
+    with profiling.stage('write_reports'):
+        results_df.to_csv(os.path.join(args.output_dir, 'deviation_analysis.csv'), index=False)
+        summary.to_csv(os.path.join(args.output_dir, 'deviation_summary.csv'), index=False)
+        if total is not None:
+            total.save(os.path.join(args.output_dir, 'total_accumulator.json'))
+    if not args.skip_cube:
+        with profiling.stage('update_cube'):
+            update_summary_cube(groups, args.output_dir)
+    print(f"Finished in {time.time() - started:.1f}s")
+    print("===== Deviation summary =====")
+    print(summary.to_string(index=False))
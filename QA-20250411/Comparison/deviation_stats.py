@@ -0,0 +1,358 @@
+import argparse
+import json
+import math
+import os
+
+import numpy as np
+
+from kline_compare import METRICS, abs_pct_deviation
+
+# Mergeable replacements for the one-shot statistics in calculate_deviation.
+#
+# Error bounds:
+# - MomentsAccumulator (count/mean/std/min/max) is exact up to float64 rounding;
+#   merging uses Chan et al.'s pairwise update, so results do not depend on how
+#   the data was split into chunks, shards or days.
+# - KLLSketch quantiles (median/p95) have a normalized rank error of about
+#   1.7% at the default k=200 with 99% confidence (error shrinks as ~1/k).
+#   The returned value is exact data; only its rank is approximate.
+# - The sketch KS statistic is within eps_ours + eps_birdeye of the exact
+#   two-sample statistic, i.e. about 0.033 at k=200.
+# - LogHistogram quantiles are within half a bucket of the true value
+#   (about 6% relative at 20 buckets per decade).
+
+DEFAULT_SKETCH_K = 200
+
+
+# --- Moments ---
+class MomentsAccumulator:
+    """Count, mean, variance (Welford/Chan), min and max that can be updated in chunks and merged."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _combine(self, count, mean, m2, minimum, maximum):
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = min(self.min, minimum)
+        self.max = max(self.max, maximum)
+
+    def update(self, values):
+        values = np.asarray(values, dtype='float64')
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        mean = float(values.mean())
+        m2 = float(np.sum((values - mean) ** 2))
+        self._combine(int(values.size), mean, m2, float(values.min()), float(values.max()))
+
+    def merge(self, other):
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+        return self
+
+    @property
+    def std(self):
+        """Population standard deviation (matches np.std)."""
+        return math.sqrt(self.m2 / self.count) if self.count else float('nan')
+
+    def to_dict(self):
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2,
+                'min': self.min if self.count else None, 'max': self.max if self.count else None}
+
+    @classmethod
+    def from_dict(cls, data):
+        acc = cls()
+        acc.count = data['count']
+        acc.mean = data['mean']
+        acc.m2 = data['m2']
+        acc.min = math.inf if data['min'] is None else data['min']
+        acc.max = -math.inf if data['max'] is None else data['max']
+        return acc
+
+
+# --- Quantiles ---
+class KLLSketch:
+    """
+    KLL quantile sketch (Karnin, Lang, Liberty 2016). Level h holds items of
+    weight 2**h; a full level is sorted and every other item (random offset)
+    is promoted to the next level.
+    """
+
+    def __init__(self, k=DEFAULT_SKETCH_K, seed=None):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        while True:
+            full = [h for h, items in enumerate(self.levels) if items.size > self._capacity(h)]
+            if not full:
+                return
+            h = full[0]
+            if h + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(self.levels[h])
+            keep = items[:0]
+            if items.size % 2:
+                keep, items = items[-1:], items[:-1]
+            promoted = items[int(self._rng.integers(2))::2]
+            self.levels[h + 1] = np.concatenate((self.levels[h + 1], promoted))
+            self.levels[h] = keep
+
+    def update(self, values):
+        values = np.asarray(values, dtype='float64').ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        self.n += int(values.size)
+        self.levels[0] = np.concatenate((self.levels[0], values))
+        self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate((self.levels[h], items))
+        self.n += other.n
+        self._compress()
+        return self
+
+    def _weighted_items(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(level.size, 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], np.cumsum(weights[order])
+
+    def quantile(self, q):
+        if self.n == 0:
+            return float('nan')
+        items, cum_weights = self._weighted_items()
+        idx = np.searchsorted(cum_weights, q * cum_weights[-1], side='left')
+        return float(items[min(idx, items.size - 1)])
+
+    def cdf(self, x):
+        """Approximate fraction of inserted values <= x (x may be an array)."""
+        items, cum_weights = self._weighted_items()
+        if items.size == 0:
+            return np.full(np.shape(x), np.nan)
+        idx = np.searchsorted(items, x, side='right')
+        cum = np.concatenate(([0.0], cum_weights))
+        return cum[idx] / cum_weights[-1]
+
+    def to_dict(self):
+        return {'k': self.k, 'n': self.n, 'levels': [level.tolist() for level in self.levels]}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['k'])
+        sketch.n = data['n']
+        sketch.levels = [np.asarray(level, dtype='float64') for level in data['levels']]
+        return sketch
+
+
+class LogHistogram:
+    """
+    Fixed log-spaced buckets, mergeable by adding counts. Much smaller than a
+    KLL sketch when thousands of them are stored (e.g. summary cube cells);
+    quantiles are returned as the bucket's geometric midpoint, so the relative
+    error is at most half a bucket (about 6% at 20 buckets per decade).
+    """
+
+    def __init__(self, min_value=1e-6, max_value=1e3, buckets_per_decade=20):
+        self.min_value = min_value
+        self.max_value = max_value
+        self.buckets_per_decade = buckets_per_decade
+        decades = math.log10(max_value) - math.log10(min_value)
+        self.edges = np.logspace(math.log10(min_value), math.log10(max_value),
+                                 int(round(decades * buckets_per_decade)) + 1)
+        # counts[0] is the underflow bucket (including zeros), counts[-1] the overflow bucket
+        self.counts = np.zeros(self.edges.size + 1)
+
+    def update(self, values, weights=None):
+        values = np.asarray(values, dtype='float64').ravel()
+        valid = ~np.isnan(values)
+        idx = np.searchsorted(self.edges, values[valid], side='right')
+        w = None if weights is None else np.asarray(weights, dtype='float64').ravel()[valid]
+        self.counts += np.bincount(idx, weights=w, minlength=self.counts.size)
+
+    def merge(self, other):
+        self.counts += other.counts
+        return self
+
+    @property
+    def total(self):
+        return float(self.counts.sum())
+
+    def quantile(self, q):
+        total = self.total
+        if total == 0:
+            return float('nan')
+        bucket = int(np.searchsorted(np.cumsum(self.counts), q * total, side='left'))
+        if bucket == 0:
+            return 0.0
+        if bucket > self.edges.size - 1:
+            return self.max_value
+        return float(math.sqrt(self.edges[bucket - 1] * self.edges[bucket]))
+
+    def to_dict(self):
+        nonzero = np.flatnonzero(self.counts)
+        return {'min_value': self.min_value, 'max_value': self.max_value,
+                'buckets_per_decade': self.buckets_per_decade,
+                'bins': dict(zip(nonzero.tolist(), self.counts[nonzero].tolist()))}
+
+    @classmethod
+    def from_dict(cls, data):
+        hist = cls(data['min_value'], data['max_value'], data['buckets_per_decade'])
+        for idx, count in data['bins'].items():
+            hist.counts[int(idx)] = count
+        return hist
+
+
+def sketch_ks_statistic(sketch_a, sketch_b):
+    """Approximate two-sample KS statistic from two quantile sketches."""
+    if sketch_a.n == 0 or sketch_b.n == 0:
+        return float('nan')
+    grid = np.concatenate(sketch_a.levels + sketch_b.levels)
+    return float(np.max(np.abs(sketch_a.cdf(grid) - sketch_b.cdf(grid))))
+
+
+# --- Per-metric Deviation Accumulator ---
+class DeviationAccumulator:
+    """
+    Streaming counterpart of calculate_deviation: feed merged comparison
+    chunks, persist the state, merge states from other shards or days, and
+    read the same mean/median/std/p95/max/ks_stat/count results.
+    """
+
+    def __init__(self, k=DEFAULT_SKETCH_K):
+        self.k = k
+        self.moments = {m: MomentsAccumulator() for m in METRICS}
+        self.deviation_sketches = {m: KLLSketch(k) for m in METRICS}
+        self.ours_sketches = {m: KLLSketch(k) for m in METRICS}
+        self.birdeye_sketches = {m: KLLSketch(k) for m in METRICS}
+        # Latest k_time folded in by an incremental writer (validation_scheduler), None otherwise
+        self.applied_through = None
+
+    def update(self, merged_data):
+        """Adds a chunk of merged candles (columns <metric>_ours / <metric>_birdeye)."""
+        for m in METRICS:
+            ours = merged_data[f"{m}_ours"].to_numpy(dtype='float64')
+            theirs = merged_data[f"{m}_birdeye"].to_numpy(dtype='float64')
+            dev = abs_pct_deviation(ours, theirs)
+            self.moments[m].update(dev)
+            self.deviation_sketches[m].update(dev)
+            self.ours_sketches[m].update(ours)
+            self.birdeye_sketches[m].update(theirs)
+        return self
+
+    def merge(self, other):
+        for m in METRICS:
+            self.moments[m].merge(other.moments[m])
+            self.deviation_sketches[m].merge(other.deviation_sketches[m])
+            self.ours_sketches[m].merge(other.ours_sketches[m])
+            self.birdeye_sketches[m].merge(other.birdeye_sketches[m])
+        return self
+
+    def results(self):
+        results = {}
+        for m in METRICS:
+            moments = self.moments[m]
+            if moments.count == 0:
+                results[m] = {'mean': np.nan, 'median': np.nan, 'std': np.nan, 'p95': np.nan, 'max': np.nan,
+                              'ks_stat': np.nan, 'count': 0}
+                continue
+            results[m] = {
+                'mean': moments.mean,
+                'median': self.deviation_sketches[m].quantile(0.5),
+                'std': moments.std,
+                'p95': self.deviation_sketches[m].quantile(0.95),
+                'max': moments.max,
+                'ks_stat': sketch_ks_statistic(self.ours_sketches[m], self.birdeye_sketches[m]),
+                'count': moments.count,
+            }
+        return results
+
+    def to_dict(self):
+        return {
+            'k': self.k,
+            'applied_through': self.applied_through,
+            'metrics': {m: {
+                'moments': self.moments[m].to_dict(),
+                'deviation': self.deviation_sketches[m].to_dict(),
+                'ours': self.ours_sketches[m].to_dict(),
+                'birdeye': self.birdeye_sketches[m].to_dict(),
+            } for m in METRICS},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        acc = cls(data['k'])
+        acc.applied_through = data.get('applied_through')
+        for m in METRICS:
+            state = data['metrics'][m]
+            acc.moments[m] = MomentsAccumulator.from_dict(state['moments'])
+            acc.deviation_sketches[m] = KLLSketch.from_dict(state['deviation'])
+            acc.ours_sketches[m] = KLLSketch.from_dict(state['ours'])
+            acc.birdeye_sketches[m] = KLLSketch.from_dict(state['birdeye'])
+        return acc
+
+    def save(self, path):
+        """Writes the accumulator state as JSON (atomic replace)."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+def load_or_create(path, k=DEFAULT_SKETCH_K):
+    """Loads an accumulator from path, or returns an empty one if the file does not exist."""
+    if os.path.exists(path):
+        return DeviationAccumulator.load(path)
+    return DeviationAccumulator(k)
+
+
+def merge_accumulator_files(paths):
+    """Merges the accumulators saved at paths into one."""
+    merged = None
+    for path in paths:
+        acc = DeviationAccumulator.load(path)
+        merged = acc if merged is None else merged.merge(acc)
+    return merged
+
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge saved deviation accumulators (shards/days) and print the summary.")
+    parser.add_argument("inputs", nargs="+", help="Accumulator JSON files to merge.")
+    parser.add_argument("--output", help="Optional path to save the merged accumulator.")
+    args = parser.parse_args()
+
+    merged = merge_accumulator_files(args.inputs)
+    if args.output:
+        merged.save(args.output)
+        print(f"Merged accumulator saved to {args.output}")
+
+    print(f"{'metric':<8} {'count':>10} {'mean':>10} {'median':>10} {'std':>10} {'p95':>10} {'max':>10} {'ks_stat':>8}")
+    for metric, stats in merged.results().items():
+        print(f"{metric:<8} {stats['count']:>10} {stats['mean']:>10.4f} {stats['median']:>10.4f} "
+              f"{stats['std']:>10.4f} {stats['p95']:>10.4f} {stats['max']:>10.4f} {stats['ks_stat']:>8.4f}")
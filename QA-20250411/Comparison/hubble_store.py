@@ -0,0 +1,197 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from kline_compare import METRICS, hubble_rows_to_frame
+
+# One-time ingest of DBeaver CSV exports of hubble.old_dex_ohlcv_min / _hour.
+# Each export is parsed once into a version directory of .npy columns:
+#   k_time.npy (int64 Unix seconds, sorted and unique -> the time index)
+#   open.npy, high.npy, low.npy, close.npy, volume.npy (float64)
+#   meta.json (source path, size, mtime, sha256, row count, time range)
+# Later runs memory-map the columns and slice a [start, end] window with a binary
+# search on k_time, so no text is tokenized again.
+#
+# A store directory holds version directories and a 'current' file naming the live
+# one. A re-ingest writes a complete new version next to it and then replaces
+# 'current' with a single rename, so a reader sees either all old or all new columns.
+# A store without 'current' (or with a different source hash) is re-ingested.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_STORE_DIR = os.path.join(SCRIPT_DIR, 'state', 'hubble_store')
+
+STORE_COLUMNS = ['k_time'] + METRICS
+STORE_VERSION = 2
+CURRENT_FILE = 'current'
+HASH_BLOCK_SIZE = 1 << 20
+
+
+# --- Source Files ---
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_hubble_export(csv_path):
+    """
+    Parses a DBeaver export, reading only the columns the comparison uses.
+    Uses the multi-threaded pyarrow CSV engine when pyarrow is installed,
+    otherwise pandas' C engine.
+    """
+    header = pd.read_csv(csv_path, nrows=0).columns
+    usecols = [c for c in ['time', 'is_validated'] + METRICS if c in header]
+    try:
+        df = pd.read_csv(csv_path, usecols=usecols, engine='pyarrow')
+    except (ImportError, ValueError):
+        df = pd.read_csv(csv_path, usecols=usecols)
+    return hubble_rows_to_frame(df)
+
+
+# --- Store ---
+def store_path_for(csv_path, store_dir=DEFAULT_STORE_DIR):
+    """Store directory of one export: <file stem>_<hash of its absolute path>."""
+    abs_path = os.path.abspath(csv_path)
+    stem = os.path.splitext(os.path.basename(abs_path))[0]
+    return os.path.join(store_dir, f"{stem}_{hashlib.sha1(abs_path.encode('utf-8')).hexdigest()[:12]}")
+
+
+def current_version_path(store_path):
+    """Directory of the live version of a store, or None when nothing was ingested yet."""
+    try:
+        with open(os.path.join(store_path, CURRENT_FILE), 'r', encoding='utf-8') as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(store_path, name) if name else None
+
+
+def read_meta(store_path):
+    version_path = current_version_path(store_path)
+    if version_path is None:
+        return None
+    try:
+        with open(os.path.join(version_path, 'meta.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def write_meta(version_path, meta):
+    meta_path = os.path.join(version_path, 'meta.json')
+    tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, meta_path)
+
+
+def ingest_hubble_csv(csv_path, store_dir=DEFAULT_STORE_DIR, force=False):
+    """
+    Converts one export into its columnar store unless the store already holds
+    the same source content. An unchanged size and mtime skip the check; otherwise
+    the file is hashed and only re-parsed when the hash differs.
+    Returns the store directory.
+    """
+    store_path = store_path_for(csv_path, store_dir)
+    stat = os.stat(csv_path)
+    meta = read_meta(store_path)
+    if meta is not None and meta.get('version') == STORE_VERSION and not force:
+        if meta['source_size'] == stat.st_size and meta['source_mtime_ns'] == stat.st_mtime_ns:
+            return store_path
+        sha256 = file_sha256(csv_path)
+        if meta['source_sha256'] == sha256:
+            # Touched but unchanged: remember the new mtime so the next run skips hashing
+            meta.update(source_size=stat.st_size, source_mtime_ns=stat.st_mtime_ns)
+            write_meta(current_version_path(store_path), meta)
+            return store_path
+    else:
+        sha256 = file_sha256(csv_path)
+
+    started = time.time()
+    frame = read_hubble_export(csv_path)
+    # Readers only find the new version once 'current' names it, so it is written in place
+    version_name = f"v_{sha256[:12]}_{os.getpid()}_{time.time_ns()}"
+    version_path = os.path.join(store_path, version_name)
+    os.makedirs(version_path)
+    for column in STORE_COLUMNS:
+        dtype = 'int64' if column == 'k_time' else 'float64'
+        np.save(os.path.join(version_path, f"{column}.npy"), frame[column].to_numpy(dtype=dtype))
+    write_meta(version_path, {
+        'version': STORE_VERSION,
+        'source_path': os.path.abspath(csv_path),
+        'source_size': stat.st_size,
+        'source_mtime_ns': stat.st_mtime_ns,
+        'source_sha256': sha256,
+        'rows': int(len(frame)),
+        'start': int(frame['k_time'].iloc[0]) if len(frame) else None,
+        'end': int(frame['k_time'].iloc[-1]) if len(frame) else None,
+    })
+    previous_path = current_version_path(store_path)
+    current_path = os.path.join(store_path, CURRENT_FILE)
+    tmp_path = f"{current_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(version_name)
+    os.replace(tmp_path, current_path)
+    remove_stale_versions(store_path, keep={version_name, os.path.basename(previous_path or '')})
+    print(f"Ingested {csv_path}: {len(frame)} candles in {time.time() - started:.2f}s -> {store_path}")
+    return store_path
+
+
+def remove_stale_versions(store_path, keep):
+    """
+    Deletes version directories other than keep and the current one. The version
+    replaced last is kept, so a reader that resolved 'current' just before the swap
+    can still open it.
+    """
+    keep = set(keep) | {os.path.basename(current_version_path(store_path) or '')}
+    for name in os.listdir(store_path):
+        path = os.path.join(store_path, name)
+        if name in keep or name == CURRENT_FILE or name.startswith(f"{CURRENT_FILE}."):
+            continue
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def open_hubble_store(store_path, start_unix=None, end_unix=None):
+    """
+    Memory-maps the current version of a store and returns the candles with k_time
+    in [start_unix, end_unix] (all candles when omitted) in the layout of
+    kline_compare.load_hubble_csv. Only the selected window is copied into memory.
+    """
+    version_path = current_version_path(store_path)
+    if version_path is None:
+        raise FileNotFoundError(f"No ingested hubble data in {store_path}")
+    columns = {c: np.load(os.path.join(version_path, f"{c}.npy"), mmap_mode='r') for c in STORE_COLUMNS}
+    k_time = columns['k_time']
+    lo = 0 if start_unix is None else int(np.searchsorted(k_time, start_unix, side='left'))
+    hi = k_time.size if end_unix is None else int(np.searchsorted(k_time, end_unix, side='right'))
+    return pd.DataFrame({c: np.array(columns[c][lo:hi]) for c in STORE_COLUMNS})
+
+
+def load_hubble(path, start_unix=None, end_unix=None, store_dir=DEFAULT_STORE_DIR):
+    """Loads hubble candles from an export (ingested on first use) or from a store directory."""
+    if os.path.isdir(path):
+        return open_hubble_store(path, start_unix, end_unix)
+    return open_hubble_store(ingest_hubble_csv(path, store_dir), start_unix, end_unix)
+
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest DBeaver CSV exports of hubble old_dex_ohlcv_* into memory-mappable column files.")
+    parser.add_argument("csv_paths", nargs="+", help="DBeaver CSV exports.")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR, help="Where the column stores are kept.")
+    parser.add_argument("--force", action="store_true", help="Re-ingest even when the source hash is unchanged.")
+    args = parser.parse_args()
+
+    for csv_path in args.csv_paths:
+        store_path = ingest_hubble_csv(csv_path, args.store_dir, args.force)
+        meta = read_meta(store_path)
+        print(f"{csv_path}: {meta['rows']} candles, sha256 {meta['source_sha256'][:12]}, store {store_path}")
@@ -0,0 +1,164 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pandas as pd
+
+# The Birdeye fetcher lives next to this folder and is reused for the Birdeye side
+BIRDEYE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Birdeye')
+if BIRDEYE_DIR not in sys.path:
+    sys.path.insert(0, BIRDEYE_DIR)
+
+# OHLCV metrics compared between our K-lines and Birdeye
+METRICS = ['open', 'high', 'low', 'close', 'volume']
+
+# Birdeye candle type -> hubble table holding the same candles
+HUBBLE_TABLES = {
+    '1m': 'hubble.old_dex_ohlcv_min',
+    '1H': 'hubble.old_dex_ohlcv_hour',
+}
+
+# hubble `time` values are GMT+8 (same convention as the SQL generated by app.py)
+HUBBLE_UTC_OFFSET_HOURS = 8
+
+# Birdeye item keys -> comparison column names
+BIRDEYE_COLUMNS = {'unixTime': 'k_time', 'o': 'open', 'h': 'high', 'l': 'low', 'c': 'close', 'v': 'volume'}
+
+
+# --- Normalization ---
+def birdeye_items_to_frame(items):
+    """Converts Birdeye OHLCV items into a DataFrame keyed by k_time (Unix seconds)."""
+    df = pd.DataFrame(items, columns=list(BIRDEYE_COLUMNS))
+    df = df.rename(columns=BIRDEYE_COLUMNS)
+    df['k_time'] = df['k_time'].astype('int64')
+    return df.drop_duplicates('k_time', keep='last').sort_values('k_time').reset_index(drop=True)
+
+
+def hubble_time_to_unix(values):
+    """Converts hubble `time` values (GMT+8 wall clock) into Unix seconds."""
+    local = pd.to_datetime(pd.Series(values))
+    utc = local - pd.Timedelta(hours=HUBBLE_UTC_OFFSET_HOURS)
+    return (utc - pd.Timestamp('1970-01-01')) // pd.Timedelta(seconds=1)
+
+
+def hubble_rows_to_frame(df):
+    """
+    Converts hubble old_dex_ohlcv_* rows into the comparison layout.
+    Candles whose aggregation is not finished yet (is_validated = 0) are dropped.
+    """
+    if 'is_validated' in df.columns:
+        df = df[df['is_validated'].astype(bool)]
+    out = pd.DataFrame({'k_time': hubble_time_to_unix(df['time']).to_numpy(dtype='int64')})
+    for m in METRICS:
+        out[m] = df[m].astype('float64').to_numpy()
+    return out.drop_duplicates('k_time', keep='last').sort_values('k_time').reset_index(drop=True)
+
+
+def load_birdeye_csv(path):
+    """Loads a CSV written by birdeye_fetcher.save_to_csv."""
+    return birdeye_items_to_frame(pd.read_csv(path, usecols=list(BIRDEYE_COLUMNS)))
+
+
+def load_hubble_csv(path):
+    """Loads a DBeaver CSV export of hubble.old_dex_ohlcv_min / _hour."""
+    return hubble_rows_to_frame(pd.read_csv(path))
+
+
+def unix_to_hubble_time(unix_time):
+    """Formats Unix seconds as a hubble `time` literal (GMT+8)."""
+    local = datetime.fromtimestamp(unix_time, tz=timezone.utc) + timedelta(hours=HUBBLE_UTC_OFFSET_HOURS)
+    return local.strftime('%Y-%m-%d %H:%M:%S')
+
+
+# --- Data Sources ---
+def connect_hubble():
+    """Opens a ClickHouse connection using HUBBLE_CLICKHOUSE_* settings from the environment / .env."""
+    try:
+        from dotenv import load_dotenv
+        import clickhouse_driver
+    except ImportError as e:
+        print(f"Error: {e}. Install clickhouse-driver to query hubble directly.")
+        return None
+    load_dotenv(dotenv_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env'))
+    host = os.getenv('HUBBLE_CLICKHOUSE_HOST')
+    if not host:
+        print("Error: HUBBLE_CLICKHOUSE_HOST not set in environment or .env file.")
+        return None
+    return clickhouse_driver.Client(
+        host=host,
+        port=int(os.getenv('HUBBLE_CLICKHOUSE_PORT', '9000')),
+        user=os.getenv('HUBBLE_CLICKHOUSE_USER', 'default'),
+        password=os.getenv('HUBBLE_CLICKHOUSE_PASSWORD', ''),
+    )
+
+
+def fetch_hubble_candles(client, token_address, candle_type, start_unix, end_unix):
+    """Queries our candles for [start_unix, end_unix] from the hubble table matching candle_type."""
+    table = HUBBLE_TABLES[candle_type]
+    query = f"""SELECT * FROM
+    {table}
+WHERE
+    token = %(token)s
+    AND time BETWEEN %(start)s AND %(end)s
+ORDER BY time"""
+    rows, columns = client.execute(query, {
+        'token': token_address,
+        'start': unix_to_hubble_time(start_unix),
+        'end': unix_to_hubble_time(end_unix),
+    }, with_column_types=True)
+    df = pd.DataFrame(rows, columns=[name for name, _ in columns])
+    if df.empty:
+        return pd.DataFrame(columns=['k_time'] + METRICS)
+    return hubble_rows_to_frame(df)
+
+
+# --- Comparison ---
+def ks_statistic(a, b):
+    """Two-sample Kolmogorov-Smirnov statistic (max distance between the empirical CDFs)."""
+    a = np.sort(np.asarray(a, dtype='float64'))
+    b = np.sort(np.asarray(b, dtype='float64'))
+    if a.size == 0 or b.size == 0:
+        return float('nan')
+    grid = np.concatenate((a, b))
+    cdf_a = np.searchsorted(a, grid, side='right') / a.size
+    cdf_b = np.searchsorted(b, grid, side='right') / b.size
+    return float(np.max(np.abs(cdf_a - cdf_b)))
+
+
+def abs_pct_deviation(ours, theirs):
+    """|ours - theirs| / theirs * 100, with zero reference values mapped to NaN."""
+    ours = np.asarray(ours, dtype='float64')
+    theirs = np.asarray(theirs, dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dev = np.abs((ours - theirs) / theirs) * 100
+    dev[~np.isfinite(dev)] = np.nan
+    return dev
+
+
+def calculate_deviation(our_data, birdeye_data):
+    """
+    Computes per-metric absolute percentage deviation statistics between our
+    candles and Birdeye candles aligned on k_time.
+    Returns (results dict keyed by metric, merged DataFrame).
+    """
+    merged_data = pd.merge(our_data, birdeye_data, on='k_time', suffixes=('_ours', '_birdeye'))
+    results = {}
+    for m in METRICS:
+        ours = merged_data[f"{m}_ours"].to_numpy(dtype='float64')
+        theirs = merged_data[f"{m}_birdeye"].to_numpy(dtype='float64')
+        dev = abs_pct_deviation(ours, theirs)
+        dev = dev[~np.isnan(dev)]
+        if dev.size == 0:
+            results[m] = {'mean': np.nan, 'median': np.nan, 'std': np.nan, 'p95': np.nan, 'max': np.nan,
+                          'ks_stat': np.nan, 'count': 0}
+            continue
+        results[m] = {
+            'mean': float(np.mean(dev)),
+            'median': float(np.median(dev)),
+            'std': float(np.std(dev)),
+            'p95': float(np.percentile(dev, 95)),
+            'max': float(np.max(dev)),
+            'ks_stat': ks_statistic(ours, theirs),
+            'count': int(dev.size),
+        }
+    return results, merged_data
@@ -0,0 +1,150 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from kline_compare import load_birdeye_csv, load_hubble_csv
+
+# Vectorized, rolling version of detect_and_handle_outliers (§4.2 of the comparison plan).
+# Bands are computed per window over a zero-copy sliding_window_view, in blocks so
+# that the temporary (block x window) array stays small. By default every window is
+# evaluated (exact, IQR ~0.5M candles/s on one core). band_step > 1 is an explicit
+# opt-in for quick scans: only every band_step-th window is evaluated and neighbours
+# reuse the nearest band (~2M candles/s with band_step=4), but candles near the band
+# edge flip: on a 500k-candle random walk step 4 missed ~8% of the exact flags.
+# NaN values are skipped: windows are taken over the remaining values, and NaN
+# positions get NaN bands (they are never flagged and are reported instead).
+
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+DEFAULT_WINDOW = 61        # 1 hour of 1m candles, centred on the candle being checked
+BLOCK_SIZE = 65536         # windows processed per numpy call
+DEFAULT_BAND_STEP = 1      # exact; > 1 evaluates every Nth window (approximate, see above)
+MAD_SCALE = 1.4826         # makes MAD comparable to a standard deviation for normal data
+
+
+# --- Rolling Bands ---
+def _window_index(n, window, center):
+    """For every position, the start of the full window used for it (edges reuse the nearest full window)."""
+    positions = np.arange(n)
+    starts = positions - window // 2 if center else positions - window + 1
+    return np.clip(starts, 0, n - window)
+
+
+def rolling_bands(values, window=DEFAULT_WINDOW, method='iqr', multiplier=1.5, center=True, band_step=1):
+    """
+    Returns (lower, upper) band arrays, one value per element of values.
+    method: 'iqr' (Q1/Q3 -/+ multiplier * IQR), 'mad' (median -/+ multiplier * scaled MAD)
+    or 'zscore' (mean -/+ multiplier * std, evaluated for every window regardless of band_step).
+    NaN values are left out of the windows and get NaN bands.
+    """
+    values = np.asarray(values, dtype='float64')
+    valid = ~np.isnan(values)
+    if not valid.all():
+        lower = np.full(values.size, np.nan)
+        upper = np.full(values.size, np.nan)
+        if valid.any():
+            lower[valid], upper[valid] = rolling_bands(values[valid], window, method, multiplier, center, band_step)
+        return lower, upper
+    n = values.size
+    if n == 0:
+        return np.empty(0), np.empty(0)
+    window = min(window, n)
+    step = 1 if method == 'zscore' else max(1, band_step)
+    windows = sliding_window_view(values, window)[::step]
+    lower = np.empty(windows.shape[0])
+    upper = np.empty(windows.shape[0])
+
+    if method in ('iqr', 'mad', 'zscore'):
+        for start in range(0, windows.shape[0], BLOCK_SIZE):
+            block = windows[start:start + BLOCK_SIZE]
+            if method == 'zscore':
+                # Two-pass mean/std per window; running sums lose precision at typical price levels
+                mean = block.mean(axis=1)
+                std = block.std(axis=1)
+                lower[start:start + len(block)] = mean - multiplier * std
+                upper[start:start + len(block)] = mean + multiplier * std
+            elif method == 'iqr':
+                q1, q3 = np.percentile(block, [25, 75], axis=1)
+                spread = q3 - q1
+                lower[start:start + len(block)] = q1 - multiplier * spread
+                upper[start:start + len(block)] = q3 + multiplier * spread
+            else:
+                median = np.median(block, axis=1)
+                mad = MAD_SCALE * np.median(np.abs(block - median[:, None]), axis=1)
+                lower[start:start + len(block)] = median - multiplier * mad
+                upper[start:start + len(block)] = median + multiplier * mad
+    else:
+        raise ValueError(f"Unsupported outlier detection method: {method}")
+
+    idx = np.minimum((_window_index(n, window, center) + step // 2) // step, lower.size - 1)
+    return lower[idx], upper[idx]
+
+
+# --- Candle Outliers ---
+def detect_candle_outliers(candles, source, columns=PRICE_COLUMNS, window=DEFAULT_WINDOW,
+                           method='iqr', multiplier=1.5, center=True, band_step=DEFAULT_BAND_STEP):
+    """
+    Flags candles whose price falls outside the rolling band of its own series.
+    candles must be sorted by k_time. Returns one row per flagged value with
+    k_time (the join key of the deviation report), source, metric, value and band.
+    """
+    frames = []
+    k_time = candles['k_time'].to_numpy()
+    for column in columns:
+        values = candles[column].to_numpy(dtype='float64')
+        missing = int(np.isnan(values).sum())
+        if missing:
+            print(f"Warning: {missing} NaN {column} values in {source} candles were skipped by the outlier check")
+        lower, upper = rolling_bands(values, window, method, multiplier, center, band_step)
+        flagged = np.flatnonzero((values < lower) | (values > upper))
+        frames.append(pd.DataFrame({
+            'k_time': k_time[flagged],
+            'index': flagged,
+            'source': source,
+            'metric': column,
+            'value': values[flagged],
+            'lower': lower[flagged],
+            'upper': upper[flagged],
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def flag_merged_outliers(merged, outliers):
+    """
+    Adds boolean <metric>_ours_outlier / <metric>_birdeye_outlier columns to a
+    merged comparison frame (as returned by calculate_deviation).
+    """
+    merged = merged.copy()
+    for source in ('ours', 'birdeye'):
+        for column in PRICE_COLUMNS:
+            hits = outliers.loc[(outliers['source'] == source) & (outliers['metric'] == column), 'k_time']
+            merged[f"{column}_{source}_outlier"] = merged['k_time'].isin(hits.to_numpy())
+    return merged
+
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flag rolling-window price outliers in hubble and Birdeye candles.")
+    parser.add_argument("hubble_csv", help="DBeaver export of hubble.old_dex_ohlcv_min / _hour.")
+    parser.add_argument("birdeye_csv", help="CSV written by birdeye_fetcher.py.")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help=f"Rolling window in candles (default: {DEFAULT_WINDOW}).")
+    parser.add_argument("--method", choices=['iqr', 'mad', 'zscore'], default='iqr', help="Band method (default: iqr).")
+    parser.add_argument("--multiplier", type=float, default=1.5, help="Band width multiplier (default: 1.5).")
+    parser.add_argument("--band-step", type=int, default=DEFAULT_BAND_STEP, help=f"Evaluate every Nth window (default: {DEFAULT_BAND_STEP} = exact; "
+                        "larger values are faster but miss some outliers).")
+    parser.add_argument("--trailing", action="store_true", help="Use trailing instead of centred windows.")
+    parser.add_argument("--output", default="outliers.csv", help="Where to write the flagged candles.")
+    args = parser.parse_args()
+
+    outliers = pd.concat([
+        detect_candle_outliers(load_hubble_csv(args.hubble_csv), 'ours', window=args.window,
+                               method=args.method, multiplier=args.multiplier, center=not args.trailing,
+                               band_step=args.band_step),
+        detect_candle_outliers(load_birdeye_csv(args.birdeye_csv), 'birdeye', window=args.window,
+                               method=args.method, multiplier=args.multiplier, center=not args.trailing,
+                               band_step=args.band_step),
+    ], ignore_index=True)
+    outliers.to_csv(args.output, index=False)
+    print(f"Flagged {len(outliers)} values, saved to {args.output}")
+    print(outliers.groupby(['source', 'metric']).size().to_string())
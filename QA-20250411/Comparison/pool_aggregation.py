@@ -0,0 +1,196 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Batched version of filter_liquidity_pools + calculate_aggregated_price (§4.1 of the
+# comparison plan). Instead of looping over pools per token, every pool observation of
+# every token is one row of flat arrays; the liquidity filters become boolean masks and
+# the weighted average is a grouped reduction (np.bincount) over (token, candle) groups.
+# String keys (token, pool, dex) are hashed to integer codes with pd.factorize, which is
+# linear time, rather than np.unique, which sorts.
+
+# §4.3 DEX aggregation rules: minimum TVL / 24h volume, the weighting method
+# (volume for Raydium / Orca, liquidity = TVL for Jupiter) and the weight multiplier.
+# Unknown DEXes fall back to the "small DEX" rule.
+DEX_RULES = {
+    'raydium': {'min_tvl': 10000, 'min_volume_24h': 1000, 'weighting': 'volume', 'weight': 1.0},
+    'orca': {'min_tvl': 5000, 'min_volume_24h': 500, 'weighting': 'volume', 'weight': 1.0},
+    'jupiter': {'min_tvl': 10000, 'min_volume_24h': 1000, 'weighting': 'tvl', 'weight': 1.2},
+    'small': {'min_tvl': 50000, 'min_volume_24h': 5000, 'weighting': 'volume', 'weight': 0.5},
+}
+WEIGHTING_METHODS = ['volume', 'tvl', 'equal']
+DAY_SECONDS = 86400
+
+
+# --- Grouping ---
+def group_rows(token, candle_time):
+    """
+    Assigns a dense group id to every (token, candle_time) row.
+    Returns (group_ids, group_tokens, group_times).
+    """
+    token_codes, token_values = pd.factorize(np.asarray(token))
+    token_values = np.asarray(token_values)
+    order = np.lexsort((candle_time, token_codes))
+    sorted_codes = token_codes[order]
+    sorted_times = candle_time[order]
+    new_group = np.ones(order.size, dtype=bool)
+    new_group[1:] = (sorted_codes[1:] != sorted_codes[:-1]) | (sorted_times[1:] != sorted_times[:-1])
+    group_ids = np.empty(order.size, dtype=np.int64)
+    group_ids[order] = np.cumsum(new_group) - 1
+    return group_ids, token_values[sorted_codes[new_group]], sorted_times[new_group]
+
+
+def grouped_median(values, group_ids, num_groups):
+    """Median of values per group (NaN for empty groups), via one lexsort."""
+    order = np.lexsort((values, group_ids))
+    counts = np.bincount(group_ids, minlength=num_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    sorted_values = values[order]
+    medians = np.full(num_groups, np.nan)
+    present = counts > 0
+    lo = sorted_values[(starts + (counts - 1) // 2)[present]]
+    hi = sorted_values[(starts + counts // 2)[present]]
+    medians[present] = (lo + hi) / 2
+    return medians
+
+
+def pool_trailing_volume(pool, timestamp, volume, window_seconds=DAY_SECONDS):
+    """
+    Each row's pool volume over the trailing window (t - window_seconds, t], using only
+    observations up to the row's own timestamp (stand-in for volume_24h when not supplied).
+    """
+    pool_codes, _ = pd.factorize(np.asarray(pool))
+    if timestamp.size == 0:
+        return np.zeros(0)
+    # One sorted int64 key per row: pool first, then time offset, so a binary search
+    # for (pool, t - window) never crosses into another pool
+    offset = timestamp - timestamp.min()
+    key = pool_codes.astype(np.int64) * (int(offset.max()) + window_seconds + 1) + offset
+    order = np.argsort(key, kind='stable')
+    sorted_key = key[order]
+    csum = np.concatenate(([0.0], np.cumsum(volume[order])))
+    first = np.searchsorted(sorted_key, sorted_key - window_seconds, side='right')
+    last = np.searchsorted(sorted_key, sorted_key, side='right')
+    trailing = np.empty(timestamp.size)
+    trailing[order] = csum[last] - csum[first]
+    return trailing
+
+
+def row_weights(weighting, volume, tvl):
+    """Base weight of every row for one weighting method."""
+    if weighting == 'volume':
+        return volume
+    if weighting == 'tvl':
+        return tvl
+    if weighting == 'equal':
+        return np.ones(volume.size)
+    raise ValueError(f"Unsupported weighting method: {weighting}")
+
+
+# --- Aggregation ---
+def aggregate_prices(token, pool, timestamp, price, volume, tvl, interval_seconds=60,
+                     weighting_method=None, dex=None, volume_24h=None, price_impact_1k=None,
+                     min_volume_threshold=1000, min_tvl_threshold=10000, max_price_impact=0.01,
+                     max_median_deviation=None):
+    """
+    Computes the weighted aggregated price of every (token, candle) in one pass.
+
+    Rows are pool observations. Pools are kept when tvl >= min_tvl_threshold,
+    volume_24h >= min_volume_threshold and price_impact_1k < max_price_impact
+    (per-DEX thresholds and weight multipliers from DEX_RULES when dex is given).
+    With max_median_deviation, rows whose price deviates from the candle's median
+    pool price by more than that fraction are dropped before weighting.
+
+    weighting_method: 'volume', 'tvl' or 'equal' for every row. When omitted, each
+    DEX uses the weighting of its DEX_RULES entry if dex is given, otherwise 'volume'.
+    volume_24h defaults to each pool's trailing 24h volume (see pool_trailing_volume).
+    Returns a DataFrame with token, k_time, price, pool_count, total_weight.
+    """
+    timestamp = np.asarray(timestamp, dtype=np.int64)
+    price = np.asarray(price, dtype='float64')
+    volume = np.asarray(volume, dtype='float64')
+    tvl = np.asarray(tvl, dtype='float64')
+    if volume_24h is None:
+        volume_24h = pool_trailing_volume(pool, timestamp, volume)
+    volume_24h = np.asarray(volume_24h, dtype='float64')
+
+    # Per-row thresholds and weight multipliers
+    if weighting_method is not None and weighting_method not in WEIGHTING_METHODS:
+        raise ValueError(f"Unsupported weighting method: {weighting_method}")
+    if dex is None:
+        min_tvl = np.full(price.size, float(min_tvl_threshold))
+        min_volume = np.full(price.size, float(min_volume_threshold))
+        multiplier = np.ones(price.size)
+        weight = row_weights(weighting_method or 'volume', volume, tvl)
+    else:
+        dex_codes, dex_names = pd.factorize(np.asarray(dex))
+        rules = [DEX_RULES.get(str(name).lower(), DEX_RULES['small']) for name in dex_names]
+        min_tvl = np.array([r['min_tvl'] for r in rules], dtype='float64')[dex_codes]
+        min_volume = np.array([r['min_volume_24h'] for r in rules], dtype='float64')[dex_codes]
+        multiplier = np.array([r['weight'] for r in rules], dtype='float64')[dex_codes]
+        if weighting_method is not None:
+            weight = row_weights(weighting_method, volume, tvl)
+        else:
+            weight = np.empty(price.size)
+            for method in set(r['weighting'] for r in rules):
+                rows = np.isin(dex_codes, [i for i, r in enumerate(rules) if r['weighting'] == method])
+                weight[rows] = row_weights(method, volume[rows], tvl[rows])
+
+    mask = np.isfinite(price) & (price > 0) & (tvl >= min_tvl) & (volume_24h >= min_volume)
+    if price_impact_1k is not None:
+        mask &= np.asarray(price_impact_1k, dtype='float64') < max_price_impact
+
+    candle_time = timestamp // interval_seconds * interval_seconds
+    group_ids, group_tokens, group_times = group_rows(token, candle_time)
+    num_groups = group_tokens.size
+
+    if max_median_deviation is not None and mask.any():
+        medians = grouped_median(price[mask], group_ids[mask], num_groups)
+        mask &= np.abs(price / medians[group_ids] - 1) <= max_median_deviation
+
+    weight = np.where(mask, weight * multiplier, 0.0)
+
+    total_weight = np.bincount(group_ids, weights=weight, minlength=num_groups)
+    weighted_sum = np.bincount(group_ids, weights=np.where(mask, price, 0.0) * weight, minlength=num_groups)
+    pool_count = np.bincount(group_ids, weights=mask.astype('float64'), minlength=num_groups).astype(np.int64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        aggregated = np.where(total_weight > 0, weighted_sum / total_weight, np.nan)
+
+    return pd.DataFrame({
+        'token': group_tokens,
+        'k_time': group_times,
+        'price': aggregated,
+        'pool_count': pool_count,
+        'total_weight': total_weight,
+    })
+
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute liquidity-weighted aggregated prices per candle from pool observations.")
+    parser.add_argument("input_csv", help="CSV with token, pool, timestamp, price, volume, tvl (optional: dex, volume_24h, price_impact_1k).")
+    parser.add_argument("--interval-seconds", type=int, default=60, help="Candle width in seconds (default: 60).")
+    parser.add_argument("--weighting", choices=WEIGHTING_METHODS, default=None,
+                        help="Weighting method for all pools (default: per-DEX rule when a dex column is given, otherwise volume).")
+    parser.add_argument("--min-volume", type=float, default=1000, help="Minimum 24h pool volume in USD (default: 1000).")
+    parser.add_argument("--min-tvl", type=float, default=10000, help="Minimum pool TVL in USD (default: 10000).")
+    parser.add_argument("--max-median-deviation", type=float, default=None, help="Drop pool prices deviating more than this fraction from the candle median.")
+    parser.add_argument("--output", default="aggregated_prices.csv", help="Where to write the aggregated prices.")
+    args = parser.parse_args()
+
+    pools = pd.read_csv(args.input_csv)
+    result = aggregate_prices(
+        pools['token'].to_numpy(), pools['pool'].to_numpy(), pools['timestamp'].to_numpy(),
+        pools['price'].to_numpy(), pools['volume'].to_numpy(), pools['tvl'].to_numpy(),
+        interval_seconds=args.interval_seconds,
+        weighting_method=args.weighting,
+        dex=pools['dex'].to_numpy() if 'dex' in pools else None,
+        volume_24h=pools['volume_24h'].to_numpy() if 'volume_24h' in pools else None,
+        price_impact_1k=pools['price_impact_1k'].to_numpy() if 'price_impact_1k' in pools else None,
+        min_volume_threshold=args.min_volume,
+        min_tvl_threshold=args.min_tvl,
+        max_median_deviation=args.max_median_deviation,
+    )
+    result.to_csv(args.output, index=False)
+    print(f"Aggregated {len(pools)} pool observations into {len(result)} candles, saved to {args.output}")
@@ -0,0 +1,243 @@
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+
+from deviation_stats import LogHistogram, MomentsAccumulator
+from kline_compare import METRICS, abs_pct_deviation
+
+# Pre-aggregated deviation statistics by token x liquidity tier x period x interval x metric.
+# Each cell keeps exact moments and a LogHistogram of absolute percentage deviations, so
+# any slice (e.g. all tokens of one tier for one interval) is answered by merging cells,
+# never by rescanning candles. Comparisons are folded in as they land.
+# Writers (comparison_runner, validation_scheduler) go through locked_cube(), which holds
+# an exclusive file lock, reloads the cube and saves it before releasing the lock, so
+# concurrent updates are never lost. The cube also records what has been folded in
+# ('applied'), written in the same atomic save as the data, so reruns never count twice.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CUBE_PATH = os.path.join(SCRIPT_DIR, 'state', 'summary_cube.json')
+LIQUIDITY_TIERS_PATH = os.path.join(SCRIPT_DIR, 'liquidity_tiers.json')
+
+CUBE_DIMENSIONS = ['token', 'tier', 'period', 'interval']
+UNKNOWN_TIER = 'unknown'
+# Mean deviation (percent) above which validation_scheduler alerts and the dashboard
+# highlights a row, see §5.2 of the comparison plan
+ALERT_THRESHOLD_PCT = float(os.environ.get('QA_ALERT_THRESHOLD_PCT', '0.1'))
+
+
+def load_liquidity_tiers(path=LIQUIDITY_TIERS_PATH):
+    """Loads {token address: 'high' | 'medium' | 'low'}; tokens not listed are 'unknown'."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+# --- Cells ---
+class CubeCell:
+    """Moments and deviation histogram for every metric of one (token, tier, period, interval)."""
+
+    def __init__(self):
+        self.moments = {m: MomentsAccumulator() for m in METRICS}
+        self.histograms = {m: LogHistogram() for m in METRICS}
+
+    def update(self, merged_data):
+        """Adds merged candles (columns <metric>_ours / <metric>_birdeye)."""
+        for m in METRICS:
+            dev = abs_pct_deviation(merged_data[f"{m}_ours"].to_numpy(), merged_data[f"{m}_birdeye"].to_numpy())
+            self.moments[m].update(dev)
+            self.histograms[m].update(dev)
+        return self
+
+    def update_from_accumulator(self, acc):
+        """Adds a DeviationAccumulator; moments are exact, histograms are filled from its KLL sketches."""
+        for m in METRICS:
+            self.moments[m].merge(acc.moments[m])
+            sketch = acc.deviation_sketches[m]
+            for h, items in enumerate(sketch.levels):
+                self.histograms[m].update(items, np.full(items.size, 2.0 ** h))
+        return self
+
+    def merge(self, other):
+        for m in METRICS:
+            self.moments[m].merge(other.moments[m])
+            self.histograms[m].merge(other.histograms[m])
+        return self
+
+    def stats(self, metric):
+        moments = self.moments[metric]
+        return {
+            'count': moments.count,
+            'mean_deviation': moments.mean if moments.count else None,
+            'std_deviation': moments.std if moments.count else None,
+            'max_deviation': moments.max if moments.count else None,
+            'median_deviation': self.histograms[metric].quantile(0.5) if moments.count else None,
+            'p95_deviation': self.histograms[metric].quantile(0.95) if moments.count else None,
+        }
+
+    def to_dict(self):
+        return {m: {'moments': self.moments[m].to_dict(), 'histogram': self.histograms[m].to_dict()} for m in METRICS}
+
+    @classmethod
+    def from_dict(cls, data):
+        cell = cls()
+        for m in METRICS:
+            cell.moments[m] = MomentsAccumulator.from_dict(data[m]['moments'])
+            cell.histograms[m] = LogHistogram.from_dict(data[m]['histogram'])
+        return cell
+
+
+# --- Cube ---
+class SummaryCube:
+    def __init__(self):
+        self.cells = {}
+        self.version = 0
+        self.updated_at = None
+        self.applied = {}  # source key -> marker (run done / last folded candle)
+
+    def _cell(self, token, tier, period, interval):
+        key = (token, tier or UNKNOWN_TIER, str(period), interval)
+        if key not in self.cells:
+            self.cells[key] = CubeCell()
+        return self.cells[key]
+
+    def _touch(self):
+        self.version += 1
+        self.updated_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+    def add_comparison(self, token, tier, period, interval, merged_data):
+        """Folds one merged comparison frame into its cell."""
+        self._cell(token, tier, period, interval).update(merged_data)
+        self._touch()
+
+    def add_accumulator(self, token, tier, period, interval, acc):
+        """Folds a DeviationAccumulator (e.g. a reduced shard group) into its cell."""
+        self._cell(token, tier, period, interval).update_from_accumulator(acc)
+        self._touch()
+
+    def mark_applied(self, source, value=True):
+        """Records that source has been folded in (saved together with the cells)."""
+        self.applied[source] = value
+        self._touch()
+
+    def dimension_values(self):
+        """Distinct values of every dimension, for filter drop-downs."""
+        values = {dim: sorted({key[i] for key in self.cells}) for i, dim in enumerate(CUBE_DIMENSIONS)}
+        values['metric'] = list(METRICS)
+        return values
+
+    def slice(self, filters=None, group_by=('metric',)):
+        """
+        Returns one row per group_by combination over the cells matching filters.
+        filters maps a dimension (or 'metric') to an allowed value; metric is always
+        part of the output since deviations of different metrics are not comparable.
+        """
+        filters = {k: v for k, v in (filters or {}).items() if v}
+        group_dims = [d for d in group_by if d in CUBE_DIMENSIONS]
+        metrics = [filters['metric']] if filters.get('metric') in METRICS else METRICS
+
+        groups = {}
+        for key, cell in self.cells.items():
+            dims = dict(zip(CUBE_DIMENSIONS, key))
+            if any(dims[d] != v for d, v in filters.items() if d in CUBE_DIMENSIONS):
+                continue
+            group_key = tuple(dims[d] for d in group_dims)
+            if group_key in groups:
+                groups[group_key].merge(cell)
+            else:
+                groups[group_key] = CubeCell().merge(cell)
+
+        rows = []
+        for group_key, cell in sorted(groups.items()):
+            for metric in metrics:
+                row = dict(zip(group_dims, group_key))
+                row['metric'] = metric
+                row.update(cell.stats(metric))
+                rows.append(row)
+        return rows
+
+    def to_dict(self):
+        return {
+            'version': self.version,
+            'updated_at': self.updated_at,
+            'applied': self.applied,
+            'cells': [dict(zip(CUBE_DIMENSIONS, key), stats=cell.to_dict()) for key, cell in self.cells.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        cube = cls()
+        cube.version = data.get('version', 0)
+        cube.updated_at = data.get('updated_at')
+        cube.applied = data.get('applied', {})
+        for entry in data.get('cells', []):
+            key = tuple(entry[d] for d in CUBE_DIMENSIONS)
+            cube.cells[key] = CubeCell.from_dict(entry['stats'])
+        return cube
+
+    def save(self, path=DEFAULT_CUBE_PATH):
+        """Writes the cube atomically; readers either see the old or the new file."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+
+def load_cube(path=DEFAULT_CUBE_PATH):
+    """Loads the cube, or returns an empty one if it has not been written yet."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return SummaryCube.from_dict(json.load(f))
+    except FileNotFoundError:
+        return SummaryCube()
+
+
+# --- Locked Updates ---
+if os.name == 'nt':
+    import msvcrt
+
+    def _lock_file(f):
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                # LK_LOCK gives up after ~10s; keep waiting for the other writer
+                continue
+
+    def _unlock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def locked_cube(path=DEFAULT_CUBE_PATH):
+    """
+    Exclusive read-modify-write of the cube: takes the lock file next to it, yields
+    the freshly loaded cube and saves it if it changed. Nothing is saved if the body raises.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(f"{path}.lock", 'a+') as lock_file:
+        _lock_file(lock_file)
+        try:
+            cube = load_cube(path)
+            version = cube.version
+            yield cube
+            if cube.version != version:
+                cube.save(path)
+        finally:
+            _unlock_file(lock_file)
@@ -0,0 +1,253 @@
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import deviation_stats
+import kline_compare
+import summary_cube
+from kline_compare import METRICS, HUBBLE_TABLES, birdeye_items_to_frame, calculate_deviation
+import birdeye_fetcher
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Alert when the mean deviation of any metric exceeds this (percent); shared with the dashboard
+DEFAULT_ALERT_THRESHOLD_PCT = summary_cube.ALERT_THRESHOLD_PCT
+
+
+# --- Watermark Store ---
+def watermark_key(token_address, candle_type):
+    return f"{token_address}|{candle_type}"
+
+
+def load_watermarks(path):
+    """Loads {token|interval: last validated candle unixTime}; missing file means nothing validated yet."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_watermarks(path, watermarks):
+    """Writes the watermarks atomically so an interrupted cycle never leaves a truncated file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(watermarks, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def append_alerts(path, alerts):
+    """Appends alert records as JSON lines."""
+    if not alerts:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        for alert in alerts:
+            f.write(json.dumps(alert, ensure_ascii=False) + "\n")
+
+
+# --- Planning ---
+def plan_window(watermark, interval_seconds, now_unix, initial_lookback_seconds, settle_seconds, max_candles):
+    """
+    Returns the (start, end) candle open times still to validate for one key, or
+    None when there is no newly closed candle. Only candles that closed at least
+    settle_seconds ago are included, and one cycle covers at most max_candles.
+    """
+    last_closed = (now_unix - settle_seconds) // interval_seconds * interval_seconds - interval_seconds
+    if watermark is None:
+        start = (now_unix - initial_lookback_seconds) // interval_seconds * interval_seconds
+    else:
+        start = watermark + interval_seconds
+    end = min(last_closed, start + (max_candles - 1) * interval_seconds)
+    if end < start:
+        return None
+    return start, end
+
+
+def find_request_config(config, candle_type):
+    """Finds the ohlcv_requests entry fetching candle_type."""
+    for request_conf in config.get("ohlcv_requests", []):
+        if request_conf.get("query_params", {}).get("type") == candle_type:
+            return request_conf
+    return None
+
+
+# --- Validation Cycle ---
+def validate_window(config, api_key, hubble_client, token_address, candle_type, start_unix, end_unix,
+                    threshold_pct, rate_limit_sleep=1.0):
+    """
+    Fetches both sides for one window and compares them.
+    Returns (last_compared_unix or None, results dict, alert records, merged candles).
+    """
+    request_conf = find_request_config(config, candle_type)
+    # As many candles per request as one response holds
+    chunk_hours = birdeye_fetcher.max_chunk_hours(candle_type, float('inf'))
+    chunks = birdeye_fetcher.chunk_time_range(start_unix, end_unix, chunk_hours)
+
+    combined = birdeye_fetcher.fetch_and_combine_data(
+        config, request_conf, chunks, api_key, token_address, rate_limit_sleep)
+    items = combined["data"]["items"] if combined else []
+    if items:
+        items, _ = birdeye_fetcher.backfill_missing_candles(
+            config, request_conf, items, start_unix, end_unix, api_key, token_address, rate_limit_sleep)
+    birdeye_data = birdeye_items_to_frame(items)
+    our_data = kline_compare.fetch_hubble_candles(hubble_client, token_address, candle_type, start_unix, end_unix)
+
+    if birdeye_data.empty or our_data.empty:
+        return None, {}, [], None
+
+    results, merged = calculate_deviation(our_data, birdeye_data)
+    # Only advance as far as both sides have delivered candles, so late data is picked up next cycle
+    last_compared = int(min(our_data['k_time'].max(), birdeye_data['k_time'].max()))
+
+    alerts = []
+    created_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    for metric in METRICS:
+        stats = results[metric]
+        if stats['count'] and stats['mean'] > threshold_pct:
+            alerts.append({
+                'created_at': created_at,
+                'token': token_address,
+                'interval': candle_type,
+                'metric': metric,
+                'mean_deviation': stats['mean'],
+                'max_deviation': stats['max'],
+                'p95_deviation': stats['p95'],
+                'threshold': threshold_pct,
+                'window_start': start_unix,
+                'window_end': last_compared,
+                'sample_size': len(merged),
+            })
+    return last_compared, results, alerts, merged
+
+
+def update_daily_stats(state_dir, token_address, candle_type, merged, cube=None, tier=None):
+    """
+    Folds the merged candles into the per-day deviation accumulators under
+    state/stats/<YYYY-MM-DD>/ and, if given, into the summary cube (period = day).
+    The cube and every day file remember the last candle they received, so candles
+    they already hold (e.g. after a crash before the watermark was saved) are not
+    added twice when the window is validated again.
+    """
+    if cube is not None:
+        source = f"validation:{watermark_key(token_address, candle_type)}"
+        cube_rows = merged[merged['k_time'] > cube.applied.get(source, -1)]
+        if not cube_rows.empty:
+            for day, day_rows in cube_rows.groupby(cube_rows['k_time'] // 86400):
+                day_str = datetime.fromtimestamp(int(day) * 86400, tz=timezone.utc).strftime('%Y-%m-%d')
+                cube.add_comparison(token_address, tier, day_str, candle_type, day_rows)
+            cube.mark_applied(source, int(cube_rows['k_time'].max()))
+
+    days = merged['k_time'] // 86400
+    for day, day_rows in merged.groupby(days):
+        day_str = datetime.fromtimestamp(int(day) * 86400, tz=timezone.utc).strftime('%Y-%m-%d')
+        path = os.path.join(state_dir, 'stats', day_str, f"{token_address}_{candle_type}.json")
+        acc = deviation_stats.load_or_create(path)
+        if acc.applied_through is not None:
+            day_rows = day_rows[day_rows['k_time'] > acc.applied_through]
+        if day_rows.empty:
+            continue
+        acc.update(day_rows)
+        acc.applied_through = int(day_rows['k_time'].max())
+        acc.save(path)
+
+
+def run_validation_cycle(config, api_key, hubble_client, tokens, candle_types, state_dir,
+                         threshold_pct=DEFAULT_ALERT_THRESHOLD_PCT, initial_lookback_hours=24,
+                         settle_seconds=120, max_candles=5000, rate_limit_sleep=1.0, now_unix=None,
+                         cube_path=summary_cube.DEFAULT_CUBE_PATH):
+    """Runs one incremental pass over every (token, interval) and returns the alerts raised."""
+    watermarks_path = os.path.join(state_dir, 'watermarks.json')
+    alerts_path = os.path.join(state_dir, 'alerts.jsonl')
+    watermarks = load_watermarks(watermarks_path)
+    tiers = summary_cube.load_liquidity_tiers()
+    now_unix = int(time.time()) if now_unix is None else now_unix
+    cycle_alerts = []
+
+    for token_address in tokens:
+        for candle_type in candle_types:
+            key = watermark_key(token_address, candle_type)
+            interval_seconds = birdeye_fetcher.CANDLE_INTERVAL_SECONDS[candle_type]
+            window = plan_window(watermarks.get(key), interval_seconds, now_unix,
+                                 initial_lookback_hours * 3600, settle_seconds, max_candles)
+            if window is None:
+                print(f"[{key}] up to date (watermark {watermarks.get(key)})")
+                continue
+
+            start_unix, end_unix = window
+            print(f"\n[{key}] validating {end_unix - start_unix + interval_seconds} seconds of new candles")
+            last_compared, results, alerts, merged = validate_window(
+                config, api_key, hubble_client, token_address, candle_type,
+                start_unix, end_unix, threshold_pct, rate_limit_sleep)
+
+            if last_compared is not None:
+                # Reload the cube under its lock so concurrent comparison_runner updates are kept
+                with summary_cube.locked_cube(cube_path) as cube:
+                    update_daily_stats(state_dir, token_address, candle_type, merged, cube, tiers.get(token_address))
+                watermarks[key] = last_compared
+                for metric in METRICS:
+                    if results[metric]['count']:
+                        print(f"[{key}] {metric}: mean {results[metric]['mean']:.4f}% max {results[metric]['max']:.4f}%")
+            elif end_unix < now_unix - initial_lookback_hours * 3600:
+                # Neither side will ever fill a window this old; do not retry it forever
+                watermarks[key] = end_unix
+            else:
+                print(f"[{key}] no overlapping candles yet, keeping watermark")
+
+            for alert in alerts:
+                print(f"ALERT [{key}] {alert['metric']} mean deviation {alert['mean_deviation']:.4f}% > {threshold_pct}%")
+            cycle_alerts.extend(alerts)
+            # Persist after each key so a crash only repeats the key in progress; alerts are
+            # written before the watermark moves past their window so none can be lost
+            append_alerts(alerts_path, alerts)
+            save_watermarks(watermarks_path, watermarks)
+
+    return cycle_alerts
+
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Continuously compare new hubble candles with Birdeye using per-token watermarks.")
+    parser.add_argument("--tokens", nargs="+", help="Token addresses to validate (default: address from the Birdeye config).")
+    parser.add_argument("--intervals", nargs="+", default=list(HUBBLE_TABLES), help="Candle types to validate (default: 1m 1H).")
+    parser.add_argument("--every", type=int, default=3600, help="Seconds between cycles (default: 3600, the hourly check).")
+    parser.add_argument("--once", action="store_true", help="Run a single cycle and exit.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_ALERT_THRESHOLD_PCT, help=f"Mean deviation alert threshold in percent (default: {DEFAULT_ALERT_THRESHOLD_PCT}, QA_ALERT_THRESHOLD_PCT).")
+    parser.add_argument("--initial-lookback-hours", type=int, default=24, help="History to validate for keys without a watermark (default: 24).")
+    parser.add_argument("--settle-seconds", type=int, default=120, help="Only validate candles closed at least this long ago (default: 120).")
+    parser.add_argument("--max-candles", type=int, default=5000, help="Maximum candles per key per cycle (default: 5000).")
+    parser.add_argument("--rate-limit-sleep", type=float, default=1.0, help="Seconds to sleep between Birdeye requests (default: 1.0).")
+    parser.add_argument("--state-dir", default=os.path.join(SCRIPT_DIR, "state"), help="Directory for watermarks.json and alerts.jsonl.")
+    args = parser.parse_args()
+
+    api_key = birdeye_fetcher.load_api_key()
+    config = birdeye_fetcher.load_config()
+    hubble_client = kline_compare.connect_hubble()
+    if not api_key or config is None or hubble_client is None:
+        print("Exiting due to missing API key, configuration or hubble connection.")
+        exit(1)
+
+    tokens = args.tokens or [config.get("common_parameters", {}).get("address")]
+    unknown = [t for t in args.intervals if t not in HUBBLE_TABLES or find_request_config(config, t) is None]
+    if unknown:
+        print(f"Error: no hubble table or Birdeye request configured for intervals {unknown}")
+        exit(1)
+
+    while True:
+        cycle_start = time.time()
+        print(f"\n--- Validation cycle at {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')} UTC ---")
+        alerts = run_validation_cycle(
+            config, api_key, hubble_client, tokens, args.intervals, args.state_dir,
+            args.threshold, args.initial_lookback_hours, args.settle_seconds,
+            args.max_candles, args.rate_limit_sleep)
+        print(f"Cycle finished in {time.time() - cycle_start:.1f}s with {len(alerts)} alerts")
+        if args.once:
+            break
+        try:
+            time.sleep(max(0, args.every - (time.time() - cycle_start)))
+        except KeyboardInterrupt:
+            print("\nStopping scheduler.")
+            break
@@ -1,23 +1,48 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Blueprint, current_app, render_template, request, jsonify
 import subprocess
+import csv
+import json
 import os
-from datetime import datetime, timedelta
+import shutil
+import socket
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 
-app = Flask(__name__)
+# The comparison modules (summary cube) live under QA-20250411/Comparison
+COMPARISON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'QA-20250411', 'Comparison')
+if COMPARISON_DIR not in sys.path:
+    sys.path.insert(0, COMPARISON_DIR)
+import summary_cube
+import job_store
+# QA-20250411/Birdeye is added to sys.path by the comparison modules
+import birdeye_fetcher
+import coverage_index
+import profiling
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BIRDEYE_DIR = os.path.join(BASE_DIR, 'QA-20250411', 'Birdeye')
+DEFAULT_JOB_STORE_PATH = os.path.join(BASE_DIR, 'state', 'jobs.sqlite3')
+SQL_OUTPUT_DIR = os.path.join(BASE_DIR, 'QA-20250411', 'DBeaver SQL', 'output_sql')
+OUTPUT_SWEEP_INTERVAL_SECONDS = 3600
+
+bp = Blueprint('main', __name__)
 
 # Default token address if none is provided
 DEFAULT_TOKEN_ADDRESS = "6p6xgHyF7AeE6TZkSmFsko444wqoP15icUSqi2jfGiPN"  # Trump Token
 
 # 添加basename过滤器，用于从完整路径中提取文件名
-@app.template_filter('basename')
+@bp.app_template_filter('basename')
 def basename_filter(path):
     return os.path.basename(path) if path else ""
 
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/generate', methods=['POST'])
+@bp.route('/generate', methods=['POST'])
 def generate():
     # Get the token address from the form
     token_address = request.form.get('token_address', DEFAULT_TOKEN_ADDRESS)
@@ -65,26 +90,84 @@ def convert_time_to_utc(time_str):
     return utc_dt.strftime('%Y-%m-%d %H:%M:%S')
 
 
-def create_birdeye_script(start_time, end_time, token_address=DEFAULT_TOKEN_ADDRESS):
+def get_job_store():
+    """The shared job store of the current app."""
+    return current_app.extensions['job_store']
+
+
+def load_birdeye_request_types(config_path):
+    """(request name, candle type) of every request in the Birdeye fetcher config."""
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    return [(r.get('name'), r.get('query_params', {}).get('type')) for r in config.get('ohlcv_requests', [])]
+
+
+def utc_string_to_unix(time_str):
+    return int(datetime.strptime(time_str, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc).timestamp())
+
+
+def unix_to_utc_string(unix_time):
+    return datetime.fromtimestamp(unix_time, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def check_local_coverage(token_address, utc_start, utc_end, job_id):
+    """
+    Reports which part of the window each source already has locally. When Birdeye
+    data is complete for every candle type, the job's CSVs are written straight from
+    the local copies. Returns (coverage rows, cached output dir or None).
+    """
+    index = current_app.extensions['coverage_index']
+    start_unix, end_unix = utc_string_to_unix(utc_start), utc_string_to_unix(utc_end)
+    rows = []
+    birdeye_complete = True
+    request_types = current_app.config['BIRDEYE_REQUEST_TYPES']
+    for _, candle_type in request_types:
+        step = birdeye_fetcher.CANDLE_INTERVAL_SECONDS.get(candle_type, 1)
+        for source in ('birdeye', 'hubble'):
+            report = index.coverage(token_address, candle_type, source, start_unix, end_unix, step)
+            rows.append({
+                'interval': candle_type,
+                'source': source,
+                'covered_fraction': report['covered_fraction'],
+                'missing': [(unix_to_utc_string(s), unix_to_utc_string(e)) for s, e in report['missing']],
+            })
+            if source == 'birdeye' and not report['complete']:
+                birdeye_complete = False
+
+    if not request_types or not birdeye_complete:
+        return rows, None
+    output_dir = os.path.join(BIRDEYE_DIR, 'output_csv', job_id)
+    os.makedirs(output_dir, exist_ok=True)
+    for request_name, candle_type in request_types:
+        items = index.load_candles(token_address, candle_type, start_unix, end_unix)
+        fieldnames = list(dict.fromkeys(key for item in items for key in item))
+        with open(os.path.join(output_dir, f"{request_name}.csv"), 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(items)
+    return rows, output_dir
+
+
+def create_birdeye_script(start_time, end_time, token_address=DEFAULT_TOKEN_ADDRESS, job_id=None):
     """Create a Python script to fetch Birdeye API data for the given time range."""
+    job_id = job_id or job_store.new_job_id()
     # Prepare directory
-    birdeye_dir = 'QA-20250411/Birdeye'
-    output_dir = f'{birdeye_dir}/output_py'
+    output_dir = os.path.join(BASE_DIR, 'QA-20250411', 'Birdeye', 'output_py')
     os.makedirs(output_dir, exist_ok=True)
     
-    # Generate timestamp for the script filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    script_filename = f'birdeye_fetch_{timestamp}.py'
+    # The job id keeps scripts of concurrent requests apart
+    script_filename = f'birdeye_fetch_{job_id}.py'
     script_path = os.path.join(output_dir, script_filename)
     
     # 读取模板文件并替换占位符
-    with open(os.path.join(os.path.dirname(__file__), 'QA-20250411', 'Birdeye', 'birdeye_fetcher_template.py'), 'r') as template_file:
+    with open(os.path.join(BASE_DIR, 'QA-20250411', 'Birdeye', 'birdeye_fetcher_template.py'), 'r') as template_file:
         script_content = template_file.read()
     
     # 替换占位符
     script_content = script_content.replace("__START_TIME__", start_time)
     script_content = script_content.replace("__END_TIME__", end_time)
     script_content = script_content.replace("__TOKEN_ADDRESS__", token_address)
+    script_content = script_content.replace("__JOB_ID__", job_id)
     
     # Write the script to file
     with open(script_path, 'w') as file:
@@ -93,7 +176,7 @@ def create_birdeye_script(start_time, end_time, token_address=DEFAULT_TOKEN_ADDR
     return script_path
 
 
-@app.route('/confirm', methods=['POST'])
+@bp.route('/confirm', methods=['POST'])
 def confirm():
     start_time = request.form.get('start_time')
     end_time = request.form.get('end_time')
@@ -130,15 +213,21 @@ LIMIT 1000;"""
         # Removed 1s template as Birdeye does not support it
     }
 
+    # Each request gets its own job id, so concurrent users never overwrite each other's queries
+    store = get_job_store()
+    job_id = store.create_job('confirm', token_address, start_time_value, end_time_value)
+
     # Ensure the target directory exists
-    sql_path = os.path.join(os.path.dirname(__file__), 'QA-20250411', 'DBeaver SQL', 'output_sql')
+    sql_path = os.path.join(SQL_OUTPUT_DIR, job_id)
     try:
         os.makedirs(sql_path, exist_ok=True)
     except Exception as e:
+        store.update_job(job_id, 'failed', error=str(e))
         return f"Error creating output directory {sql_path}: {e}", 500
 
     # List to store paths of generated files
     generated_files = []
+    queries = {}
 
     for suffix, sql_template in sql_templates.items():
         sql_content = sql_template.format(start_time=start_time_value, end_time=end_time_value)
@@ -147,72 +236,134 @@ LIMIT 1000;"""
             with open(file_path, 'w', encoding='utf-8') as f:
                 f.write(sql_content)
             generated_files.append(file_path)
+            queries[suffix] = (sql_content, file_path)
         except Exception as e:
+            store.update_job(job_id, 'failed', error=str(e))
             return f"Error writing to file {file_path}: {e}", 500
-    
-    # Get the epoch times for SQL
-    start_epoch = int(datetime.strptime(start_time_value, '%Y-%m-%d %H:%M:%S').timestamp())
-    end_epoch = int(datetime.strptime(end_time_value, '%Y-%m-%d %H:%M:%S').timestamp())
+    store.save_queries(job_id, queries)
     
     # Generate Birdeye fetcher script
-    script_dir = os.path.join(os.path.dirname(__file__), 'QA-20250411', 'Birdeye', 'output_py')
-    birdeye_script_path = create_birdeye_script(start_time_value, end_time_value, token_address)
+    birdeye_script_path = create_birdeye_script(start_time_value, end_time_value, token_address, job_id)
     
     # Prepare UTC interval display
     utc_start = convert_time_to_utc(start_time_value)
     utc_end = convert_time_to_utc(end_time_value)
     utc_interval_display = f"Start: {utc_start}, End: {utc_end}"
+
+    # Coverage from earlier fetches; a fully covered window is served from disk right away
+    coverage_started = time.perf_counter()
+    coverage_rows, cached_output_dir = check_local_coverage(token_address, utc_start, utc_end, job_id)
+    coverage_ms = (time.perf_counter() - coverage_started) * 1000
+    if cached_output_dir:
+        store.update_job(job_id, 'cached', result=cached_output_dir)
+    else:
+        store.update_job(job_id, 'queries_ready', result=birdeye_script_path)
     
     return render_template('confirmation.html', 
+                          job_id=job_id,
                           interval=selected_interval_display,
                           sql_paths=generated_files,
                           birdeye_script_path=birdeye_script_path,
                           utc_interval=utc_interval_display,
                           utc_start_time=utc_start,
                           utc_end_time=utc_end,
-                          token_address=token_address)
+                          token_address=token_address,
+                          coverage_rows=coverage_rows,
+                          coverage_ms=coverage_ms,
+                          cached_output_dir=cached_output_dir)
+
+
+def launch_background_fetcher(store, job_id, birdeye_dir, output_dir, fetcher_args):
+    """Starts birdeye_fetcher.py without a terminal and records its exit status in the job store."""
+    log_dir = os.path.join(birdeye_dir, output_dir)
+    os.makedirs(log_dir, exist_ok=True)
+    log_path = os.path.join(log_dir, 'fetcher.log')
+    log_file = open(log_path, 'w', encoding='utf-8')
+    try:
+        process = subprocess.Popen([sys.executable, 'birdeye_fetcher.py'] + fetcher_args,
+                                   cwd=birdeye_dir, stdout=log_file, stderr=subprocess.STDOUT)
+    except BaseException:
+        log_file.close()
+        raise
+    store.update_job(job_id, 'launched', result=log_dir)
+
+    def wait_for_exit():
+        returncode = process.wait()
+        log_file.close()
+        if returncode == 0:
+            store.update_job(job_id, 'succeeded')
+        else:
+            store.update_job(job_id, 'failed', error=f"exit code {returncode}, see {log_path}")
 
+    threading.Thread(target=wait_for_exit, daemon=True).start()
 
-@app.route('/run_birdeye_fetcher', methods=['POST'])
+
+@bp.route('/run_birdeye_fetcher', methods=['POST'])
 def run_birdeye_fetcher():
-    # Get the birdeye fetcher script details from the form
-    script_filename = request.form.get('script_filename')
-    script_path = os.path.join(os.getcwd(), 'QA-20250411', 'Birdeye', 'output_py', script_filename)
-    
     # Get time parameters from the form
     start_time = request.form.get('start_time')
     end_time = request.form.get('end_time')
-    token_address = request.form.get('token_address')
+    # Same fallback as /confirm, so the fetcher's argv never contains None
+    token_address = request.form.get('token_address') or DEFAULT_TOKEN_ADDRESS
+    if not start_time or not end_time:
+        return "Error: Missing time interval.", 400
+
+    # Results go to a per-job output directory so concurrent fetches do not clobber each other's CSVs
+    store = get_job_store()
+    parent_job_id = request.form.get('job_id')
+    # The "profile" checkbox profiles this job's stages; FETCHER_PROFILE profiles every job
+    profile_mode = current_app.config['FETCHER_PROFILE'] or ('stages' if request.form.get('profile') else None)
+    job_id = store.create_job('birdeye_fetch', token_address, start_time, end_time,
+                              params={'parent_job_id': parent_job_id, 'profile': profile_mode})
+    output_dir = os.path.join('output_csv', job_id)
+    profile_args = ['--profile', profile_mode] if profile_mode else []
+    profile_flags = ' '.join(profile_args)
     
     # Instead of running the generated Python script, directly run birdeye_fetcher.py
-    birdeye_dir = os.path.join(os.getcwd(), 'QA-20250411', 'Birdeye')
-    fetcher_script = os.path.join(birdeye_dir, "birdeye_fetcher.py")
-    
-    # Build the command to run
-    cmd = ["python", fetcher_script, start_time, end_time]
-    if token_address and token_address.strip():
-        cmd.extend(["--token", token_address])
+    birdeye_dir = os.path.join(BASE_DIR, 'QA-20250411', 'Birdeye')
     
-    # Run the command directly in a new terminal window
-    if os.name == 'nt':  # Windows
-        # Use start cmd /k to open in a new window and keep it open
-        cmd_str = f'start cmd /k "cd /d {birdeye_dir} && python birdeye_fetcher.py "{start_time}" "{end_time}" --token {token_address}"'
-        subprocess.Popen(cmd_str, shell=True)
-    else:  # Mac/Linux
-        terminal_cmd = f'cd "{birdeye_dir}" && python birdeye_fetcher.py "{start_time}" "{end_time}" --token "{token_address}"'
-        subprocess.Popen(['gnome-terminal', '--', 'bash', '-c', f'{terminal_cmd}; exec bash'])
+    try:
+        if current_app.config['FETCHER_LAUNCH_MODE'] == 'background':
+            # Headless servers (and the load test): run detached, log to the job's output directory
+            launch_background_fetcher(store, job_id, birdeye_dir, output_dir,
+                                      [start_time, end_time, '--token', token_address, '--output-dir', output_dir] + profile_args)
+        # Run the command directly in a new terminal window
+        elif os.name == 'nt':  # Windows
+            # Use start cmd /k to open in a new window and keep it open
+            cmd_str = f'start cmd /k "cd /d {birdeye_dir} && python birdeye_fetcher.py "{start_time}" "{end_time}" --token {token_address} --output-dir {output_dir} {profile_flags}"'
+            subprocess.Popen(cmd_str, shell=True)
+        else:  # Mac/Linux
+            terminal_cmd = f'cd "{birdeye_dir}" && python birdeye_fetcher.py "{start_time}" "{end_time}" --token "{token_address}" --output-dir "{output_dir}" {profile_flags}'
+            subprocess.Popen(['gnome-terminal', '--', 'bash', '-c', f'{terminal_cmd}; exec bash'])
+    except Exception as e:
+        # Otherwise the job would stay 'created' forever
+        store.update_job(job_id, 'failed', error=f"launch failed: {e}")
+        return f"Error: could not launch the Birdeye fetcher: {e}", 500
+    if current_app.config['FETCHER_LAUNCH_MODE'] != 'background':
+        store.update_job(job_id, 'launched', result=os.path.join(birdeye_dir, output_dir))
     
     # Render the success template
+    launched_where = 'in the background' if current_app.config['FETCHER_LAUNCH_MODE'] == 'background' else 'in a new terminal window'
+    message = f"Launched Birdeye data fetcher {launched_where}.<br>Start time: {start_time}<br>End time: {end_time}<br>Token address: {token_address}<br>Job ID: {job_id}"
+    if profile_mode:
+        message += f"<br>Profiling ({profile_mode}): report in QA-20250411/Birdeye/output_csv/{job_id}/profile/"
     return render_template('success.html', 
-                          message=f"Launched Birdeye data fetcher in a new terminal window.<br>Start time: {start_time}<br>End time: {end_time}<br>Token address: {token_address}")
+                          message=message,
+                          output_dir=f"QA-20250411/Birdeye/output_csv/{job_id}/")
 
 
-@app.route('/run_birdeye', methods=['POST'])
+@bp.route('/run_birdeye', methods=['POST'])
 def run_birdeye():
     script_path = request.form.get('script_path')
     
-    if not script_path or not os.path.exists(script_path):
+    # Only scripts generated by /confirm may be executed
+    scripts_dir = os.path.join(BASE_DIR, 'QA-20250411', 'Birdeye', 'output_py')
+    if not script_path or not os.path.exists(script_path) or \
+            os.path.dirname(os.path.abspath(script_path)) != scripts_dir:
         return "Error: Invalid script path.", 400
+
+    store = get_job_store()
+    job_id = store.create_job('birdeye_script', params={'script_path': script_path}, status='running')
     
     try:
         # Run the birdeye fetcher script
@@ -220,6 +371,7 @@ def run_birdeye():
                                capture_output=True, 
                                text=True,
                                check=True)
+        store.update_job(job_id, 'succeeded', result=result.stdout)
         
         # Build the result message
         output_message = f"""
@@ -246,6 +398,7 @@ def run_birdeye():
         return output_message
         
     except subprocess.CalledProcessError as e:
+        store.update_job(job_id, 'failed', result=e.stdout, error=e.stderr)
         error_message = f"""
 <h1>Error Running Birdeye Fetcher</h1>
 <p>An error occurred while executing the Birdeye fetcher script.</p>
@@ -263,10 +416,209 @@ def run_birdeye():
 """
         return error_message, 500
     except Exception as e:
+        store.update_job(job_id, 'failed', error=str(e))
         return f"An unexpected error occurred: {e}", 500
 
 
+@bp.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = get_job_store().get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'job not found'}), 404
+    # Profiled fetcher jobs include their per-stage breakdown once the fetcher has exited
+    if job['params'].get('profile'):
+        stages_path = os.path.join(BIRDEYE_DIR, 'output_csv', job_id, 'profile', 'stages.json')
+        if os.path.exists(stages_path):
+            with open(stages_path, 'r', encoding='utf-8') as f:
+                job['profile'] = json.load(f)
+    return jsonify(job)
+
+
+# In-memory cache of the summary cube and of the slices already served from it.
+# It is dropped as soon as the cube file on disk changes (new comparisons landed).
+# Slices are keyed by query-string values, so only the most recently used ones are kept.
+CUBE_SLICE_CACHE_SIZE = 256
+_cube_cache = {'stamp': None, 'cube': None, 'slices': OrderedDict()}
+_cube_cache_lock = threading.Lock()
+
+DASHBOARD_FILTERS = summary_cube.CUBE_DIMENSIONS + ['metric']
+
+
+def get_cube_slice(filters, group_by, cube_path=summary_cube.DEFAULT_CUBE_PATH):
+    """Returns (cube, rows) for the requested slice, reloading the cube only when its file changed."""
+    try:
+        st = os.stat(cube_path)
+        stamp = (st.st_mtime_ns, st.st_size)
+    except FileNotFoundError:
+        stamp = None
+
+    with _cube_cache_lock:
+        if stamp != _cube_cache['stamp'] or _cube_cache['cube'] is None:
+            _cube_cache['cube'] = summary_cube.load_cube(cube_path)
+            _cube_cache['slices'] = OrderedDict()
+            _cube_cache['stamp'] = stamp
+        cube = _cube_cache['cube']
+        slices = _cube_cache['slices']
+        key = (tuple(sorted(filters.items())), tuple(group_by))
+        rows = slices.get(key)
+        if rows is None:
+            rows = cube.slice(filters, group_by)
+            slices[key] = rows
+            if len(slices) > CUBE_SLICE_CACHE_SIZE:
+                slices.popitem(last=False)
+        else:
+            slices.move_to_end(key)
+    return cube, rows
+
+
+def parse_dashboard_args():
+    filters = {name: request.args.get(name, '') for name in DASHBOARD_FILTERS}
+    filters = {name: value for name, value in filters.items() if value}
+    group_by = [d for d in request.args.getlist('group_by') if d in summary_cube.CUBE_DIMENSIONS]
+    if not request.args.getlist('group_by'):
+        group_by = ['tier', 'interval']
+    return filters, group_by
+
+
+@bp.route('/dashboard')
+def dashboard():
+    filters, group_by = parse_dashboard_args()
+    cube, rows = get_cube_slice(filters, group_by)
+    return render_template('dashboard.html',
+                          rows=rows,
+                          filters=filters,
+                          group_by=group_by,
+                          dimensions=summary_cube.CUBE_DIMENSIONS,
+                          dimension_values=cube.dimension_values(),
+                          cube_version=cube.version,
+                          updated_at=cube.updated_at,
+                          alert_threshold=current_app.config['ALERT_THRESHOLD_PCT'])
+
+
+@bp.route('/api/dashboard')
+def dashboard_api():
+    filters, group_by = parse_dashboard_args()
+    cube, rows = get_cube_slice(filters, group_by)
+    return jsonify({'version': cube.version, 'updated_at': cube.updated_at, 'group_by': group_by, 'rows': rows})
+
+
+# --- Output Retention ---
+def newest_mtime(path):
+    """Latest modification time of path or of anything below it."""
+    newest = os.path.getmtime(path)
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            try:
+                newest = max(newest, os.path.getmtime(os.path.join(root, name)))
+            except FileNotFoundError:
+                pass
+    return newest
+
+
+def sweep_job_outputs(store, retention_days, now=None):
+    """
+    Deletes per-job outputs (output_sql/<job_id>/, output_py/birdeye_fetch_<job_id>.py,
+    output_csv/<job_id>/) in which nothing changed for retention_days. Only names that are
+    job ids in the job store are considered, so other output_csv content (live/, profile/,
+    manifest output directories) is never touched. Returns the removed paths.
+    Coverage index entries of removed CSVs are pruned on the next lookup.
+    """
+    cutoff = (now or time.time()) - retention_days * 86400
+    job_ids = {job['id'] for job in store.list_jobs()}
+    candidates = []
+    for parent in (SQL_OUTPUT_DIR, os.path.join(BIRDEYE_DIR, 'output_csv')):
+        if os.path.isdir(parent):
+            candidates += [os.path.join(parent, name) for name in os.listdir(parent)
+                           if name in job_ids and os.path.isdir(os.path.join(parent, name))]
+    scripts_dir = os.path.join(BIRDEYE_DIR, 'output_py')
+    if os.path.isdir(scripts_dir):
+        candidates += [os.path.join(scripts_dir, f"birdeye_fetch_{job_id}.py") for job_id in job_ids
+                       if os.path.exists(os.path.join(scripts_dir, f"birdeye_fetch_{job_id}.py"))]
+
+    removed = []
+    for path in candidates:
+        try:
+            if newest_mtime(path) >= cutoff:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+            removed.append(path)
+        except FileNotFoundError:
+            # Another worker swept it first
+            pass
+    return removed
+
+
+_output_sweeper_started = False
+_output_sweeper_lock = threading.Lock()
+
+
+def start_output_sweeper(store, retention_days, interval_seconds=OUTPUT_SWEEP_INTERVAL_SECONDS):
+    """
+    Starts a daemon thread (once per process) that runs sweep_job_outputs every
+    interval_seconds. Every WSGI worker starts one, but only the worker holding the
+    'output_sweep' lease in the job store sweeps; another takes over if it stops renewing.
+    """
+    global _output_sweeper_started
+    with _output_sweeper_lock:
+        if _output_sweeper_started:
+            return
+        _output_sweeper_started = True
+    holder = f"{socket.gethostname()}:{os.getpid()}"
+
+    def sweep_forever():
+        while True:
+            try:
+                if store.acquire_lease('output_sweep', holder, interval_seconds * 1.5):
+                    removed = sweep_job_outputs(store, retention_days)
+                    if removed:
+                        print(f"Removed {len(removed)} job outputs older than {retention_days} days")
+            except Exception as e:
+                print(f"Warning: job output sweep failed: {e}")
+            time.sleep(interval_seconds)
+
+    threading.Thread(target=sweep_forever, name='output-sweeper', daemon=True).start()
+
+
+def create_app(config=None):
+    """
+    Application factory. Safe to call once per WSGI worker process: all shared
+    state lives in the SQLite job store (JOB_STORE_PATH, overridable with the
+    QA_JOB_STORE environment variable) and in per-job output paths.
+    """
+    app = Flask(__name__)
+    app.config.from_mapping(
+        JOB_STORE_PATH=os.environ.get('QA_JOB_STORE', DEFAULT_JOB_STORE_PATH),
+        # 'terminal' opens the fetcher in a new terminal window, 'background' runs it detached
+        FETCHER_LAUNCH_MODE=os.environ.get('QA_FETCHER_LAUNCH', 'terminal'),
+        # Shared with birdeye_fetcher.py, which adds every window it saves
+        COVERAGE_INDEX_PATH=coverage_index.DEFAULT_INDEX_PATH,
+        # Fetcher config whose OHLCV requests /confirm checks local coverage for; read once at startup
+        BIRDEYE_CONFIG_PATH=os.path.join(BIRDEYE_DIR, 'default_config.json'),
+        # Profile mode ('stages', 'cprofile' or 'sample') passed to every launched fetcher; empty = only when requested
+        FETCHER_PROFILE=os.environ.get('QA_FETCHER_PROFILE') or None,
+        # Per-job SQL, scripts and CSVs untouched for this many days are deleted; 0 keeps them forever
+        OUTPUT_RETENTION_DAYS=float(os.environ.get('QA_OUTPUT_RETENTION_DAYS', '14')),
+        # Dashboard highlight, same value validation_scheduler alerts on (QA_ALERT_THRESHOLD_PCT)
+        ALERT_THRESHOLD_PCT=summary_cube.ALERT_THRESHOLD_PCT,
+    )
+    if config:
+        app.config.update(config)
+    if app.config['FETCHER_PROFILE'] not in (None, *profiling.PROFILE_MODES):
+        raise ValueError(f"Unknown FETCHER_PROFILE '{app.config['FETCHER_PROFILE']}' "
+                         f"(QA_FETCHER_PROFILE), expected one of {profiling.PROFILE_MODES}")
+    app.config['BIRDEYE_REQUEST_TYPES'] = load_birdeye_request_types(app.config['BIRDEYE_CONFIG_PATH'])
+    app.extensions['job_store'] = job_store.JobStore(app.config['JOB_STORE_PATH'])
+    app.extensions['coverage_index'] = coverage_index.CoverageIndex(app.config['COVERAGE_INDEX_PATH'])
+    if app.config['OUTPUT_RETENTION_DAYS'] > 0:
+        start_output_sweeper(app.extensions['job_store'], app.config['OUTPUT_RETENTION_DAYS'])
+    app.register_blueprint(bp)
+    return app
+
+
 if __name__ == '__main__':
     if not os.path.exists(os.path.join(os.path.dirname(__file__), 'templates')):
         print("Error: 'templates' directory not found next to app.py")
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    create_app().run(debug=True, host='0.0.0.0', port=5000, threaded=True)
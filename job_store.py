@@ -0,0 +1,133 @@
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Shared job/state store for the web app. Every WSGI worker opens its own short-lived
+# connections to the same SQLite file; WAL mode lets readers run concurrently with the
+# single writer, and every job gets a unique id so concurrent users never share a key.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    token TEXT,
+    start_time TEXT,
+    end_time TEXT,
+    params TEXT,
+    result TEXT,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS queries (
+    job_id TEXT NOT NULL REFERENCES jobs (id),
+    interval TEXT NOT NULL,
+    sql TEXT NOT NULL,
+    path TEXT,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (job_id, interval)
+);
+"""
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def new_job_id():
+    """Unique key for one request's job, queries and output files."""
+    return uuid.uuid4().hex
+
+
+class JobStore:
+    def __init__(self, path, busy_timeout_ms=5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # --- Jobs ---
+    def create_job(self, kind, token=None, start_time=None, end_time=None, params=None, job_id=None, status='created'):
+        job_id = job_id or new_job_id()
+        now = _now()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, token, start_time, end_time, params, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, status, token, start_time, end_time, json.dumps(params or {}), now, now))
+        return job_id
+
+    def update_job(self, job_id, status, result=None, error=None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = COALESCE(?, result), error = COALESCE(?, error), updated_at = ? "
+                "WHERE id = ?",
+                (status, result, error, _now(), job_id))
+
+    def get_job(self, job_id):
+        """Returns the job with its queries as a dict, or None."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = dict(row)
+            job['params'] = json.loads(job['params'] or '{}')
+            job['queries'] = [dict(q) for q in conn.execute(
+                "SELECT interval, sql, path, created_at FROM queries WHERE job_id = ? ORDER BY interval", (job_id,))]
+        return job
+
+    def list_jobs(self, limit=None):
+        """Jobs without their queries, newest first (all of them unless limit is given)."""
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(
+                "SELECT id, kind, status, token, start_time, end_time, created_at, updated_at "
+                "FROM jobs ORDER BY created_at DESC LIMIT ?", (-1 if limit is None else limit,))]
+
+    # --- Leases ---
+    def acquire_lease(self, name, holder, ttl_seconds, now=None):
+        """
+        Takes (or renews) the named lease for holder until now + ttl_seconds. Returns False
+        while another holder's lease is still valid, so only one worker runs a periodic task.
+        """
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+                "WHERE leases.holder = excluded.holder OR leases.expires_at <= ?",
+                (name, holder, now + ttl_seconds, now))
+            return cursor.rowcount == 1
+
+    # --- Generated Queries ---
+    def save_queries(self, job_id, queries):
+        """Stores {interval: (sql, path)} for a job."""
+        now = _now()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO queries (job_id, interval, sql, path, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(job_id, interval, sql, path, now) for interval, (sql, path) in queries.items()])
@@ -0,0 +1,316 @@
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import requests
+
+# Load test for the web app: many simulated users walk the /generate -> /confirm ->
+# /run_birdeye_fetcher (and sometimes /run_birdeye) flow concurrently, while every
+# Birdeye call made by the fetchers goes to a local mock backend (BIRDEYE_BASE_URL).
+# Reports throughput and p50/p95/p99 latency per endpoint and exits with 1 when a
+# run regresses past --threshold against a saved baseline.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BIRDEYE_DIR = os.path.join(BASE_DIR, 'QA-20250411', 'Birdeye')
+SQL_OUTPUT_DIR = os.path.join(BASE_DIR, 'QA-20250411', 'DBeaver SQL', 'output_sql')
+DEFAULT_BASELINE_PATH = os.path.join(BASE_DIR, 'state', 'load_test_baseline.json')
+
+ENDPOINTS = ['/generate', '/confirm', '/run_birdeye_fetcher', '/run_birdeye']
+CANDLE_SECONDS = {'1m': 60, '1H': 3600}
+MAX_MOCK_CANDLES = 1000  # Same cap as the real OHLCV endpoint
+
+HIDDEN_START_RE = re.compile(r'name="start_time" value="([^"]+)"')
+HIDDEN_END_RE = re.compile(r'name="end_time" value="([^"]+)"')
+JOB_ID_RE = re.compile(r'name="job_id" value="(\w+)"')
+FETCH_JOB_ID_RE = re.compile(r'Job ID: (\w+)')
+
+
+# --- Mock Birdeye Backend ---
+class MockBirdeyeHandler(BaseHTTPRequestHandler):
+    latency_seconds = 0.0
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path != '/defi/ohlcv' or not self.headers.get('X-API-KEY'):
+            self._reply(404 if url.path != '/defi/ohlcv' else 401, {'success': False})
+            return
+        time.sleep(self.latency_seconds)
+        step = CANDLE_SECONDS.get(params.get('type'), 60)
+        time_from, time_to = int(params.get('time_from', 0)), int(params.get('time_to', 0))
+        first = -(-time_from // step) * step
+        items = [{'o': 1.0, 'h': 1.01, 'l': 0.99, 'c': 1.0, 'v': 100.0, 'unixTime': t,
+                  'address': params.get('address'), 'type': params.get('type')}
+                 for t in range(first, time_to + 1, step)][:MAX_MOCK_CANDLES]
+        self._reply(200, {'success': True, 'data': {'items': items}})
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def start_mock_birdeye(latency_seconds=0.0):
+    """Starts the mock backend on a free local port; returns (server, base_url)."""
+    handler = type('Handler', (MockBirdeyeHandler,), {'latency_seconds': latency_seconds})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def start_app(job_store_path):
+    """Serves create_app() on a free local port with a threaded WSGI server; returns (server, base_url)."""
+    from werkzeug.serving import make_server
+    from app import create_app
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    app = create_app({'JOB_STORE_PATH': job_store_path, 'FETCHER_LAUNCH_MODE': 'background', 'OUTPUT_RETENTION_DAYS': 0})
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+# --- Simulated Users ---
+class Recorder:
+    def __init__(self):
+        self.samples = {endpoint: [] for endpoint in ENDPOINTS}
+        self.errors = {endpoint: 0 for endpoint in ENDPOINTS}
+        self.job_ids = []
+        self.fetch_job_ids = []
+        self.lock = threading.Lock()
+
+    def timed_post(self, session, base_url, endpoint, data, timeout):
+        started = time.perf_counter()
+        try:
+            response = session.post(f"{base_url}{endpoint}", data=data, timeout=timeout)
+            ok = response.status_code == 200
+        except requests.exceptions.RequestException:
+            response, ok = None, False
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.samples[endpoint].append(elapsed)
+            if not ok:
+                self.errors[endpoint] += 1
+        return response if ok else None
+
+    def count_error(self, endpoint):
+        """Counts a 200 response whose page is missing what the next step needs."""
+        with self.lock:
+            self.errors[endpoint] += 1
+
+
+def user_session(recorder, base_url, token_address, deadline, fetcher_ratio, run_birdeye_ratio, timeout, seed):
+    """One simulated user repeating the app flow until the deadline."""
+    rng = random.Random(seed)
+    session = requests.Session()
+    while time.time() < deadline:
+        response = recorder.timed_post(session, base_url, '/generate', {'token_address': token_address}, timeout)
+        if response is None:
+            continue
+        start, end = HIDDEN_START_RE.search(response.text), HIDDEN_END_RE.search(response.text)
+        if not start or not end:
+            recorder.count_error('/generate')
+            continue
+
+        response = recorder.timed_post(session, base_url, '/confirm', {
+            'start_time': start.group(1), 'end_time': end.group(1), 'token_address': token_address}, timeout)
+        if response is None:
+            continue
+        job_match = JOB_ID_RE.search(response.text)
+        utc_start, utc_end = HIDDEN_START_RE.search(response.text), HIDDEN_END_RE.search(response.text)
+        if not job_match or not utc_start or not utc_end:
+            recorder.count_error('/confirm')
+            continue
+        job_id = job_match.group(1)
+        with recorder.lock:
+            recorder.job_ids.append(job_id)
+
+        if rng.random() < fetcher_ratio:
+            response = recorder.timed_post(session, base_url, '/run_birdeye_fetcher', {
+                'start_time': utc_start.group(1), 'end_time': utc_end.group(1),
+                'token_address': token_address, 'job_id': job_id}, timeout)
+            match = FETCH_JOB_ID_RE.search(response.text) if response is not None else None
+            if match:
+                with recorder.lock:
+                    recorder.fetch_job_ids.append(match.group(1))
+            elif response is not None:
+                recorder.count_error('/run_birdeye_fetcher')
+
+        if rng.random() < run_birdeye_ratio:
+            script_path = os.path.join(BIRDEYE_DIR, 'output_py', f'birdeye_fetch_{job_id}.py')
+            recorder.timed_post(session, base_url, '/run_birdeye', {'script_path': script_path}, timeout)
+
+
+# --- Report ---
+def summarize(recorder, wall_seconds):
+    report = {}
+    for endpoint in ENDPOINTS:
+        samples = np.array(recorder.samples[endpoint]) * 1000
+        if samples.size == 0:
+            continue
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        report[endpoint] = {
+            'requests': int(samples.size),
+            'errors': recorder.errors[endpoint],
+            'error_rate': recorder.errors[endpoint] / samples.size,
+            'throughput_rps': samples.size / wall_seconds,
+            'p50_ms': float(p50),
+            'p95_ms': float(p95),
+            'p99_ms': float(p99),
+        }
+    return report
+
+
+def print_report(report):
+    print(f"\n{'endpoint':<22}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, stats in report.items():
+        print(f"{endpoint:<22}{stats['requests']:>9}{stats['errors']:>8}{stats['throughput_rps']:>9.2f}"
+              f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+
+
+def find_regressions(report, baseline, threshold, max_error_rate):
+    """
+    Compares a run against a baseline report. A regression is a p95 or p99 latency more
+    than threshold (fraction) above the baseline, throughput more than threshold below
+    it, or an error rate above max_error_rate. Returns a list of messages.
+    """
+    regressions = []
+    for endpoint, stats in report.items():
+        if stats['error_rate'] > max_error_rate:
+            regressions.append(f"{endpoint}: error rate {stats['error_rate']:.1%} > {max_error_rate:.1%}")
+        base = baseline.get(endpoint)
+        if base is None:
+            continue
+        for key in ('p95_ms', 'p99_ms'):
+            if stats[key] > base[key] * (1 + threshold):
+                regressions.append(f"{endpoint}: {key} {stats[key]:.1f} > baseline {base[key]:.1f} + {threshold:.0%}")
+        if stats['throughput_rps'] < base['throughput_rps'] * (1 - threshold):
+            regressions.append(f"{endpoint}: throughput {stats['throughput_rps']:.2f} req/s < baseline "
+                               f"{base['throughput_rps']:.2f} - {threshold:.0%}")
+    return regressions
+
+
+def wait_for_fetchers(base_url, fetch_job_ids, timeout):
+    """Waits until every background fetcher started by the run has exited; returns the failed job ids."""
+    deadline = time.time() + timeout
+    pending = set(fetch_job_ids)
+    failed = []
+    while pending and time.time() < deadline:
+        for job_id in list(pending):
+            status = requests.get(f"{base_url}/jobs/{job_id}", timeout=10).json().get('status')
+            if status != 'launched':
+                pending.discard(job_id)
+                if status != 'succeeded':
+                    failed.append(job_id)
+        time.sleep(0.5)
+    return failed + sorted(pending)
+
+
+def remove_artifacts(job_ids, fetch_job_ids):
+    """Deletes the SQL files, scripts and CSVs the run generated."""
+    for job_id in job_ids:
+        shutil.rmtree(os.path.join(SQL_OUTPUT_DIR, job_id), ignore_errors=True)
+        script_path = os.path.join(BIRDEYE_DIR, 'output_py', f'birdeye_fetch_{job_id}.py')
+        if os.path.exists(script_path):
+            os.remove(script_path)
+        shutil.rmtree(os.path.join(BIRDEYE_DIR, 'output_csv', job_id), ignore_errors=True)
+    for job_id in fetch_job_ids:
+        shutil.rmtree(os.path.join(BIRDEYE_DIR, 'output_csv', job_id), ignore_errors=True)
+
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the web app against a mock Birdeye backend.")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent simulated users (default: 10).")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to generate load (default: 30).")
+    parser.add_argument("--fetcher-ratio", type=float, default=0.5, help="Share of confirmed jobs that launch the background fetcher (default: 0.5).")
+    parser.add_argument("--run-birdeye-ratio", type=float, default=0.1, help="Share of confirmed jobs that call /run_birdeye synchronously (default: 0.1).")
+    parser.add_argument("--mock-latency-ms", type=float, default=50, help="Latency of every mock Birdeye response (default: 50).")
+    parser.add_argument("--token", default="6p6xgHyF7AeE6TZkSmFsko444wqoP15icUSqi2jfGiPN", help="Token address the users submit.")
+    parser.add_argument("--request-timeout", type=float, default=120, help="Client timeout per request in seconds (default: 120).")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help="Baseline report to compare against.")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run's report as the new baseline.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed regression as a fraction of the baseline (default: 0.2).")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Allowed error rate per endpoint (default: 0.01).")
+    parser.add_argument("--output", default=None, help="Also write the report as JSON to this path.")
+    parser.add_argument("--keep-artifacts", action="store_true", help="Keep the SQL files, scripts and CSVs generated during the run.")
+    args = parser.parse_args()
+
+    mock_server, mock_url = start_mock_birdeye(args.mock_latency_ms / 1000)
+    # Fetcher subprocesses inherit these and talk to the mock instead of Birdeye
+    os.environ['BIRDEYE_BASE_URL'] = mock_url
+    os.environ['BIRDEYE_API_KEY'] = 'load-test-key'
+    work_dir = tempfile.mkdtemp(prefix='load_test_')
+    # Keep the run's windows out of the real coverage index
+    os.environ['QA_COVERAGE_INDEX'] = os.path.join(work_dir, 'coverage.sqlite3')
+    app_server, app_url = start_app(os.path.join(work_dir, 'jobs.sqlite3'))
+    print(f"App at {app_url}, mock Birdeye at {mock_url}; {args.users} users for {args.duration:.0f}s")
+
+    recorder = Recorder()
+    started = time.time()
+    deadline = started + args.duration
+    users = [threading.Thread(target=user_session, args=(recorder, app_url, args.token, deadline, args.fetcher_ratio,
+                                                         args.run_birdeye_ratio, args.request_timeout, i))
+             for i in range(args.users)]
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    wall_seconds = time.time() - started
+
+    report = summarize(recorder, wall_seconds)
+    print_report(report)
+
+    failed_fetchers = wait_for_fetchers(app_url, recorder.fetch_job_ids, args.request_timeout)
+    if failed_fetchers:
+        print(f"\n{len(failed_fetchers)} of {len(recorder.fetch_job_ids)} background fetchers did not succeed: {failed_fetchers[:5]}")
+    app_server.shutdown()
+    mock_server.shutdown()
+    if not args.keep_artifacts:
+        remove_artifacts(recorder.job_ids, recorder.fetch_job_ids)
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    regressions = find_regressions(report, baseline or {}, args.threshold, args.max_error_rate)
+    if failed_fetchers:
+        regressions.append(f"/run_birdeye_fetcher: {len(failed_fetchers)} background fetchers failed")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+    elif baseline is None:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
+
+    if regressions:
+        print("\nRegressions:")
+        for message in regressions:
+            print(f"  {message}")
+        sys.exit(1)
+    print("\nNo regressions")
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The fetcher and comparison modules are scripts run from their own directory, not an installed package
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QA_DIR = os.path.join(REPO_DIR, 'QA-20250411')
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(QA_DIR, 'Birdeye'))
+sys.path.insert(0, os.path.join(QA_DIR, 'Comparison'))
@@ -0,0 +1,89 @@
+import json
+import os
+import time
+
+import pytest
+
+import app
+import job_store
+
+
+@pytest.fixture
+def store(tmp_path):
+    return job_store.JobStore(str(tmp_path / 'jobs.sqlite3'))
+
+
+def make_old_dir(path, age_days):
+    os.makedirs(path)
+    mtime = time.time() - age_days * 86400
+    os.utime(path, (mtime, mtime))
+
+
+def test_sweep_removes_only_known_job_dirs(tmp_path, monkeypatch, store):
+    monkeypatch.setattr(app, 'SQL_OUTPUT_DIR', str(tmp_path / 'output_sql'))
+    monkeypatch.setattr(app, 'BIRDEYE_DIR', str(tmp_path / 'Birdeye'))
+    job_id = store.create_job('birdeye_fetch', 'TOKEN')
+    csv_dir = tmp_path / 'Birdeye' / 'output_csv'
+    for name in (job_id, 'live', 'profile', 'manifest_run'):
+        make_old_dir(str(csv_dir / name), 30)
+
+    removed = app.sweep_job_outputs(store, 14)
+
+    assert removed == [str(csv_dir / job_id)]
+    assert sorted(os.listdir(csv_dir)) == ['live', 'manifest_run', 'profile']
+
+
+def test_sweep_keeps_recent_job_dirs(tmp_path, monkeypatch, store):
+    monkeypatch.setattr(app, 'SQL_OUTPUT_DIR', str(tmp_path / 'output_sql'))
+    monkeypatch.setattr(app, 'BIRDEYE_DIR', str(tmp_path / 'Birdeye'))
+    job_id = store.create_job('birdeye_fetch', 'TOKEN')
+    make_old_dir(str(tmp_path / 'output_sql' / job_id), 3)
+
+    assert app.sweep_job_outputs(store, 14) == []
+
+
+def test_lease_is_held_by_one_holder_until_it_expires(store):
+    assert store.acquire_lease('output_sweep', 'worker-a', 10, now=0)
+    assert not store.acquire_lease('output_sweep', 'worker-b', 10, now=5)
+    assert store.acquire_lease('output_sweep', 'worker-a', 10, now=6)
+    assert store.acquire_lease('output_sweep', 'worker-b', 10, now=17)
+
+
+def make_app(tmp_path, **config):
+    config = {'JOB_STORE_PATH': str(tmp_path / 'jobs.sqlite3'),
+              'COVERAGE_INDEX_PATH': str(tmp_path / 'coverage.sqlite3'),
+              'OUTPUT_RETENTION_DAYS': 0,
+              'FETCHER_LAUNCH_MODE': 'background',
+              **config}
+    return app.create_app(config)
+
+
+def test_run_birdeye_fetcher_defaults_the_token(tmp_path, monkeypatch):
+    flask_app = make_app(tmp_path)
+    launched = []
+    monkeypatch.setattr(app, 'launch_background_fetcher', lambda *args: launched.append(args))
+    client = flask_app.test_client()
+
+    assert client.post('/run_birdeye_fetcher', data={}).status_code == 400
+    response = client.post('/run_birdeye_fetcher', data={'start_time': '2025-04-11 00:00:00',
+                                                          'end_time': '2025-04-11 01:00:00'})
+
+    assert response.status_code == 200
+    argv = launched[0][-1]
+    assert argv[argv.index('--token') + 1] == app.DEFAULT_TOKEN_ADDRESS
+
+
+def test_birdeye_config_is_read_once_at_startup(tmp_path):
+    config_path = tmp_path / 'birdeye_config.json'
+    config_path.write_text(json.dumps({'ohlcv_requests': [{'name': 'ohlcv_1m', 'query_params': {'type': '1m'}},
+                                                          {'name': 'ohlcv_5m', 'query_params': {'type': '5m'}}]}))
+    flask_app = make_app(tmp_path, BIRDEYE_CONFIG_PATH=str(config_path))
+    config_path.unlink()
+
+    with flask_app.app_context():
+        rows, cached_dir = app.check_local_coverage('TOKEN', '2025-04-11 00:00:00', '2025-04-11 01:00:00', 'job')
+
+    assert flask_app.config['BIRDEYE_REQUEST_TYPES'] == [('ohlcv_1m', '1m'), ('ohlcv_5m', '5m')]
+    assert [(row['interval'], row['source']) for row in rows] == [
+        ('1m', 'birdeye'), ('1m', 'hubble'), ('5m', 'birdeye'), ('5m', 'hubble')]
+    assert cached_dir is None
@@ -0,0 +1,306 @@
+import threading
+
+import pytest
+
+import birdeye_fetcher
+
+REQUEST_CONF = {"name": "ohlcv_1m", "query_params": {"type": "1m"}}
+
+
+def candles(start, end, step=60):
+    return [{"unixTime": t, "o": 1, "h": 1, "l": 1, "c": 1, "v": 1} for t in range(start, end + 1, step)]
+
+
+def fake_fetch(fail_chunks=()):
+    def fetch(config, request_conf, chunk_start, chunk_end, api_key, token_address):
+        if chunk_start in fail_chunks:
+            return None
+        return {"data": {"items": candles(chunk_start, chunk_end)}}
+    return fetch
+
+
+def test_fetch_and_combine_data_complete(monkeypatch):
+    monkeypatch.setattr(birdeye_fetcher, "fetch_ohlcv_data", fake_fetch())
+    combined = birdeye_fetcher.fetch_and_combine_data({}, REQUEST_CONF, [(0, 540), (600, 1140)], "key", "TOKEN", 0)
+    assert combined["complete"]
+    assert len(combined["data"]["items"]) == 20
+
+
+def test_fetch_and_combine_data_failed_chunk_is_incomplete(monkeypatch):
+    monkeypatch.setattr(birdeye_fetcher, "fetch_ohlcv_data", fake_fetch(fail_chunks={600}))
+    combined = birdeye_fetcher.fetch_and_combine_data({}, REQUEST_CONF, [(0, 540), (600, 1140)], "key", "TOKEN", 0)
+    assert not combined["complete"]
+    assert len(combined["data"]["items"]) == 10
+
+
+def test_fetch_and_combine_data_deadline_is_incomplete(monkeypatch):
+    monkeypatch.setattr(birdeye_fetcher, "fetch_ohlcv_data", fake_fetch())
+    monkeypatch.setattr(birdeye_fetcher, "job_time_remaining", lambda: 0)
+    assert birdeye_fetcher.fetch_and_combine_data({}, REQUEST_CONF, [(0, 540)], "key", "TOKEN", 0) is None
+
+
+def test_fetch_range_with_coverage_reports_failed_chunk(monkeypatch):
+    monkeypatch.setattr(birdeye_fetcher, "fetch_ohlcv_data", fake_fetch(fail_chunks={3600}))
+    items, complete = birdeye_fetcher.fetch_range_with_coverage(
+        {}, REQUEST_CONF, "TOKEN", 0, 7199, "key", chunk_hours=1, rate_limit_sleep=0,
+        skip_integrity_check=True)
+    assert not complete
+    assert len(items) == 60
+
+
+# --- Integrity Check & Backfill ---
+def test_check_candle_integrity_clean_window():
+    report = birdeye_fetcher.check_candle_integrity(candles(0, 540), 0, 540, 60)
+    assert report["expected_count"] == 10
+    assert report["missing"] == [] and report["duplicates"] == [] and report["off_grid"] == []
+    assert report["missing_ranges"] == []
+
+
+def test_check_candle_integrity_gaps_duplicates_and_off_grid():
+    items = candles(0, 540)
+    items = [it for it in items if it["unixTime"] not in (120, 180, 420)]
+    items += [{"unixTime": 60}, {"unixTime": 61}]
+    report = birdeye_fetcher.check_candle_integrity(items, 0, 540, 60)
+    assert report["missing"] == [120, 180, 420]
+    assert report["missing_ranges"] == [(120, 180), (420, 420)]
+    assert report["duplicates"] == [60]
+    assert report["off_grid"] == [61]
+    assert report["received_count"] == 9
+
+
+def test_check_candle_integrity_window_not_on_grid():
+    # The first expected candle is the first interval edge at or after start
+    report = birdeye_fetcher.check_candle_integrity([], 30, 200, 60)
+    assert report["missing"] == [60, 120, 180]
+
+
+def test_plan_backfill_requests_merges_runs_that_fit_one_response():
+    plan = birdeye_fetcher.plan_backfill_requests([(0, 60), (600, 660)], 60, max_candles=20)
+    assert plan == [(0, 660)]
+
+
+def test_plan_backfill_requests_keeps_distant_runs_apart():
+    plan = birdeye_fetcher.plan_backfill_requests([(0, 60), (6000, 6060)], 60, max_candles=20)
+    assert plan == [(0, 60), (6000, 6060)]
+
+
+def test_plan_backfill_requests_splits_long_runs():
+    plan = birdeye_fetcher.plan_backfill_requests([(0, 59 * 60)], 60, max_candles=20)
+    assert plan == [(0, 1140), (1200, 2340), (2400, 3540)]
+    assert all((end - start) // 60 + 1 <= 20 for start, end in plan)
+
+
+def test_max_chunk_hours_keeps_chunks_within_one_response():
+    assert birdeye_fetcher.max_chunk_hours("1m") == 999 / 60
+    assert birdeye_fetcher.max_chunk_hours("1H") == 24
+    assert birdeye_fetcher.max_chunk_hours("unknown") == 24
+    for chunk_start, chunk_end in birdeye_fetcher.chunk_time_range(0, 3 * 86400, birdeye_fetcher.max_chunk_hours("1m")):
+        assert (chunk_end - chunk_start) // 60 + 1 <= birdeye_fetcher.MAX_CANDLES_PER_REQUEST
+
+
+def test_fetch_range_with_coverage_default_1m_needs_no_backfill(monkeypatch):
+    requests_seen = []
+
+    def capped_fetch(config, request_conf, chunk_start, chunk_end, api_key, token_address):
+        requests_seen.append((chunk_start, chunk_end))
+        # Like the API: at most 1000 candles per response
+        return {"data": {"items": candles(-(-chunk_start // 60) * 60, chunk_end)[:birdeye_fetcher.MAX_CANDLES_PER_REQUEST]}}
+
+    monkeypatch.setattr(birdeye_fetcher, "fetch_ohlcv_data", capped_fetch)
+    monkeypatch.setattr(birdeye_fetcher.time, "sleep", lambda seconds: None)
+    items, complete = birdeye_fetcher.fetch_range_with_coverage({}, REQUEST_CONF, "TOKEN", 0, 86400 - 60, "key")
+    assert complete
+    assert len(items) == 1440
+    assert len(requests_seen) == 2
+
+
+def test_coalesce_windows_merges_overlapping_and_adjacent():
+    windows = [(1200, 1500), (0, 540), (300, 900), (960, 1080), (3600, 3900)]
+    ranges, assignment = birdeye_fetcher.coalesce_windows(windows, 60)
+    # 960 follows 900 by exactly one candle, so there is nothing to fetch in between
+    assert ranges == [(0, 1080), (1200, 1500), (3600, 3900)]
+    assert assignment == [1, 0, 0, 0, 2]
+
+
+def test_coalesce_windows_keeps_a_missing_candle_gap():
+    ranges, assignment = birdeye_fetcher.coalesce_windows([(0, 540), (660, 900)], 60)
+    assert ranges == [(0, 540), (660, 900)]
+    assert assignment == [0, 1]
+
+
+def test_coalesce_windows_nested_and_empty():
+    assert birdeye_fetcher.coalesce_windows([(0, 3600), (600, 1200)], 60) == ([(0, 3600)], [0, 0])
+    assert birdeye_fetcher.coalesce_windows([], 60) == ([], [])
+
+
+def test_slice_candles_bounds_are_inclusive():
+    items = candles(0, 1140)
+    sliced = birdeye_fetcher.slice_candles(items, 120, 300)
+    assert [item["unixTime"] for item in sliced] == [120, 180, 240, 300]
+    # Bounds between candles only keep the candles that open inside the window
+    assert [item["unixTime"] for item in birdeye_fetcher.slice_candles(items, 130, 290)] == [180, 240]
+
+
+def test_slice_candles_outside_range():
+    items = candles(600, 1140)
+    assert birdeye_fetcher.slice_candles(items, 0, 540) == []
+    assert birdeye_fetcher.slice_candles(items, 1200, 1800) == []
+    assert birdeye_fetcher.slice_candles([], 0, 60) == []
+
+
+API_CONFIG = {"common_parameters": {"base_url": "https://example.invalid", "api_key_header": "X-API-KEY"}}
+OHLCV_CONF = {"name": "ohlcv_1m", "endpoint": "/defi/ohlcv", "query_params": {"type": "1m"}}
+
+
+@pytest.fixture
+def request_policy(monkeypatch):
+    """Fast request policy with recorded (not slept) waits; restores the module defaults afterwards."""
+    saved = dict(birdeye_fetcher.REQUEST_POLICY)
+    sleeps = []
+    monkeypatch.setattr(birdeye_fetcher.time, "sleep", sleeps.append)
+
+    def configure(**overrides):
+        policy = {"backoff_base": 0.0, "hedge_after": None, "requests_per_second": 1000.0}
+        policy.update(overrides)
+        job_timeout = policy.pop("job_timeout", None)
+        birdeye_fetcher.REQUEST_POLICY.update(policy)
+        birdeye_fetcher.configure_request_policy(job_timeout=job_timeout)
+        return sleeps
+
+    yield configure
+    birdeye_fetcher.REQUEST_POLICY.clear()
+    birdeye_fetcher.REQUEST_POLICY.update(saved)
+    birdeye_fetcher.configure_request_policy()
+
+
+def scripted_send(monkeypatch, outcomes):
+    """Replaces _send_request; each call pops the next outcome (an exception is raised)."""
+    calls = []
+
+    def send(url, headers, params):
+        calls.append(params)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    monkeypatch.setattr(birdeye_fetcher, "_send_request", send)
+    return calls
+
+
+def fetch():
+    return birdeye_fetcher.fetch_ohlcv_data(API_CONFIG, OHLCV_CONF, 0, 3600, "key", "TOKEN")
+
+
+def test_fetch_retries_retryable_errors(monkeypatch, request_policy):
+    request_policy(max_retries=3)
+    calls = scripted_send(monkeypatch, [birdeye_fetcher.FetchError("503"), birdeye_fetcher.FetchError("timeout"),
+                                        {"data": {"items": []}}])
+    assert fetch() == {"data": {"items": []}}
+    assert len(calls) == 3
+    assert calls[0]["address"] == "TOKEN" and calls[0]["time_to"] == 3600
+
+
+def test_fetch_gives_up_on_non_retryable_error(monkeypatch, request_policy):
+    request_policy(max_retries=3)
+    calls = scripted_send(monkeypatch, [birdeye_fetcher.FetchError("HTTP error 401", retryable=False)])
+    assert fetch() is None
+    assert len(calls) == 1
+
+
+def test_breaker_opens_and_pauses_the_next_attempt(monkeypatch, request_policy):
+    sleeps = request_policy(max_retries=2, breaker_failure_threshold=2, breaker_reset_seconds=60.0)
+    calls = scripted_send(monkeypatch, [birdeye_fetcher.FetchError("503")] * 2 + [{"data": {"items": []}}])
+    assert fetch() == {"data": {"items": []}}
+    assert len(calls) == 3
+    # Two backoffs (0s with backoff_base 0) and one wait for the open breaker before the trial request
+    assert [s for s in sleeps if s > 1] == [pytest.approx(60.0, abs=1.0)]
+    breaker = birdeye_fetcher._get_circuit_breaker()
+    assert breaker.opened_at is None and breaker.failures == 0
+
+
+def test_open_breaker_past_the_deadline_sends_nothing(monkeypatch, request_policy):
+    sleeps = request_policy(breaker_failure_threshold=1, breaker_reset_seconds=60.0, job_timeout=5)
+    birdeye_fetcher._get_circuit_breaker().record_failure()
+    calls = scripted_send(monkeypatch, [])
+    assert fetch() is None
+    assert calls == [] and sleeps == []
+
+
+def test_backoff_past_the_deadline_gives_up(monkeypatch, request_policy):
+    request_policy(max_retries=3, job_timeout=5)
+    calls = scripted_send(monkeypatch, [birdeye_fetcher.FetchError("429", retry_after=30)])
+    assert fetch() is None
+    assert len(calls) == 1
+
+
+def slow_then_fast(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def send(url, headers, params):
+        calls.append(params)
+        if len(calls) == 1:
+            release.wait(5)
+            return {"data": "slow"}
+        return {"data": "fast"}
+    monkeypatch.setattr(birdeye_fetcher, "_send_request", send)
+    return calls, release
+
+
+def test_hedged_request_answers_first(monkeypatch, request_policy):
+    request_policy(hedge_after=0.05)
+    calls, release = slow_then_fast(monkeypatch)
+    try:
+        assert fetch() == {"data": "fast"}
+        assert len(calls) == 2
+    finally:
+        release.set()
+
+
+def test_no_hedge_without_spare_rate_budget(monkeypatch, request_policy):
+    request_policy(hedge_after=0.05, requests_per_second=0.001)
+    calls, release = slow_then_fast(monkeypatch)
+    threading.Timer(0.3, release.set).start()
+    assert fetch() == {"data": "slow"}
+    assert len(calls) == 1
+
+
+LIVE_HEADER = b"unixTime,o,h,l,c,v\n"
+
+
+def test_live_store_writes_header_into_an_empty_file(tmp_path):
+    path = tmp_path / "live.csv"
+    path.write_bytes(b"")
+    store = birdeye_fetcher.LiveCandleStore(str(path), 60)
+    assert path.read_bytes() == LIVE_HEADER
+    assert store.last_closed is None and store.open_offset is None
+
+
+def test_live_store_restart_reopens_the_last_row(tmp_path):
+    path = str(tmp_path / "live.csv")
+    store = birdeye_fetcher.LiveCandleStore(path, 60)
+    assert store.apply(candles(0, 180), now_unix=200) == candles(0, 120)
+
+    restarted = birdeye_fetcher.LiveCandleStore(path, 60)
+    assert restarted.last_closed == 120
+    restarted.apply(candles(180, 240), now_unix=290)
+    with open(path, "rb") as f:
+        lines = f.read().splitlines()
+    assert [int(line.split(b",")[0]) for line in lines[1:]] == [0, 60, 120, 180, 240]
+
+
+def test_live_store_restart_drops_a_partial_row(tmp_path):
+    path = tmp_path / "live.csv"
+    path.write_bytes(LIVE_HEADER + b"0,1,1,1,1,1\n60,1,1,1,1,1\n12")
+    store = birdeye_fetcher.LiveCandleStore(str(path), 60)
+    assert path.read_bytes() == LIVE_HEADER + b"0,1,1,1,1,1\n60,1,1,1,1,1\n"
+    assert store.last_closed == 0
+    assert store.poll_start(200, 3600) == 60
+
+
+def test_live_store_restart_rewrites_a_partial_header(tmp_path):
+    path = tmp_path / "live.csv"
+    path.write_bytes(b"unixTi")
+    store = birdeye_fetcher.LiveCandleStore(str(path), 60)
+    assert path.read_bytes() == LIVE_HEADER
+    assert store.last_closed is None
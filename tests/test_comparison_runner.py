@@ -0,0 +1,75 @@
+import json
+import os
+
+import pytest
+
+import comparison_runner
+
+
+def fake_run_shard(shard_id, items, output_dir, use_store=True, profile_mode=None, profile_dir=None):
+    """
+    Stand-in for run_shard driven by its single item: 'ok', 'fail_once', 'die_once'
+    (the worker process exits) or 'always_fail'. Attempts are counted in marker files,
+    because each attempt may run in a different worker process.
+    """
+    item = items[0]
+    marker = os.path.join(output_dir, f"attempts_{shard_id}")
+    with open(marker, 'a', encoding='utf-8') as f:
+        f.write('x')
+    with open(marker, 'r', encoding='utf-8') as f:
+        attempt = len(f.read())
+    if item['mode'] == 'always_fail' or (item['mode'] == 'fail_once' and attempt == 1):
+        raise ValueError(f"shard {shard_id} failed")
+    if item['mode'] == 'die_once' and attempt == 1:
+        os._exit(1)
+    path = comparison_runner.shard_result_path(output_dir, shard_id)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'shard_id': shard_id, 'groups': {}}, f)
+    return path
+
+
+def attempts(output_dir, shard_id):
+    with open(os.path.join(output_dir, f"attempts_{shard_id}"), 'r', encoding='utf-8') as f:
+        return len(f.read())
+
+
+@pytest.fixture
+def fake_shards(monkeypatch):
+    monkeypatch.setattr(comparison_runner, 'run_shard', fake_run_shard)
+
+
+def test_run_shards_retries_a_failing_shard(tmp_path, fake_shards):
+    shards = [[{'mode': 'ok'}], [{'mode': 'fail_once'}]]
+    paths = comparison_runner.run_shards(shards, str(tmp_path), workers=2, max_retries=2)
+    assert all(os.path.exists(p) for p in paths)
+    assert attempts(tmp_path, 0) == 1
+    assert attempts(tmp_path, 1) == 2
+
+
+def test_run_shards_rebuilds_the_pool_after_a_worker_dies(tmp_path, fake_shards):
+    shards = [[{'mode': 'die_once'}], [{'mode': 'ok'}], [{'mode': 'ok'}]]
+    paths = comparison_runner.run_shards(shards, str(tmp_path), workers=1, max_retries=2)
+    assert all(os.path.exists(p) for p in paths)
+    assert attempts(tmp_path, 0) == 2
+
+
+def test_run_shards_gives_up_after_max_retries(tmp_path, fake_shards):
+    shards = [[{'mode': 'ok'}], [{'mode': 'always_fail'}]]
+    with pytest.raises(RuntimeError, match=r"\[1\]"):
+        comparison_runner.run_shards(shards, str(tmp_path), workers=2, max_retries=1)
+    assert attempts(tmp_path, 1) == 2
+    assert os.path.exists(comparison_runner.shard_result_path(str(tmp_path), 0))
+
+
+def test_run_shards_skips_finished_shards(tmp_path, fake_shards):
+    shards = [[{'mode': 'always_fail'}], [{'mode': 'ok'}]]
+    with open(comparison_runner.shard_result_path(str(tmp_path), 0), 'w', encoding='utf-8') as f:
+        json.dump({'shard_id': 0, 'groups': {}}, f)
+    comparison_runner.run_shards(shards, str(tmp_path), workers=1)
+    assert not os.path.exists(tmp_path / 'attempts_0')
+
+
+def test_plan_fingerprint_ignores_item_order():
+    items = [{'token': 'A', 'interval': '1m'}, {'token': 'B', 'interval': '1H'}]
+    assert comparison_runner.plan_fingerprint(items) == comparison_runner.plan_fingerprint(items[::-1])
+    assert comparison_runner.plan_fingerprint(items) != comparison_runner.plan_fingerprint(items[:1])
@@ -0,0 +1,121 @@
+import random
+
+import pytest
+
+from coverage_index import CoverageIndex, IntervalTree, subtract_ranges
+
+
+# --- IntervalTree ---
+def brute_force_overlapping(segments, start, end):
+    return sorted([s for s in segments if s[0] <= end and s[1] >= start], key=lambda s: (s[0], s[1]))
+
+
+def test_interval_tree_empty():
+    assert IntervalTree([]).overlapping(0, 100) == []
+
+
+def test_interval_tree_touching_bounds_are_inclusive():
+    tree = IntervalTree([(0, 10, 'a'), (20, 30, 'b')])
+    assert tree.overlapping(10, 20) == [(0, 10, 'a'), (20, 30, 'b')]
+    assert tree.overlapping(11, 19) == []
+
+
+def test_interval_tree_matches_brute_force():
+    rng = random.Random(7)
+    segments = []
+    for i in range(300):
+        start = rng.randrange(0, 10_000)
+        segments.append((start, start + rng.randrange(0, 500), i))
+    tree = IntervalTree(segments)
+    for _ in range(200):
+        start = rng.randrange(-100, 10_500)
+        end = start + rng.randrange(0, 800)
+        assert tree.overlapping(start, end) == brute_force_overlapping(segments, start, end)
+
+
+# --- subtract_ranges ---
+def test_subtract_ranges_nothing_covered():
+    assert subtract_ranges(0, 100, []) == ([], [(0, 100)])
+
+
+def test_subtract_ranges_fully_covered_and_clipped():
+    assert subtract_ranges(10, 20, [(0, 50)]) == ([(10, 20)], [])
+
+
+def test_subtract_ranges_gaps_at_both_ends_and_middle():
+    covered, missing = subtract_ranges(0, 100, [(10, 20), (40, 50)])
+    assert covered == [(10, 20), (40, 50)]
+    assert missing == [(0, 9), (21, 39), (51, 100)]
+
+
+def test_subtract_ranges_merges_segments_within_one_step():
+    # 60 s candles: segments ending at 600 and starting at 660 leave no candle in between
+    covered, missing = subtract_ranges(0, 1200, [(0, 600), (660, 1200)], step=60)
+    assert covered == [(0, 1200)]
+    assert missing == []
+
+
+def test_subtract_ranges_reports_gap_of_one_step():
+    covered, missing = subtract_ranges(0, 1200, [(0, 600), (720, 1200)], step=60)
+    assert covered == [(0, 600), (720, 1200)]
+    assert missing == [(601, 719)]
+
+
+def test_subtract_ranges_tail_shorter_than_step_is_covered():
+    assert subtract_ranges(0, 659, [(0, 600)], step=60) == ([(0, 600)], [])
+
+
+# --- CoverageIndex ---
+@pytest.fixture
+def index(tmp_path):
+    return CoverageIndex(str(tmp_path / 'coverage.sqlite3'))
+
+
+def saved_file(tmp_path, name):
+    path = tmp_path / name
+    path.write_text('unixTime,o,h,l,c,v\n', encoding='utf-8')
+    return str(path)
+
+
+def test_coverage_without_segments(index):
+    report = index.coverage('TOKEN', '1m', 'birdeye', 0, 599, step=60)
+    assert report == {'covered': [], 'missing': [(0, 599)], 'complete': False, 'covered_fraction': 0.0}
+
+
+def test_coverage_partial(index, tmp_path):
+    index.add('TOKEN', '1m', 'birdeye', 0, 299, saved_file(tmp_path, 'a.csv'))
+    report = index.coverage('TOKEN', '1m', 'birdeye', 0, 599, step=60)
+    assert report['covered'] == [(0, 299)]
+    assert report['missing'] == [(300, 599)]
+    assert not report['complete']
+    assert report['covered_fraction'] == pytest.approx(0.5)
+
+
+def test_coverage_complete_from_adjacent_segments(index, tmp_path):
+    index.add('TOKEN', '1m', 'birdeye', 0, 240, saved_file(tmp_path, 'a.csv'))
+    index.add('TOKEN', '1m', 'birdeye', 300, 600, saved_file(tmp_path, 'b.csv'))
+    report = index.coverage('TOKEN', '1m', 'birdeye', 0, 600, step=60)
+    assert report['complete']
+    assert report['covered_fraction'] == 1.0
+
+
+def test_coverage_is_per_key(index, tmp_path):
+    index.add('TOKEN', '1m', 'birdeye', 0, 600, saved_file(tmp_path, 'a.csv'))
+    assert not index.coverage('OTHER', '1m', 'birdeye', 0, 600, step=60)['covered']
+    assert not index.coverage('TOKEN', '1H', 'birdeye', 0, 600, step=3600)['covered']
+    assert not index.coverage('TOKEN', '1m', 'hubble', 0, 600, step=60)['covered']
+
+
+def test_coverage_sees_segments_added_after_first_lookup(index, tmp_path):
+    assert not index.coverage('TOKEN', '1m', 'birdeye', 0, 600, step=60)['covered']
+    index.add('TOKEN', '1m', 'birdeye', 0, 600, saved_file(tmp_path, 'a.csv'))
+    assert index.coverage('TOKEN', '1m', 'birdeye', 0, 600, step=60)['complete']
+
+
+def test_coverage_drops_segments_whose_file_is_gone(index, tmp_path):
+    path = saved_file(tmp_path, 'a.csv')
+    index.add('TOKEN', '1m', 'birdeye', 0, 600, path)
+    (tmp_path / 'a.csv').unlink()
+    report = index.coverage('TOKEN', '1m', 'birdeye', 0, 600, step=60)
+    assert report['missing'] == [(0, 600)]
+    assert index.segments('TOKEN', '1m', 'birdeye', 0, 600) == []
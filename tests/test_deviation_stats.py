@@ -0,0 +1,137 @@
+import json
+
+import numpy as np
+import pytest
+
+from deviation_stats import DeviationAccumulator, KLLSketch, LogHistogram, MomentsAccumulator, sketch_ks_statistic
+from kline_compare import ks_statistic
+
+# Documented bounds at k=200 (see the top of deviation_stats.py)
+RANK_ERROR = 0.017
+KS_ERROR = 0.033
+
+
+def exact_rank(sorted_values, value):
+    return np.searchsorted(sorted_values, value, side='right') / sorted_values.size
+
+
+# --- Moments ---
+def test_moments_merge_matches_numpy():
+    rng = np.random.default_rng(1)
+    values = rng.lognormal(size=10_001)
+    parts = [MomentsAccumulator() for _ in range(4)]
+    for part, chunk in zip(parts, np.array_split(values, 4)):
+        for piece in np.array_split(chunk, 3):
+            part.update(piece)
+    merged = parts[0].merge(parts[1]).merge(parts[2].merge(parts[3]))
+    assert merged.count == values.size
+    assert merged.mean == pytest.approx(values.mean(), rel=1e-12)
+    assert merged.std == pytest.approx(values.std(), rel=1e-10)
+    assert merged.min == values.min() and merged.max == values.max()
+
+
+def test_moments_ignore_nan_and_empty_merge():
+    acc = MomentsAccumulator()
+    acc.update([1.0, np.nan, 3.0])
+    acc.merge(MomentsAccumulator())
+    assert acc.count == 2 and acc.mean == 2.0 and acc.std == 1.0
+
+
+def test_moments_round_trip():
+    acc = MomentsAccumulator()
+    acc.update([1.0, 2.0, 4.0])
+    restored = MomentsAccumulator.from_dict(json.loads(json.dumps(acc.to_dict())))
+    assert restored.to_dict() == acc.to_dict()
+
+
+# --- KLL ---
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_kll_rank_error_within_bound(seed):
+    rng = np.random.default_rng(seed)
+    values = rng.standard_t(3, size=200_000)
+    sketch = KLLSketch(seed=seed)
+    for chunk in np.array_split(values, 37):
+        sketch.update(chunk)
+    sorted_values = np.sort(values)
+    for q in [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99]:
+        assert abs(exact_rank(sorted_values, sketch.quantile(q)) - q) <= RANK_ERROR
+
+
+def test_kll_merge_keeps_rank_error_and_count():
+    rng = np.random.default_rng(3)
+    values = rng.exponential(size=120_000)
+    sketches = []
+    for i, chunk in enumerate(np.array_split(values, 6)):
+        sketch = KLLSketch(seed=i)
+        sketch.update(chunk)
+        sketches.append(sketch)
+    merged = sketches[0]
+    for sketch in sketches[1:]:
+        merged.merge(sketch)
+    assert merged.n == values.size
+    sorted_values = np.sort(values)
+    for q in [0.05, 0.5, 0.95]:
+        assert abs(exact_rank(sorted_values, merged.quantile(q)) - q) <= RANK_ERROR
+
+
+def test_kll_small_input_is_exact():
+    sketch = KLLSketch()
+    sketch.update([5.0, 1.0, 3.0, np.nan])
+    assert sketch.n == 3
+    assert sketch.quantile(0.5) == 3.0
+    assert sketch.quantile(1.0) == 5.0
+
+
+def test_kll_empty():
+    assert np.isnan(KLLSketch().quantile(0.5))
+
+
+# --- KS ---
+@pytest.mark.parametrize('shift', [0.0, 0.05, 0.3])
+def test_sketch_ks_statistic_close_to_exact(shift):
+    rng = np.random.default_rng(4)
+    a = rng.normal(size=100_000)
+    b = rng.normal(loc=shift, size=80_000)
+    sketch_a, sketch_b = KLLSketch(seed=1), KLLSketch(seed=2)
+    sketch_a.update(a)
+    sketch_b.update(b)
+    assert abs(sketch_ks_statistic(sketch_a, sketch_b) - ks_statistic(a, b)) <= KS_ERROR
+
+
+def test_sketch_ks_statistic_empty_side():
+    sketch = KLLSketch()
+    sketch.update([1.0])
+    assert np.isnan(sketch_ks_statistic(sketch, KLLSketch()))
+
+
+# --- LogHistogram ---
+def test_log_histogram_quantile_within_half_bucket():
+    rng = np.random.default_rng(5)
+    values = rng.lognormal(mean=-3, sigma=1.5, size=50_000)
+    hist = LogHistogram()
+    hist.update(values)
+    half_bucket = 10 ** (0.5 / hist.buckets_per_decade)
+    for q in [0.5, 0.95]:
+        exact = np.quantile(values, q)
+        assert exact / half_bucket <= hist.quantile(q) <= exact * half_bucket * 1.0001
+
+
+# --- DeviationAccumulator ---
+def test_deviation_accumulator_split_equals_whole():
+    import pandas as pd
+    rng = np.random.default_rng(6)
+    n = 5000
+    data = {'k_time': np.arange(n) * 60}
+    for metric in ['open', 'high', 'low', 'close', 'volume']:
+        ours = rng.lognormal(size=n)
+        data[f"{metric}_ours"] = ours
+        data[f"{metric}_birdeye"] = ours * (1 + rng.normal(scale=0.001, size=n))
+    frame = pd.DataFrame(data)
+    whole = DeviationAccumulator().update(frame).results()
+    split = DeviationAccumulator().update(frame.iloc[:1234]).merge(
+        DeviationAccumulator.from_dict(DeviationAccumulator().update(frame.iloc[1234:]).to_dict())).results()
+    for metric in whole:
+        assert split[metric]['count'] == whole[metric]['count'] == n
+        assert split[metric]['mean'] == pytest.approx(whole[metric]['mean'], rel=1e-9)
+        assert split[metric]['std'] == pytest.approx(whole[metric]['std'], rel=1e-9)
+        assert split[metric]['max'] == whole[metric]['max']
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import outlier_detection
+
+
+def random_walk(n, seed=0):
+    return 100 + np.cumsum(np.random.default_rng(seed).normal(size=n))
+
+
+def test_exact_iqr_bands_match_pandas_rolling_quantiles():
+    values = random_walk(2000)
+    lower, upper = outlier_detection.rolling_bands(values, window=61, method='iqr', center=True)
+    rolling = pd.Series(values).rolling(61, center=True)
+    q1, q3 = rolling.quantile(0.25).to_numpy(), rolling.quantile(0.75).to_numpy()
+    inner = slice(30, 2000 - 30)
+    np.testing.assert_allclose(lower[inner], (q1 - 1.5 * (q3 - q1))[inner])
+    np.testing.assert_allclose(upper[inner], (q3 + 1.5 * (q3 - q1))[inner])
+
+
+def test_zscore_bands_match_pandas():
+    values = random_walk(1000) * 1e4
+    lower, upper = outlier_detection.rolling_bands(values, window=31, method='zscore', multiplier=3)
+    rolling = pd.Series(values).rolling(31, center=True)
+    mean, std = rolling.mean().to_numpy(), rolling.std(ddof=0).to_numpy()
+    inner = slice(15, 1000 - 15)
+    np.testing.assert_allclose(upper[inner], (mean + 3 * std)[inner], rtol=1e-9)
+
+
+def test_nan_values_get_nan_bands_and_are_not_flagged():
+    values = random_walk(200)
+    values[[10, 50]] = np.nan
+    lower, upper = outlier_detection.rolling_bands(values, window=21)
+    assert np.isnan(lower[[10, 50]]).all() and np.isnan(upper[[10, 50]]).all()
+    assert not np.isnan(np.delete(lower, [10, 50])).any()
+
+
+def test_detect_candle_outliers_is_exact_by_default():
+    values = random_walk(5000, seed=3)
+    values[[1000, 3000]] += 50
+    candles = pd.DataFrame({'k_time': np.arange(5000) * 60, 'close': values})
+    default = outlier_detection.detect_candle_outliers(candles, 'ours', columns=['close'])
+    exact = outlier_detection.detect_candle_outliers(candles, 'ours', columns=['close'], band_step=1)
+    pd.testing.assert_frame_equal(default, exact)
+    assert {1000, 3000} <= set(default['index'])
+
+
+def test_unknown_method_raises():
+    with pytest.raises(ValueError):
+        outlier_detection.rolling_bands(np.arange(10.0), window=5, method='bogus')
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from pool_aggregation import aggregate_prices, grouped_median, pool_trailing_volume
+
+
+def columns(rows):
+    """Pool table rows (token, pool, timestamp, price, volume, tvl) as arrays."""
+    token, pool, timestamp, price, volume, tvl = (np.array(c) for c in zip(*rows))
+    return token, pool, timestamp, price.astype(float), volume.astype(float), tvl.astype(float)
+
+
+# token, pool, timestamp, price, volume, tvl
+POOLS = [
+    ('A', 'p1', 0, 10.0, 2000, 20000),
+    ('A', 'p2', 30, 12.0, 6000, 50000),
+    ('A', 'p3', 59, 100.0, 10, 500),      # below min TVL
+    ('A', 'p1', 60, 11.0, 1000, 20000),
+    ('B', 'p4', 10, 5.0, 3000, 5000),     # below min TVL, so B has no price
+]
+
+
+def test_volume_weighted_price_per_token_and_candle():
+    result = aggregate_prices(*columns(POOLS), volume_24h=np.full(len(POOLS), 5000.0))
+    rows = {(r.token, r.k_time): r for r in result.itertuples()}
+    # (10 * 2000 + 12 * 6000) / 8000
+    assert rows[('A', 0)].price == pytest.approx(11.5)
+    assert rows[('A', 0)].pool_count == 2
+    assert rows[('A', 0)].total_weight == 8000
+    assert rows[('A', 60)].price == pytest.approx(11.0)
+    assert np.isnan(rows[('B', 0)].price)
+    assert rows[('B', 0)].pool_count == 0
+
+
+def test_equal_weighting_and_price_impact_filter():
+    result = aggregate_prices(*columns(POOLS), volume_24h=np.full(len(POOLS), 5000.0), weighting_method='equal',
+                              price_impact_1k=np.array([0.001, 0.05, 0.001, 0.001, 0.001]))
+    first = result[(result['token'] == 'A') & (result['k_time'] == 0)].iloc[0]
+    # p2 exceeds the price impact limit, p3 the TVL limit
+    assert first['price'] == pytest.approx(10.0)
+    assert first['pool_count'] == 1
+
+
+def test_per_dex_rules_weight_jupiter_by_liquidity():
+    rows = [
+        ('A', 'ray', 0, 10.0, 2000, 20000),
+        ('A', 'jup', 0, 13.0, 500, 30000),
+        ('A', 'orca', 0, 11.0, 1000, 6000),
+        ('A', 'other', 0, 50.0, 9000, 20000),   # unknown DEX: small-DEX rule needs 50k TVL
+    ]
+    result = aggregate_prices(*columns(rows), volume_24h=np.full(4, 5000.0),
+                              dex=np.array(['Raydium', 'jupiter', 'orca', 'foo']))
+    # weights: raydium volume 2000, jupiter TVL 30000 * 1.2, orca volume 1000
+    expected = (10 * 2000 + 13 * 36000 + 11 * 1000) / 39000
+    assert result['price'].iloc[0] == pytest.approx(expected)
+    assert result['pool_count'].iloc[0] == 3
+    assert result['total_weight'].iloc[0] == pytest.approx(39000)
+
+
+def test_median_deviation_drops_stray_pool():
+    rows = [('A', 'p1', 0, 10.0, 1000, 20000), ('A', 'p2', 0, 10.1, 1000, 20000), ('A', 'p3', 0, 20.0, 1000, 20000)]
+    result = aggregate_prices(*columns(rows), volume_24h=np.full(3, 5000.0), max_median_deviation=0.1)
+    assert result['price'].iloc[0] == pytest.approx(10.05)
+    assert result['pool_count'].iloc[0] == 2
+
+
+def test_unknown_weighting_method_raises():
+    with pytest.raises(ValueError):
+        aggregate_prices(*columns(POOLS), weighting_method='bogus')
+
+
+def test_pool_trailing_volume_uses_past_24h_per_pool():
+    pool = np.array(['x', 'y', 'x', 'x', 'y', 'x'])
+    timestamp = np.array([0, 0, 3600, 86400, 86400, 86401])
+    volume = np.array([1.0, 100.0, 2.0, 4.0, 200.0, 8.0])
+    trailing = pool_trailing_volume(pool, timestamp, volume)
+    # x at 86400 covers (0, 86400]; the observation at exactly t - 24h is out of the window
+    np.testing.assert_allclose(trailing, [1.0, 100.0, 3.0, 6.0, 200.0, 14.0])
+
+
+def test_default_volume_24h_filters_thin_pools():
+    rows = [('A', 'p1', 0, 10.0, 500, 20000), ('A', 'p2', 0, 12.0, 5000, 20000)]
+    result = aggregate_prices(*columns(rows))
+    # p1 traded only 500 in the trailing day, below min_volume_threshold
+    assert result['price'].iloc[0] == pytest.approx(12.0)
+
+
+def test_grouped_median():
+    values = np.array([3.0, 1.0, 2.0, 10.0, 20.0])
+    groups = np.array([0, 0, 0, 2, 2])
+    np.testing.assert_allclose(grouped_median(values, groups, 3), [2.0, np.nan, 15.0])
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+import deviation_stats
+import summary_cube
+import validation_scheduler
+
+
+def merged_candles(start, count, step=60):
+    k_time = np.arange(start, start + count * step, step)
+    data = {'k_time': k_time}
+    for metric in ['open', 'high', 'low', 'close', 'volume']:
+        data[f"{metric}_ours"] = np.linspace(1.0, 2.0, count)
+        data[f"{metric}_birdeye"] = np.linspace(1.0, 2.0, count) * 1.001
+    return pd.DataFrame(data)
+
+
+def day_count(state_dir, day_str):
+    path = state_dir / 'stats' / day_str / 'TOKEN_1m.json'
+    return deviation_stats.DeviationAccumulator.load(str(path)).moments['close'].count
+
+
+def test_update_daily_stats_splits_by_utc_day(tmp_path):
+    # 23:50 to 00:09 UTC
+    validation_scheduler.update_daily_stats(str(tmp_path), 'TOKEN', '1m', merged_candles(86400 - 600, 20))
+    assert day_count(tmp_path, '1970-01-01') == 10
+    assert day_count(tmp_path, '1970-01-02') == 10
+
+
+def test_update_daily_stats_ignores_a_revalidated_window(tmp_path):
+    # A crash between update_daily_stats and save_watermarks validates the same window again
+    merged = merged_candles(0, 30)
+    validation_scheduler.update_daily_stats(str(tmp_path), 'TOKEN', '1m', merged)
+    validation_scheduler.update_daily_stats(str(tmp_path), 'TOKEN', '1m', merged)
+    assert day_count(tmp_path, '1970-01-01') == 30
+
+    # The next window only adds its new candles
+    validation_scheduler.update_daily_stats(str(tmp_path), 'TOKEN', '1m', merged_candles(20 * 60, 20))
+    assert day_count(tmp_path, '1970-01-01') == 40
+
+
+def test_update_daily_stats_cube_is_idempotent(tmp_path):
+    cube = summary_cube.SummaryCube()
+    merged = merged_candles(0, 30)
+    validation_scheduler.update_daily_stats(str(tmp_path), 'TOKEN', '1m', merged, cube, 'high')
+    state = cube.to_dict()
+    validation_scheduler.update_daily_stats(str(tmp_path), 'TOKEN', '1m', merged, cube, 'high')
+    assert cube.to_dict() == state